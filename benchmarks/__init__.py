@@ -0,0 +1,4 @@
+"""Offline benchmarks: a fake Gemini upstream, prompt microbenchmarks and a load generator.
+
+Nothing here calls Google; see the module docstrings for how to run each part.
+"""
@@ -0,0 +1,89 @@
+"""Accuracy and latency of the local prompt classifier on a labeled prompt set.
+
+    python -m benchmarks.classifier [--verbose]
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+
+from src.prompt_classifier import ACADEMIC, CLASSES, GREETING, PLATFORM, REFERENCE, SHORT, classify
+
+# (prompt, has_context, expected class)
+LABELED = [
+    ("សួស្តី", False, GREETING),
+    ("ជំរាបសួរ តារា", False, GREETING),
+    ("សួស្តីបង!", False, GREETING),
+    ("អរគុណច្រើន", True, GREETING),
+    ("សុខសប្បាយទេ?", False, GREETING),
+    ("hello", False, GREETING),
+    ("Hi there!", False, GREETING),
+    ("thanks so much", True, GREETING),
+    ("តើ KOMPLEX ជាអ្វី?", False, PLATFORM),
+    ("អ្នកជានរណា?", False, PLATFORM),
+    ("What is Komplex?", False, PLATFORM),
+    ("who are you", False, PLATFORM),
+    ("តើ x = 2 ជាឫសនៃ x^2 - 4 = 0 ឬទេ?", False, SHORT),
+    ("តើ 0 ជាចំនួនគូមែនទេ?", False, SHORT),
+    ("តើចំនួនកុំផ្លិចមានម៉ូឌុលអវិជ្ជមានបានទេ?", False, SHORT),
+    ("Is 1 a prime number?", False, SHORT),
+    ("Does sin(0) equal 0?", False, SHORT),
+    ("ពន្យល់និយមន័យម្តងទៀត", True, REFERENCE),
+    ("សង្ខេបមេរៀននេះ", True, REFERENCE),
+    ("តើចម្លើយខាងលើត្រឹមត្រូវទេ?", True, REFERENCE),
+    ("can you explain that again", True, REFERENCE),
+    ("ពន្យល់ពីដេរីវេ", False, ACADEMIC),
+    ("តើដេរីវេនៃ x^2 ស្មើប៉ុន្មាន?", False, ACADEMIC),
+    ("ជួយដោះស្រាយលំហាត់ទី៣", False, ACADEMIC),
+    ("ហេតុអ្វីបានជាឌីសគ្រីមីណង់អវិជ្ជមានគ្មានឫស?", False, ACADEMIC),
+    ("What is the limit of sin(x)/x as x approaches 0?", False, ACADEMIC),
+    ("ផ្តល់ឧទាហរណ៍មួយទៀតអំពីអាំងតេក្រាល", False, ACADEMIC),
+    ("How do I solve a quadratic equation by completing the square?", False, ACADEMIC),
+    ("ខ្ញុំមិនយល់ទេ", False, ACADEMIC),
+    ("សួស្តី តើអ្នកអាចពន្យល់ពីអាំងតេក្រាលកំណត់ និងរបៀបគណនាផ្ទៃក្រឡាក្រោមខ្សែកោងបានទេ?", False, ACADEMIC),
+    ("Hello, can you explain why the derivative of e^x is e^x?", False, ACADEMIC),
+    ("តើ Komplex អាចជួយខ្ញុំដោះស្រាយលំហាត់អាំងតេក្រាលបានទេ?", False, ACADEMIC),
+]
+
+
+def run(repeat: int) -> tuple[list[tuple[str, str, str]], float]:
+    results = [(prompt, expected, classify(prompt, has_context)) for prompt, has_context, expected in LABELED]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for prompt, has_context, _ in LABELED:
+            classify(prompt, has_context)
+    seconds = (time.perf_counter() - started) / (repeat * len(LABELED))
+    return results, seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="timing passes over the set")
+    parser.add_argument("--verbose", action="store_true", help="list misclassified prompts")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results, seconds = run(args.repeat)
+    correct = Counter(expected for _, expected, got in results if expected == got)
+    totals = Counter(expected for _, expected, _ in results)
+    accuracy = sum(correct.values()) / len(results)
+    if args.json:
+        print(json.dumps({
+            "accuracy": accuracy,
+            "classifyMicroseconds": seconds * 1e6,
+            "byClass": {name: correct[name] / totals[name] for name in CLASSES if totals[name]},
+        }, indent=2))
+        return
+    print(f"accuracy {accuracy:.1%} over {len(results)} prompts, {seconds * 1e6:.1f} µs per prompt")
+    for name in CLASSES:
+        if totals[name]:
+            print(f"  {name:<10} {correct[name]:>3}/{totals[name]:<3}")
+    if args.verbose:
+        for prompt, expected, got in results:
+            if expected != got:
+                print(f"  expected {expected:<10} got {got:<10} {prompt}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Stand-in for the Gemini model with configurable latency, streaming, usage and failures.
+
+Plug it into a running app with ``install(src.main, FakeGeminiModel(...))``; every
+upstream call then goes to the fake instead of Google.  ``FakeGeminiModel.from_env()``
+reads the ``FAKE_GEMINI_*`` variables so ``benchmarks.serve`` can be tuned from the
+shell.
+"""
+
+import asyncio
+import os
+import random
+from dataclasses import dataclass
+
+from google.api_core import exceptions
+
+from src.khmer import estimate_tokens
+
+_KOMPLEX_TEXT = (
+    '[{"type":"definition","props":{"title":"និយមន័យ","content":'
+    '[{"type":"text","value":"សមីការដឺក្រេទី២ មានរាង ax^2+bx+c=0"}]}},'
+    '{"type":"example","props":{"title":"ឧទាហរណ៍","question":'
+    '[{"type":"text","value":"ដោះស្រាយ x^2-5x+6=0"}],"steps":'
+    '[{"title":"ជំហាន ១","content":[{"type":"BlockMath","props":{"math":"(x-2)(x-3)=0"}}]}],'
+    '"answer":[{"type":"text","value":"x=2 ឬ x=3"}]}}]'
+)
+
+
+@dataclass
+class FakeUsage:
+    prompt_token_count: int = 0
+    candidates_token_count: int = 0
+    cached_content_token_count: int = 0
+    total_token_count: int = 0
+
+
+class FakeResponse:
+    def __init__(self, text: str, usage_metadata: FakeUsage):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeStream:
+    def __init__(self, model: "FakeGeminiModel", usage: FakeUsage):
+        self.model = model
+        self.usage_metadata = usage
+
+    async def __aiter__(self):
+        text = self.model.text
+        size = max(self.model.chunk_chars, 1)
+        for start in range(0, len(text), size):
+            await asyncio.sleep(self.model.chunk_interval)
+            yield FakeResponse(text[start:start + size], self.usage_metadata)
+
+
+class FakeGeminiModel:
+    def __init__(
+        self,
+        latency: float = 0.8,
+        jitter: float = 0.2,
+        chunk_interval: float = 0.05,
+        chunk_chars: int = 80,
+        output_tokens: int | None = None,
+        cached_ratio: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        text: str = _KOMPLEX_TEXT,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_interval = chunk_interval
+        self.chunk_chars = chunk_chars
+        self.output_tokens = output_tokens
+        self.cached_ratio = cached_ratio
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.text = text
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls) -> "FakeGeminiModel":
+        output_tokens = os.getenv("FAKE_GEMINI_OUTPUT_TOKENS")
+        return cls(
+            latency=float(os.getenv("FAKE_GEMINI_LATENCY", "0.8")),
+            jitter=float(os.getenv("FAKE_GEMINI_JITTER", "0.2")),
+            chunk_interval=float(os.getenv("FAKE_GEMINI_CHUNK_INTERVAL", "0.05")),
+            chunk_chars=int(os.getenv("FAKE_GEMINI_CHUNK_CHARS", "80")),
+            output_tokens=int(output_tokens) if output_tokens else None,
+            cached_ratio=float(os.getenv("FAKE_GEMINI_CACHED_RATIO", "0")),
+            error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_GEMINI_429_RATE", "0")),
+        )
+
+    def _usage(self, contents: str) -> FakeUsage:
+        prompt_tokens = estimate_tokens(contents)
+        output_tokens = self.output_tokens
+        if output_tokens is None:
+            output_tokens = estimate_tokens(self.text)
+        return FakeUsage(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            cached_content_token_count=int(prompt_tokens * self.cached_ratio),
+            total_token_count=prompt_tokens + output_tokens,
+        )
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        self.calls += 1
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        await asyncio.sleep(max(delay, 0.0))
+
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            self.rate_limited += 1
+            raise exceptions.ResourceExhausted("429 Resource has been exhausted (fake)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.errors += 1
+            raise exceptions.InternalServerError("500 An internal error has occurred (fake)")
+
+        usage = self._usage(contents if isinstance(contents, str) else str(contents))
+        if stream:
+            return FakeStream(self, usage)
+        return FakeResponse(self.text, usage)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "errors": self.errors, "rateLimited": self.rate_limited}
+
+
+class FakeModelProvider:
+    """Replaces each route's ContextCache: hands out the fake for every prompt."""
+
+    def __init__(self, model: FakeGeminiModel):
+        self.model = model
+
+    async def model_for(self, prompt):
+        return self.model
+
+    async def ensure(self, prompt) -> None:
+        return None
+
+    async def warm_up(self, prompts) -> None:
+        return None
+
+    def stats(self) -> dict:
+        return {"fake": self.model.stats()}
+
+
+def install(app_module, model: FakeGeminiModel) -> FakeModelProvider:
+    provider = FakeModelProvider(model)
+    for route in app_module.upstream_pool.routes:
+        route.models = provider
+    return provider
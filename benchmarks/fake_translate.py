@@ -0,0 +1,49 @@
+"""Stand-in for the Khmer→English translation API.
+
+Same request and response shape as the real service (``input_text`` list in,
+``translate_text`` list out, HTTP Basic auth), with a fixed per-request
+latency plus a small per-string cost, so batching shows up in the numbers:
+
+    FAKE_TRANSLATE_LATENCY=0.15 uvicorn benchmarks.fake_translate:app --port 8100
+
+Point the app at it with TRANSLATE_API_URL=http://127.0.0.1:8100/translate.
+"""
+
+import asyncio
+import base64
+import os
+
+from fastapi import FastAPI, HTTPException, Request
+
+FAKE_TRANSLATE_LATENCY = float(os.getenv("FAKE_TRANSLATE_LATENCY", "0.15"))
+FAKE_TRANSLATE_PER_TEXT = float(os.getenv("FAKE_TRANSLATE_PER_TEXT", "0.002"))
+FAKE_TRANSLATE_USERNAME = os.getenv("USERNAME_TRANSLATE_API", "bench")
+FAKE_TRANSLATE_PASSWORD = os.getenv("PASSWORD_TRANSLATE_API", "bench")
+
+app = FastAPI()
+app.state.requests = 0
+app.state.texts = 0
+
+
+def english(text: str) -> str:
+    return f"[en] {text}"
+
+
+@app.post("/translate")
+async def translate(request: Request):
+    expected = base64.b64encode(f"{FAKE_TRANSLATE_USERNAME}:{FAKE_TRANSLATE_PASSWORD}".encode()).decode()
+    if request.headers.get("authorization") != f"Basic {expected}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    payload = await request.json()
+    texts = payload.get("input_text")
+    if not isinstance(texts, list) or payload.get("src_lang") != "kh" or payload.get("tgt_lang") != "eng":
+        raise HTTPException(status_code=400, detail="Bad request")
+    app.state.requests += 1
+    app.state.texts += len(texts)
+    await asyncio.sleep(FAKE_TRANSLATE_LATENCY + FAKE_TRANSLATE_PER_TEXT * len(texts))
+    return {"translate_text": [english(text) for text in texts]}
+
+
+@app.get("/stats")
+async def stats():
+    return {"requests": app.state.requests, "texts": app.state.texts}
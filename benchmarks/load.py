@@ -0,0 +1,173 @@
+"""Open-loop load generator for /gemini and /topic/gemini.
+
+    python -m benchmarks.load --rps 50 --duration 30
+    python -m benchmarks.load --url http://localhost:8000 --rps 200 --stream
+
+Without ``--url`` the app runs in-process against the fake upstream.  Requests
+are started on a fixed schedule regardless of how fast earlier ones finish, so
+queueing inside the service shows up as latency instead of a lower send rate.
+The in-process transport buffers whole responses, so first-byte numbers for
+``--stream`` are only meaningful with ``--url``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+
+import httpx
+
+from .fake_gemini import FakeGeminiModel, install
+from .topics import PROMPTS, lesson, previous_context
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.first_bytes: list[float] = []
+        self.statuses: Counter = Counter()
+        self.failures: Counter = Counter()
+
+    def report(self, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        first_bytes = sorted(self.first_bytes)
+        report = {
+            "requests": sum(self.statuses.values()) + sum(self.failures.values()),
+            "elapsedSeconds": round(elapsed, 2),
+            "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "statuses": dict(self.statuses),
+            "failures": dict(self.failures),
+            "latencyMs": {
+                "p50": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99": round(percentile(latencies, 0.99) * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            },
+        }
+        if first_bytes:
+            report["firstByteMs"] = {
+                "p50": round(percentile(first_bytes, 0.50) * 1000, 1),
+                "p95": round(percentile(first_bytes, 0.95) * 1000, 1),
+                "p99": round(percentile(first_bytes, 0.99) * 1000, 1),
+            }
+        return report
+
+
+def _payloads(args) -> list[tuple[str, dict]]:
+    rng = random.Random(args.seed)
+    topic = lesson(boxes=args.boxes)
+    context = previous_context()
+    suffix = "/stream" if args.stream else ""
+    payloads = []
+    for number in range(args.distinct):
+        prompt = f"{PROMPTS[number % len(PROMPTS)]} ({number})"
+        body = {
+            "prompt": prompt,
+            "responseType": rng.choice(args.response_types),
+            "previousContext": context,
+        }
+        if args.no_cache:
+            body["cache"] = False
+        if args.endpoint == "topic" or (args.endpoint == "mixed" and number % 2):
+            payloads.append((f"/topic/gemini{suffix}", {**body, "topicContent": topic}))
+        else:
+            payloads.append((f"/gemini{suffix}", body))
+    return payloads
+
+
+async def _one(client: httpx.AsyncClient, path: str, body: dict, headers: dict, result: LoadResult):
+    started = time.perf_counter()
+    try:
+        async with client.stream("POST", path, json=body, headers=headers) as response:
+            first_byte = None
+            async for _ in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+            result.statuses[response.status_code] += 1
+            if response.status_code == 200:
+                result.latencies.append(time.perf_counter() - started)
+                if path.endswith("/stream") and first_byte is not None:
+                    result.first_bytes.append(first_byte)
+    except Exception as exc:
+        result.failures[type(exc).__name__] += 1
+
+
+async def run(args) -> dict:
+    headers = {"x-api-key": args.api_key}
+    if args.url:
+        client = httpx.AsyncClient(
+            base_url=args.url,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections),
+        )
+    else:
+        os.environ.setdefault("GEMINI_API_KEY", "fake")
+        os.environ.setdefault("INTERNAL_API_KEY", args.api_key)
+        from src import main as app_module
+
+        headers = {"x-api-key": app_module.INTERNAL_KEY}
+        install(app_module, FakeGeminiModel(
+            latency=args.fake_latency,
+            error_rate=args.fake_error_rate,
+            rate_limit_rate=args.fake_429_rate,
+            seed=args.seed,
+        ))
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app_module.app),
+            base_url="http://bench",
+            timeout=args.timeout,
+        )
+
+    payloads = _payloads(args)
+    rng = random.Random(args.seed)
+    result = LoadResult()
+    total = int(args.rps * args.duration)
+    tasks = []
+    async with client:
+        started = time.perf_counter()
+        for number in range(total):
+            delay = started + number / args.rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            path, body = rng.choice(payloads)
+            tasks.append(asyncio.create_task(_one(client, path, body, headers, result)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return result.report(elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target server; default runs the app in-process on the fake upstream")
+    parser.add_argument("--api-key", default=os.getenv("INTERNAL_API_KEY", "bench"))
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--endpoint", choices=["gemini", "topic", "mixed"], default="mixed")
+    parser.add_argument("--stream", action="store_true", help="use the SSE endpoints")
+    parser.add_argument("--response-types", nargs="+", default=["komplex", "normal"])
+    parser.add_argument("--distinct", type=int, default=200, help="distinct prompts; lower means more cache hits")
+    parser.add_argument("--no-cache", action="store_true", help="send cache=false")
+    parser.add_argument("--boxes", type=int, default=60, help="boxes in the topic lesson")
+    parser.add_argument("--connections", type=int, default=512)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fake-latency", type=float, default=0.8)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0)
+    parser.add_argument("--fake-429-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
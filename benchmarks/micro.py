@@ -0,0 +1,71 @@
+"""Microbenchmarks for prompt assembly.
+
+    python -m benchmarks.micro [--boxes 60]
+"""
+
+import argparse
+import json
+import timeit
+
+from src.instructions import topic_preprompt_box, topic_preprompt_md
+from src.instructions.general_preprompt import ResponseType, pre_prompt
+from src.topic_index import prune_topic
+from src.topic_registry import serialize_topic, topic_digest
+
+from .topics import PROMPTS, lesson, previous_context
+
+
+def _measure(func, min_seconds: float = 0.5) -> tuple[float, int]:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    runs = max(int(number * min_seconds / 0.2), 1)
+    best = min(timer.repeat(repeat=5, number=runs)) / runs
+    return best, runs
+
+
+def run(boxes: int) -> list[tuple[str, float, int]]:
+    prompt = PROMPTS[2]
+    context = previous_context()
+    small = lesson(boxes=4)
+    large = lesson(boxes=boxes)
+    payload = serialize_topic(large)
+    digest = topic_digest(payload)
+
+    cases = {
+        "pre_prompt komplex": lambda: pre_prompt(prompt, context, ResponseType.KOMPLEX),
+        "pre_prompt normal": lambda: pre_prompt(prompt, context, ResponseType.NORMAL),
+        "box._stringify_topic_content small": lambda: topic_preprompt_box._stringify_topic_content(small),
+        "box._stringify_topic_content large": lambda: topic_preprompt_box._stringify_topic_content(large),
+        "md._stringify_topic_content large": lambda: topic_preprompt_md._stringify_topic_content(large),
+        "box.topic_pre_prompt small": lambda: topic_preprompt_box.topic_pre_prompt(prompt, small, context),
+        "box.topic_pre_prompt large": lambda: topic_preprompt_box.topic_pre_prompt(prompt, large, context),
+        "md.topic_pre_prompt large": lambda: topic_preprompt_md.topic_pre_prompt(prompt, large, context),
+        "box.topic_pre_prompt pre-serialized": lambda: topic_preprompt_box.topic_pre_prompt(prompt, payload, context),
+        "serialize_topic large": lambda: serialize_topic(large),
+        "prune_topic large (indexed)": lambda: prune_topic(payload, prompt, digest),
+    }
+    results = []
+    for name, func in cases.items():
+        seconds, runs = _measure(func)
+        results.append((name, seconds, runs))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boxes", type=int, default=60, help="boxes in the large lesson")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    size = len(serialize_topic(lesson(boxes=args.boxes)).encode("utf-8"))
+    results = run(args.boxes)
+    if args.json:
+        print(json.dumps({name: seconds for name, seconds, _ in results}, indent=2))
+        return
+    print(f"large lesson: {args.boxes} boxes, {size / 1024:.0f} KiB serialized")
+    for name, seconds, runs in results:
+        print(f"{name:<42} {seconds * 1e6:>10.1f} µs  ({runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
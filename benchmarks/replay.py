@@ -0,0 +1,288 @@
+"""Replay captured traffic against the in-process app, offline and deterministically.
+
+    CAPTURE_ENABLED=true CAPTURE_SAMPLE_RATE=0.05 uvicorn src.main:app      # record
+    python -m benchmarks.replay captures/                                   # as recorded
+    python -m benchmarks.replay captures/ --speed 10 --tracemalloc          # 10x the arrival rate
+    python -m benchmarks.replay captures/ --speed 0 --concurrency 64        # as fast as possible
+
+Requests are sent at their recorded offsets divided by ``--speed``. Every
+upstream call is answered by a stand-in that plays back the generations the
+original request received (same text, usage and upstream latency, streamed
+when the call streams), so a replay needs no network and gives the same
+answers every run. Calls with nothing recorded, e.g. a request that was a
+cache hit when captured but misses now, get the median recorded latency and
+a placeholder answer; they are counted as fallbacks.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextvars import ContextVar
+
+os.environ["CAPTURE_ENABLED"] = "false"
+os.environ.setdefault("GEMINI_API_KEY", "fake")
+os.environ.setdefault("INTERNAL_API_KEY", "bench")
+
+import httpx  # noqa: E402
+
+from src.capture import read_capture  # noqa: E402
+
+from .fake_gemini import _KOMPLEX_TEXT, FakeResponse, FakeUsage  # noqa: E402
+from .load import LoadResult, percentile  # noqa: E402
+
+REPLAY_HEADER = "x-replay-id"
+_FALLBACK_TEXT = "នេះជាចម្លើយជំនួស។ (replay fallback)"
+_STREAM_CHUNK_CHARS = 80
+# ru_maxrss is in kilobytes on Linux, bytes on macOS.
+_RSS_PER_MIB = 1024 ** 2 if sys.platform == "darwin" else 1024
+
+_replay_id: ContextVar[int | None] = ContextVar("replay_id", default=None)
+
+
+def _usage(usage: dict | None) -> FakeUsage:
+    usage = usage or {}
+    return FakeUsage(
+        prompt_token_count=usage.get("promptTokens", 0),
+        candidates_token_count=usage.get("outputTokens", 0),
+        cached_content_token_count=usage.get("cachedTokens", 0),
+        total_token_count=usage.get("totalTokens", 0),
+    )
+
+
+class _RecordedStream:
+    def __init__(self, generation: dict, first_token: float, rest: float):
+        self.generation = generation
+        self.first_token = first_token
+        self.rest = rest
+        self.usage_metadata = _usage(generation["usage"])
+
+    async def __aiter__(self):
+        text = self.generation["text"]
+        chunks = [text[start:start + _STREAM_CHUNK_CHARS] for start in range(0, len(text), _STREAM_CHUNK_CHARS)]
+        await asyncio.sleep(self.first_token)
+        for index, chunk in enumerate(chunks or [""]):
+            if index:
+                await asyncio.sleep(self.rest / (len(chunks) - 1))
+            yield FakeResponse(chunk, self.usage_metadata)
+
+
+class _RecordedCall:
+    def __init__(self, model: "RecordedModel", prompt):
+        self.model = model
+        self.prompt = prompt
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        generation = self.model.take(_replay_id.get(), self.prompt)
+        seconds = generation["seconds"]
+        if stream:
+            first_token = generation.get("firstTokenSeconds")
+            if first_token is None:
+                first_token = seconds
+            return _RecordedStream(generation, first_token, max(seconds - first_token, 0.0))
+        await asyncio.sleep(seconds)
+        return FakeResponse(generation["text"], _usage(generation["usage"]))
+
+
+class RecordedModel:
+    """Hands each request the generations it received when it was captured.
+
+    Used as every route's model provider (see ``benchmarks.fake_gemini.install``).
+    Within a request, a call takes the first unused generation with the same
+    instruction and prompt size, else the same instruction, else the next one.
+    """
+
+    def __init__(self, records: list[dict]):
+        self._pending: dict[int, list[dict]] = {
+            number: list(record["generations"]) for number, record in enumerate(records)
+        }
+        upstream = [
+            generation["seconds"]
+            for record in records
+            for generation in record["generations"]
+            if not generation["cached"]
+        ]
+        self.median_seconds = statistics.median(upstream) if upstream else 0.5
+        self.served = 0
+        self.fallbacks = 0
+
+    async def model_for(self, prompt):
+        return _RecordedCall(self, prompt)
+
+    async def ensure(self, prompt) -> None:
+        return None
+
+    async def warm_up(self, prompts) -> None:
+        return None
+
+    def take(self, replay_id: int | None, prompt) -> dict:
+        pending = self._pending.get(replay_id, [])
+        size = len(prompt.text.encode("utf-8"))
+        for matches in (
+            lambda generation: generation["instructionKey"] == prompt.instruction_key
+            and generation["promptBytes"] == size,
+            lambda generation: generation["instructionKey"] == prompt.instruction_key,
+            lambda generation: True,
+        ):
+            for index, generation in enumerate(pending):
+                if matches(generation):
+                    generation = pending.pop(index)
+                    self.served += 1
+                    if generation["cached"]:
+                        # A cache hit then, an upstream call now.
+                        return {**generation, "seconds": self.median_seconds, "firstTokenSeconds": None}
+                    return generation
+        self.fallbacks += 1
+        text = _KOMPLEX_TEXT if prompt.response_format == "json" else _FALLBACK_TEXT
+        return {"text": text, "usage": None, "seconds": self.median_seconds, "firstTokenSeconds": None}
+
+    def stats(self) -> dict:
+        return {"served": self.served, "fallbacks": self.fallbacks, "medianUpstreamSeconds": round(self.median_seconds, 4)}
+
+
+def _tagged(app):
+    """Makes the replay id header visible to the stand-in through a context variable."""
+    header = REPLAY_HEADER.encode("latin-1")
+
+    async def tagged(scope, receive, send):
+        replay_id = None
+        if scope["type"] == "http":
+            for key, value in scope["headers"]:
+                if key == header:
+                    replay_id = int(value)
+        token = _replay_id.set(replay_id)
+        try:
+            await app(scope, receive, send)
+        finally:
+            _replay_id.reset(token)
+
+    return tagged
+
+
+def _headers(record: dict, number: int, api_key: str) -> dict:
+    headers = {**record["headers"], "x-api-key": api_key, REPLAY_HEADER: str(number)}
+    deadline = headers.get("x-request-deadline")
+    if deadline is not None:
+        # Absolute epoch ms when captured; keep the same budget relative to now.
+        try:
+            budget = float(deadline) / 1000 - record["timestamp"]
+            headers["x-request-deadline"] = str(int((time.time() + budget) * 1000))
+        except ValueError:
+            del headers["x-request-deadline"]
+    return headers
+
+
+async def _one(client: httpx.AsyncClient, record: dict, number: int, api_key: str, result: LoadResult, mismatches):
+    started = time.perf_counter()
+    try:
+        async with client.stream(
+            record["method"],
+            record["path"] + (f"?{record['query']}" if record["query"] else ""),
+            content=json.dumps(record["body"], ensure_ascii=False).encode("utf-8"),
+            headers=_headers(record, number, api_key),
+        ) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            result.statuses[response.status_code] += 1
+            if response.status_code == 200:
+                result.latencies.append(time.perf_counter() - started)
+            if response.status_code != record["status"]:
+                mismatches[f"{record['status']}->{response.status_code}"] += 1
+    except Exception as exc:
+        result.failures[type(exc).__name__] += 1
+
+
+def _recorded(records: list[dict]) -> dict:
+    seconds = sorted(record["seconds"] for record in records if record["status"] == 200)
+    return {
+        "p50": round(percentile(seconds, 0.50) * 1000, 1),
+        "p95": round(percentile(seconds, 0.95) * 1000, 1),
+        "p99": round(percentile(seconds, 0.99) * 1000, 1),
+    }
+
+
+async def run(args) -> dict:
+    records = [record for record in read_capture(args.captures) if record["body"] is not None]
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        raise SystemExit("no replayable records")
+
+    from src import main as app_module
+
+    model = RecordedModel(records)
+    for route in app_module.upstream_pool.routes:
+        route.models = model
+    # The startup warm-up (SDK import, generation configs) stays out of the first request's latency.
+    await app_module.readiness.warm_up(app_module._warmup_steps())
+
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=_tagged(app_module.app)),
+        base_url="http://replay",
+        timeout=args.timeout,
+    )
+    by_path: dict[str, LoadResult] = defaultdict(LoadResult)
+    mismatches: dict[str, int] = defaultdict(int)
+    limiter = asyncio.Semaphore(args.concurrency) if args.speed <= 0 else None
+
+    async def send(number: int, record: dict):
+        if limiter is None:
+            await _one(client, record, number, app_module.INTERNAL_KEY, by_path[record["path"]], mismatches)
+            return
+        async with limiter:
+            await _one(client, record, number, app_module.INTERNAL_KEY, by_path[record["path"]], mismatches)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    tasks = []
+    first = records[0]["timestamp"]
+    async with client:
+        started = time.perf_counter()
+        for number, record in enumerate(records):
+            if args.speed > 0:
+                delay = started + (record["timestamp"] - first) / args.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(number, record)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "records": len(records),
+        "speed": args.speed,
+        "recordedSeconds": round(records[-1]["timestamp"] - first, 2),
+        "elapsedSeconds": round(elapsed, 2),
+        "paths": {path: result.report(elapsed) for path, result in sorted(by_path.items())},
+        "recordedLatencyMs": _recorded(records),
+        "statusMismatches": dict(mismatches),
+        "upstream": model.stats(),
+        "maxRssMiB": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / _RSS_PER_MIB, 1),
+    }
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["tracemallocPeakMiB"] = round(peak / 1024 ** 2, 1)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("captures", nargs="+", help="capture files or directories")
+    parser.add_argument("--speed", type=float, default=1.0, help="arrival rate multiplier; 0 sends as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight with --speed 0")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N records")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--tracemalloc", action="store_true", help="report the Python heap peak (slows the app down)")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
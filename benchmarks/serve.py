@@ -0,0 +1,20 @@
+"""The real app wired to the fake upstream.
+
+    FAKE_GEMINI_LATENCY=0.5 uvicorn benchmarks.serve:app --workers 4
+
+Set GEMINI_API_KEY/INTERNAL_API_KEY as usual, or let the dummy defaults below apply.
+"""
+
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "fake")
+os.environ.setdefault("INTERNAL_API_KEY", "bench")
+
+from src import main  # noqa: E402
+
+from .fake_gemini import FakeGeminiModel, install  # noqa: E402
+
+fake_model = FakeGeminiModel.from_env()
+install(main, fake_model)
+
+app = main.app
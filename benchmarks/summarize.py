@@ -0,0 +1,71 @@
+"""Throughput of the summarizer worker with and without dynamic batching.
+
+Runs offline on a tiny randomly initialized model (needs torch and transformers):
+
+    python -m benchmarks.summarize [--requests 32] [--max-batch 8]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from src.summarizer import Summarizer, available
+from src.summarizer_worker import TINY_MODEL
+
+from .topics import PROMPTS
+
+
+async def _run(max_batch: int, requests: int, output_type: str, threads: int) -> dict:
+    summarizer = Summarizer(model_name=TINY_MODEL, max_batch=max_batch, threads=threads, num_beams=2)
+    try:
+        started = time.perf_counter()
+        await summarizer.warm_up()
+        load_seconds = time.perf_counter() - started
+
+        texts = [PROMPTS[index % len(PROMPTS)] * 8 for index in range(requests)]
+        started = time.perf_counter()
+        summaries = await asyncio.gather(*(summarizer.summarize(text, output_type) for text in texts))
+        seconds = time.perf_counter() - started
+    finally:
+        await summarizer.close()
+    stats = summarizer.stats()
+    return {
+        "maxBatch": max_batch,
+        "loadSeconds": round(load_seconds, 3),
+        "seconds": round(seconds, 3),
+        "requestsPerSecond": round(requests / seconds, 2),
+        "batches": stats["batches"],
+        "averageBatchSize": stats["averageBatchSize"],
+        "summaries": len(summaries),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=32, help="concurrent /summarize requests")
+    parser.add_argument("--max-batch", type=int, default=8, help="batch size to compare against 1")
+    parser.add_argument("--output-type", default="title", choices=("title", "summary"))
+    parser.add_argument("--threads", type=int, default=2, help="torch threads in the worker")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if not available():
+        raise SystemExit("torch and transformers are required (or SUMMARIZER_ENABLED is false)")
+    results = [
+        asyncio.run(_run(max_batch, args.requests, args.output_type, args.threads))
+        for max_batch in (1, args.max_batch)
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(
+            f"max batch {result['maxBatch']:>3}: {result['requestsPerSecond']:>8.2f} req/s "
+            f"({result['batches']} batches, {result['averageBatchSize']:.1f} avg, "
+            f"model load {result['loadSeconds']:.1f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Deterministic TopicContent_V3 lessons shaped like the ones the frontend sends."""
+
+import random
+
+_WORDS = [
+    "សមីការ", "ដឺក្រេទី២", "អនុគមន៍", "ដេរីវេ", "អាំងតេក្រាល", "ចំនួនកុំផ្លិច", "ម៉ូឌុល",
+    "អាគុយម៉ង់", "ត្រីកោណមាត្រ", "ស៊ីនុស", "កូស៊ីនុស", "លីមីត", "ស្វ៊ីត", "ប្រូបាប៊ីលីតេ", "វ៉ិចទ័រ",
+]
+
+PROMPTS = [
+    "សួស្តី",
+    "ពន្យល់និយមន័យម្តងទៀត",
+    "តើដេរីវេនៃ x^2 ស្មើប៉ុន្មាន?",
+    "ជួយដោះស្រាយលំហាត់ទី៣",
+    "ហេតុអ្វីបានជាឌីសគ្រីមីណង់អវិជ្ជមានគ្មានឫស?",
+    "What is the limit of sin(x)/x as x approaches 0?",
+    "ផ្តល់ឧទាហរណ៍មួយទៀតអំពីអាំងតេក្រាល",
+    "សង្ខេបមេរៀននេះ",
+]
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _node(rng: random.Random, words: int) -> dict:
+    return {
+        "type": "div",
+        "props": {
+            "className": "flex flex-col gap-2 p-4 rounded-lg bg-muted",
+            "children": [
+                {
+                    "type": "p",
+                    "props": {
+                        "className": "text-base leading-7",
+                        "children": [{"type": "text", "value": _paragraph(rng, words)}],
+                    },
+                },
+                {"type": "BlockMath", "props": {"math": f"x^2+{rng.randint(1, 9)}x+1=0"}},
+            ],
+        },
+    }
+
+
+def lesson(boxes: int = 60, seed: int = 1) -> list[dict]:
+    """A lesson with one definition and ``boxes`` examples, tips, exercises and graphs."""
+    rng = random.Random(seed)
+    content = [
+        {
+            "type": "definition",
+            "props": {"title": "និយមន័យ " + _paragraph(rng, 2), "content": [_node(rng, 30)]},
+        }
+    ]
+    for number in range(boxes):
+        kind = rng.choice(["example", "tip", "exercise", "graph"])
+        if kind == "example":
+            content.append({
+                "type": "example",
+                "props": {
+                    "title": f"ឧទាហរណ៍ {number}",
+                    "question": [_node(rng, 10)],
+                    "steps": [{"title": "ជំហាន", "content": [_node(rng, 25)]} for _ in range(3)],
+                    "answer": [_node(rng, 5)],
+                },
+            })
+        elif kind == "graph":
+            content.append({
+                "type": "graph",
+                "props": {
+                    "title": f"ក្រាប {number}",
+                    "expressions": [{"id": "1", "latex": "y=x^2", "color": "#c74440"}],
+                },
+            })
+        elif kind == "exercise":
+            content.append({
+                "type": "exercise",
+                "props": {
+                    "questions": [{
+                        "question": _paragraph(rng, 8),
+                        "options": [_paragraph(rng, 2) for _ in range(4)],
+                        "correctAnswer": 1,
+                    }],
+                },
+            })
+        else:
+            content.append({
+                "type": "tip",
+                "props": {"title": f"គន្លឹះ {number}", "content": [_node(rng, 20)]},
+            })
+    return content
+
+
+def previous_context(turns: int = 3, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    return "\n\n".join(
+        f"Prompt {number}: {_paragraph(rng, 8)}\nResponse {number}: {_paragraph(rng, 60)}"
+        for number in range(1, turns + 1)
+    )
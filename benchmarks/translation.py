@@ -0,0 +1,105 @@
+"""Translation client against the local stand-in server: one request per string vs pooled micro-batches.
+
+    python -m benchmarks.translation [--strings 200] [--distinct 80]
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from src.translation import TranslationClient
+
+from . import fake_translate
+from .topics import PROMPTS
+
+
+def _serve() -> tuple[uvicorn.Server, str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_translate.app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}/translate"
+
+
+def _texts(strings: int, distinct: int) -> list[str]:
+    return [f"{PROMPTS[index % len(PROMPTS)]} #{index % distinct}" for index in range(strings)]
+
+
+async def _one_by_one(url: str, texts: list[str]) -> float:
+    """The old helper: a fresh connection and a one-element list per string."""
+    auth = httpx.BasicAuth(fake_translate.FAKE_TRANSLATE_USERNAME, fake_translate.FAKE_TRANSLATE_PASSWORD)
+
+    async def translate(text: str) -> str:
+        async with httpx.AsyncClient(auth=auth) as client:
+            response = await client.post(url, json={"input_text": [text], "src_lang": "kh", "tgt_lang": "eng"})
+            return response.json()["translate_text"][0]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(translate(text) for text in texts))
+    return time.perf_counter() - started
+
+
+async def _client(url: str, texts: list[str]) -> tuple[float, dict]:
+    client = TranslationClient(
+        url, fake_translate.FAKE_TRANSLATE_USERNAME, fake_translate.FAKE_TRANSLATE_PASSWORD
+    )
+    try:
+        started = time.perf_counter()
+        translations = await client.translate_many(texts)
+        seconds = time.perf_counter() - started
+    finally:
+        await client.close()
+    # Only Khmer strings are sent; the rest come back as they were.
+    assert all(
+        english in (text, fake_translate.english(text)) for text, english in zip(texts, translations)
+    )
+    return seconds, client.stats()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strings", type=int, default=200, help="concurrent strings to translate")
+    parser.add_argument("--distinct", type=int, default=80, help="distinct strings among them")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    server, url = _serve()
+    try:
+        texts = _texts(args.strings, args.distinct)
+        baseline = asyncio.run(_one_by_one(url, texts))
+        requests_before = fake_translate.app.state.requests
+        seconds, stats = asyncio.run(_client(url, texts))
+        batched_requests = fake_translate.app.state.requests - requests_before
+    finally:
+        server.should_exit = True
+
+    results = {
+        "strings": len(texts),
+        "oneByOneSeconds": round(baseline, 3),
+        "clientSeconds": round(seconds, 3),
+        "clientRequests": batched_requests,
+        "client": stats,
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{len(texts)} strings")
+    print(f"  one request per string: {baseline:.3f}s, {len(texts)} requests")
+    print(
+        f"  pooled client:          {seconds:.3f}s, {batched_requests} requests "
+        f"({stats['skippedNonKhmer']} non-Khmer skipped, {stats['coalesced']} coalesced, "
+        f"{stats['averageBatchSize']:.1f} per batch)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Admission control in front of the generation endpoints.
+
+At most ``max_active`` requests run at once; the rest wait in a bounded queue
+that is served by priority class, round-robin across callers within a class.
+A full queue sheds new requests with 429 + Retry-After, and requests whose
+deadline passes while queued are dropped before any upstream work starts.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from . import metrics
+
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() != "false"
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "256"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "1024"))
+ADMISSION_MAX_QUEUE_PER_CALLER = int(os.getenv("ADMISSION_MAX_QUEUE_PER_CALLER", "256"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "15"))
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+_PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+# Absolute deadline in Unix epoch milliseconds.
+DEADLINE_HEADER = b"x-request-deadline"
+PRIORITY_HEADER = b"x-priority"
+CLIENT_HEADER = b"x-client-id"
+
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float | None = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+def check_deadline() -> None:
+    """Raise if the current request's client-supplied deadline has passed."""
+    deadline = _deadline.get()
+    if deadline is not None and time.time() >= deadline:
+        metrics.observe_admission_rejected("deadline")
+        raise DeadlineExceededError("Client deadline passed before the upstream call")
+
+
+@dataclass
+class _Waiter:
+    caller: str
+    priority: int
+    deadline: float | None
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+    admitted: bool = False
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_active: int = ADMISSION_MAX_ACTIVE,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_queue_per_caller: int = ADMISSION_MAX_QUEUE_PER_CALLER,
+        max_wait: float = ADMISSION_MAX_WAIT_SECONDS,
+    ):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_queue_per_caller = max_queue_per_caller
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.expired = 0
+        self.timed_out = 0
+        # One round-robin ring of callers per priority class.
+        self._queues: list[OrderedDict[str, deque[_Waiter]]] = [OrderedDict() for _ in PRIORITIES]
+        self._queued_by_caller: dict[str, int] = {}
+        self._service_seconds = 1.0
+
+    def retry_after(self) -> float:
+        rounds = (self.queued + 1) / max(self.max_active, 1)
+        return max(math.ceil(rounds * self._service_seconds), 1)
+
+    async def acquire(self, caller: str, priority: int, deadline: float | None) -> None:
+        if deadline is not None and time.time() >= deadline:
+            self.expired += 1
+            metrics.observe_admission_rejected("deadline")
+            raise AdmissionRejected(504, "Deadline exceeded")
+
+        if self.active < self.max_active and self.queued == 0:
+            self.active += 1
+            self.admitted += 1
+            metrics.observe_admission_wait(_PRIORITY_NAMES[priority], 0.0)
+            return
+
+        if (
+            self.queued >= self.max_queue
+            or self._queued_by_caller.get(caller, 0) >= self.max_queue_per_caller
+        ):
+            self.shed += 1
+            metrics.observe_admission_rejected("queue_full")
+            raise AdmissionRejected(429, "Server busy", self.retry_after())
+
+        waiter = _Waiter(caller, priority, deadline, asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(caller, deque()).append(waiter)
+        self.queued += 1
+        self._queued_by_caller[caller] = self._queued_by_caller.get(caller, 0) + 1
+
+        timeout = self.max_wait
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.time())
+        try:
+            await asyncio.wait_for(waiter.future, timeout=max(timeout, 0.0))
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            if deadline is not None and time.time() >= deadline:
+                self.expired += 1
+                metrics.observe_admission_rejected("deadline")
+                raise AdmissionRejected(504, "Deadline exceeded")
+            self.timed_out += 1
+            metrics.observe_admission_rejected("wait_timeout")
+            raise AdmissionRejected(429, "Server busy", self.retry_after())
+        except DeadlineExceededError:
+            self.expired += 1
+            metrics.observe_admission_rejected("deadline")
+            raise AdmissionRejected(504, "Deadline exceeded")
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        metrics.observe_admission_wait(_PRIORITY_NAMES[priority], time.monotonic() - waiter.enqueued)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.admitted:
+            # The slot was handed over just as we gave up; pass it on.
+            self.release()
+            return
+        waiter.future.cancel()
+        self._dequeued(waiter)
+
+    def _dequeued(self, waiter: _Waiter) -> None:
+        self.queued -= 1
+        remaining = self._queued_by_caller.get(waiter.caller, 1) - 1
+        if remaining:
+            self._queued_by_caller[waiter.caller] = remaining
+        else:
+            self._queued_by_caller.pop(waiter.caller, None)
+
+    def _next(self) -> _Waiter | None:
+        for ring in self._queues:
+            while ring:
+                caller, waiters = next(iter(ring.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    ring.move_to_end(caller)
+                else:
+                    del ring[caller]
+                if waiter.future.done():
+                    continue  # abandoned, already uncounted
+                self._dequeued(waiter)
+                return waiter
+        return None
+
+    def release(self, service_seconds: float | None = None) -> None:
+        self.active -= 1
+        if service_seconds is not None:
+            self._service_seconds += 0.1 * (service_seconds - self._service_seconds)
+        while self.active < self.max_active:
+            waiter = self._next()
+            if waiter is None:
+                return
+            if waiter.deadline is not None and time.time() >= waiter.deadline:
+                waiter.future.set_exception(DeadlineExceededError())
+                continue
+            waiter.admitted = True
+            self.active += 1
+            self.admitted += 1
+            waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "maxActive": self.max_active,
+            "queued": self.queued,
+            "maxQueue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "expired": self.expired,
+            "timedOut": self.timed_out,
+            "serviceSeconds": round(self._service_seconds, 3),
+        }
+
+
+def _header(scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _parse_deadline(raw: str | None) -> float | None:
+    if not raw:
+        return None
+    try:
+        return float(raw) / 1000
+    except ValueError:
+        return None
+
+
+async def _reject(send, exc: AdmissionRejected) -> None:
+    headers = [(b"content-type", b"application/json")]
+    if exc.retry_after is not None:
+        headers.append((b"retry-after", str(int(exc.retry_after)).encode("latin-1")))
+    await send({"type": "http.response.start", "status": exc.status_code, "headers": headers})
+    body = f'{{"detail": "{exc.detail}"}}'.encode("utf-8")
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Holds an admission slot for the whole request, streaming included.
+
+    ``paths`` maps each controlled path to its default priority; callers may
+    lower their priority with ``X-Priority: batch`` but never raise it.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths: dict[str, int]):
+        self.app = app
+        self.controller = controller
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        caller = _header(scope, CLIENT_HEADER) or _header(scope, b"x-api-key") or ""
+        requested = PRIORITIES.get((_header(scope, PRIORITY_HEADER) or "").lower(), INTERACTIVE)
+        priority = max(self.paths[scope["path"]], requested)
+        deadline = _parse_deadline(_header(scope, DEADLINE_HEADER))
+
+        try:
+            await self.controller.acquire(caller, priority, deadline)
+        except AdmissionRejected as exc:
+            await _reject(send, exc)
+            return
+
+        token = _deadline.set(deadline)
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+            self.controller.release(time.monotonic() - started)
@@ -0,0 +1,78 @@
+"""Bounded, rate-limited fan-out for the bulk generation endpoints."""
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from .admission import DeadlineExceededError
+from .instructions.prompt import Prompt
+from .rate_limit import TokenBucket
+from .upstream import UpstreamTimeoutError
+from .upstream_pool import UpstreamUnavailableError
+
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "16"))
+BATCH_DEFAULT_PARALLELISM = int(os.getenv("BATCH_DEFAULT_PARALLELISM", "8"))
+BATCH_RATE_PER_SECOND = float(os.getenv("BATCH_RATE_PER_SECOND", "5"))
+
+# One bucket for every batch in the process, so concurrent batches share the rate.
+batch_bucket = TokenBucket(BATCH_RATE_PER_SECOND, capacity=1.0) if BATCH_RATE_PER_SECOND > 0 else None
+
+
+def _outcome(task: asyncio.Task) -> dict:
+    try:
+        result = task.result()
+    except UpstreamTimeoutError:
+        return {"error": "Upstream timeout"}
+    except UpstreamUnavailableError:
+        return {"error": "Upstream overloaded"}
+    except DeadlineExceededError:
+        return {"error": "Deadline exceeded"}
+    except Exception:
+        # Same as the stream endpoints: SDK and upstream messages stay server-side.
+        return {"error": "Upstream error"}
+    return {"result": result}
+
+
+async def run_batch(
+    prompts: list[Prompt | None],
+    generate: Callable[[Prompt], Awaitable[Any]],
+    parallelism: int = BATCH_DEFAULT_PARALLELISM,
+    bucket: TokenBucket | None = batch_bucket,
+) -> AsyncIterator[dict]:
+    """Yield ``{"index": ..., "result"|"error": ...}`` as each item completes.
+
+    ``generate`` returns an item's finished answer. ``None`` entries are items that failed validation. Identical prompts are
+    generated once and fanned back out to every index that asked for them.
+    """
+    indices_by_prompt: dict[Prompt, list[int]] = {}
+    for index, prompt in enumerate(prompts):
+        if prompt is None:
+            yield {"index": index, "error": "Missing prompt"}
+        else:
+            indices_by_prompt.setdefault(prompt, []).append(index)
+
+    slots = asyncio.Semaphore(max(1, min(parallelism, BATCH_MAX_PARALLELISM)))
+
+    async def run_one(prompt: Prompt) -> Any:
+        async with slots:
+            if bucket is not None:
+                await bucket.acquire()
+            return await generate(prompt)
+
+    tasks = {
+        asyncio.create_task(run_one(prompt)): indices
+        for prompt, indices in indices_by_prompt.items()
+    }
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                outcome = _outcome(task)
+                for index in tasks[task]:
+                    yield {"index": index, **outcome}
+    finally:
+        for task in pending:
+            task.cancel()
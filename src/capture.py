@@ -0,0 +1,349 @@
+"""Opt-in sampled traffic capture to rotating gzip JSONL, for ``benchmarks.replay``.
+
+A sampled request on CAPTURE_PATHS is recorded with its scrubbed JSON body,
+status, response size, timings and every generation it received (text, usage,
+prompt size, upstream seconds). Replaying those generations in order answers
+the same requests offline and deterministically.
+
+Scrubbing happens on the writer thread, off the event loop: API keys and other
+secret-looking fields are dropped, emails and phone numbers in learner text
+are masked, session and client ids are replaced by stable hashes. Headers are
+allowlisted; ``x-api-key`` is never written.
+"""
+
+import gzip
+import hashlib
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import orjson
+
+from . import metrics
+from .instructions.prompt import Prompt
+
+
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0.01"))
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+# Path prefixes; /topics/ keeps registered lessons so topicId requests replay too.
+CAPTURE_PATHS = tuple(
+    path.strip() for path in os.getenv("CAPTURE_PATHS", "/gemini,/topic/gemini,/topics/").split(",") if path.strip()
+)
+CAPTURE_MAX_BODY_BYTES = int(os.getenv("CAPTURE_MAX_BODY_BYTES", str(4 * 1024 * 1024)))
+CAPTURE_MAX_FILE_BYTES = int(os.getenv("CAPTURE_MAX_FILE_BYTES", str(64 * 1024 * 1024)))
+CAPTURE_ROTATE_SECONDS = float(os.getenv("CAPTURE_ROTATE_SECONDS", "3600"))
+CAPTURE_MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", "48"))
+CAPTURE_MAX_PENDING = int(os.getenv("CAPTURE_MAX_PENDING", "1000"))
+
+_HEADERS = (b"content-type", b"accept-encoding", b"x-priority", b"x-request-deadline")
+_HASHED_HEADERS = (b"x-client-id",)
+_SECRET_KEY_RE = re.compile(r"key|token|secret|password|authorization", re.IGNORECASE)
+_HASHED_FIELDS = ("sessionId",)
+_TEXT_FIELDS = ("prompt", "previousContext", "text")
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Phone numbers start with + or 0 (Cambodian 0xx / +855); bare digits are usually math.
+_PHONE_RE = re.compile(r"(?<![\w.])(?:\+|0)[0-9០-៩](?:[\s-]?[0-9០-៩]){7,12}(?![\w.])")
+
+_current: ContextVar["CaptureRecord | None"] = ContextVar("capture_record", default=None)
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+def scrub_text(text: str) -> str:
+    return _PHONE_RE.sub("<phone>", _EMAIL_RE.sub("<email>", text))
+
+
+def scrub(value: Any) -> Any:
+    """Scrubbed copy of a request body (dicts and lists all the way down)."""
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    scrubbed = {}
+    for key, item in value.items():
+        if _SECRET_KEY_RE.search(key):
+            continue
+        if key in _HASHED_FIELDS and isinstance(item, str):
+            scrubbed[key] = _hash(item)
+        elif key in _TEXT_FIELDS and isinstance(item, str):
+            scrubbed[key] = scrub_text(item)
+        elif key == "topicContent":
+            # Lesson content, not learner data; kept so topic requests replay as they were.
+            scrubbed[key] = item
+        else:
+            scrubbed[key] = scrub(item)
+    return scrubbed
+
+
+class CaptureRecord:
+    def __init__(self, scope: dict):
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query = scope.get("query_string", b"").decode("latin-1")
+        self.headers = {}
+        for key, value in scope["headers"]:
+            key = key.lower()
+            if key in _HEADERS:
+                self.headers[key.decode("latin-1")] = value.decode("latin-1")
+            elif key in _HASHED_HEADERS:
+                self.headers[key.decode("latin-1")] = _hash(value.decode("latin-1"))
+        self.body = bytearray()
+        self.request_bytes = 0
+        self.status: int | None = None
+        self.response_bytes = 0
+        self.content_encoding: str | None = None
+        self.first_byte_seconds: float | None = None
+        self.generations: list[dict] = []
+
+    def to_dict(self, timings: metrics.RequestTimings) -> dict:
+        return {
+            "timestamp": self.timestamp,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "headers": self.headers,
+            "body": bytes(self.body) if self.request_bytes <= CAPTURE_MAX_BODY_BYTES else None,
+            "requestBytes": self.request_bytes,
+            "status": self.status,
+            "responseBytes": self.response_bytes,
+            "contentEncoding": self.content_encoding,
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "firstByteSeconds": round(self.first_byte_seconds, 4) if self.first_byte_seconds is not None else None,
+            "responseType": timings.response_type,
+            "stages": {stage: round(seconds, 4) for stage, seconds in timings.stages.items()},
+            "cacheHit": timings.cache_hit,
+            "generations": self.generations,
+        }
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+def observe_generation(
+    prompt: Prompt,
+    text: str,
+    usage: dict | None,
+    seconds: float,
+    cached: bool,
+    first_token_seconds: float | None = None,
+) -> None:
+    """Called for every generation a captured request receives, cached ones included."""
+    record = _current.get()
+    if record is None:
+        return
+    record.generations.append({
+        "instructionKey": prompt.instruction_key,
+        "responseFormat": prompt.response_format,
+        "promptClass": prompt.prompt_class,
+        "promptBytes": len(prompt.text.encode("utf-8")),
+        "text": text,
+        "usage": usage,
+        "seconds": round(seconds, 4),
+        "firstTokenSeconds": round(first_token_seconds, 4) if first_token_seconds is not None else None,
+        "cached": cached,
+    })
+
+
+class CaptureWriter:
+    """Serializes, scrubs and writes records on a background thread."""
+
+    def __init__(
+        self,
+        directory: str = CAPTURE_DIR,
+        max_file_bytes: int = CAPTURE_MAX_FILE_BYTES,
+        rotate_seconds: float = CAPTURE_ROTATE_SECONDS,
+        max_files: int = CAPTURE_MAX_FILES,
+        max_pending: int = CAPTURE_MAX_PENDING,
+    ):
+        self.directory = Path(directory)
+        self.max_file_bytes = max_file_bytes
+        self.rotate_seconds = rotate_seconds
+        self.max_files = max_files
+        self.max_pending = max_pending
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._file: gzip.GzipFile | None = None
+        self._file_bytes = 0
+        self._file_opened = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.files = 0
+
+    def write(self, record: dict) -> None:
+        if self._queue.qsize() >= self.max_pending:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+            self._thread.start()
+        self._queue.put(record)
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            stop = record is None
+            records = [] if stop else [record]
+            # Drain what else is pending, then flush once so readers see whole lines.
+            while not stop and not self._queue.empty():
+                record = self._queue.get()
+                if record is None:
+                    stop = True
+                else:
+                    records.append(record)
+            for record in records:
+                self._append(self._serialize(record))
+            if self._file is not None:
+                self._file.flush()
+            if stop:
+                self._close_file()
+                return
+
+    @staticmethod
+    def _serialize(record: dict) -> bytes:
+        body = record["body"]
+        if body is not None:
+            try:
+                record["body"] = scrub(orjson.loads(body))
+            except orjson.JSONDecodeError:
+                record["body"] = None
+        return orjson.dumps(record) + b"\n"
+
+    def _append(self, line: bytes) -> None:
+        now = time.time()
+        if self._file is not None and (
+            self._file_bytes + len(line) > self.max_file_bytes or now - self._file_opened > self.rotate_seconds
+        ):
+            self._close_file()
+        if self._file is None:
+            self._open_file(now)
+        self._file.write(line)
+        self._file_bytes += len(line)
+        self.written += 1
+
+    def _open_file(self, now: float) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now))
+        # Zero-padded so name order is write order, which pruning below relies on.
+        path = self.directory / f"capture-{stamp}-{os.getpid()}-{self.files:06d}.jsonl.gz"
+        self._file = gzip.open(path, "wb", compresslevel=6)
+        self._file_bytes = 0
+        self._file_opened = now
+        self.files += 1
+        for old in sorted(self.directory.glob("capture-*.jsonl.gz"))[:-self.max_files]:
+            old.unlink(missing_ok=True)
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": CAPTURE_ENABLED,
+            "sampleRate": CAPTURE_SAMPLE_RATE,
+            "directory": str(self.directory),
+            "written": self.written,
+            "pending": self._queue.qsize(),
+            "dropped": self.dropped,
+            "files": self.files,
+        }
+
+
+class CaptureMiddleware:
+    def __init__(
+        self,
+        app,
+        writer: CaptureWriter,
+        paths: tuple[str, ...] = CAPTURE_PATHS,
+        sample_rate: float = CAPTURE_SAMPLE_RATE,
+    ):
+        self.app = app
+        self.writer = writer
+        self.paths = paths
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith(self.paths)
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        record = CaptureRecord(scope)
+        token = _current.set(record)
+
+        async def receive_captured():
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                record.request_bytes += len(body)
+                if record.request_bytes <= CAPTURE_MAX_BODY_BYTES:
+                    record.body += body
+            return message
+
+        async def send_captured(message):
+            if message["type"] == "http.response.start":
+                record.status = message["status"]
+                for key, value in message.get("headers", []):
+                    if key.lower() == b"content-encoding":
+                        record.content_encoding = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if body and record.first_byte_seconds is None:
+                    record.first_byte_seconds = time.perf_counter() - record.started
+                record.response_bytes += len(body)
+                if not message.get("more_body"):
+                    self.writer.write(record.to_dict(metrics.current()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_captured, send_captured)
+        finally:
+            _current.reset(token)
+
+
+def _files(paths: Iterable[str]) -> list[Path]:
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("capture-*.jsonl.gz")) if path.is_dir() else [path])
+    return files
+
+
+def read_capture(paths: Iterable[str]) -> Iterator[dict]:
+    """Records from capture files or directories, in timestamp order.
+
+    A file still being written (or cut off by a crash) ends at its last
+    complete line.
+    """
+    records = []
+    for path in _files(paths):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rb") as lines:
+            try:
+                for line in lines:
+                    if line.endswith(b"\n"):
+                        records.append(orjson.loads(line))
+            except EOFError:
+                pass
+    records.sort(key=lambda record: record["timestamp"])
+    return iter(records)
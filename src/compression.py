@@ -0,0 +1,196 @@
+"""Negotiated brotli/gzip compression of HTTP responses.
+
+Komplex answers are large, repetitive JSON (the same Tailwind classes and node
+shapes over and over), so they shrink several times over; that matters on the
+mobile connections many students use. Bodies under COMPRESSION_MIN_BYTES go
+out as they are. Other streamed bodies are compressed chunk by chunk with a
+flush after each, so nothing is held back; SSE and NDJSON streams, read line
+by line as they arrive, are left alone. Every response that could have been
+compressed carries ``Vary: Accept-Encoding``, compressed or not, so shared
+caches never hand one client's encoding to another.
+"""
+
+import os
+import zlib
+
+import brotli
+
+from . import metrics
+
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() != "false"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Dynamic responses: quality 4-5 is most of brotli's gain at a fraction of the CPU of 11.
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Preferred first when the client accepts both.
+ENCODINGS = ("br", "gzip")
+_SKIP_CONTENT_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """The best of ENCODINGS the Accept-Encoding header allows, if any."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(mode=brotli.MODE_TEXT, quality=COMPRESSION_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compressed ``data``, flushed so the client can decode it right away."""
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class _Stats:
+    def __init__(self):
+        self.responses = 0
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def observe(self, uncompressed: int, sent: int, compressed: bool) -> None:
+        self.responses += 1
+        self.compressed += compressed
+        self.bytes_in += uncompressed
+        self.bytes_out += sent
+        metrics.observe_response_bytes(uncompressed, sent)
+
+    def to_dict(self) -> dict:
+        return {
+            "enabled": COMPRESSION_ENABLED,
+            "minBytes": COMPRESSION_MIN_BYTES,
+            "responses": self.responses,
+            "compressed": self.compressed,
+            "uncompressedBytes": self.bytes_in,
+            "sentBytes": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+        }
+
+
+stats = _Stats()
+
+
+def _header(headers: list, name: bytes) -> bytes | None:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _vary(headers: list) -> list:
+    """``headers`` with Accept-Encoding added to Vary."""
+    vary = _header(headers, b"vary")
+    if vary is None:
+        return [*headers, (b"vary", b"Accept-Encoding")]
+    if vary.strip() == b"*" or b"accept-encoding" in vary.lower():
+        return headers
+    return [
+        (key, value + b", Accept-Encoding" if key.lower() == b"vary" else value)
+        for key, value in headers
+    ]
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = _header(scope["headers"], b"accept-encoding")
+        encoding = negotiate(accept_encoding.decode("latin-1")) if accept_encoding else None
+
+        start = None
+        encoder = None
+        passthrough = False
+        uncompressed = 0
+        sent = 0
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough, uncompressed, sent
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = _header(headers, b"content-type") or b""
+                compressible = (
+                    _header(headers, b"content-encoding") is None
+                    and not content_type.startswith(_SKIP_CONTENT_TYPES)
+                )
+                if compressible:
+                    message = {**message, "headers": _vary(headers)}
+                passthrough = encoding is None or not compressible
+                if passthrough:
+                    await send(message)
+                else:
+                    # Held until the first body chunk decides whether compressing pays off.
+                    start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            uncompressed += len(body)
+            if passthrough:
+                sent += len(body)
+                await send(message)
+            elif start is not None and not more_body and len(body) < self.minimum_size:
+                # The whole body in one message, and too small to be worth it.
+                await send(start)
+                start = None
+                passthrough = True
+                sent += len(body)
+                await send(message)
+            else:
+                if start is not None:
+                    encoder = _Encoder(encoding)
+                    headers = [
+                        (key, value)
+                        for key, value in start.get("headers", [])
+                        if key.lower() != b"content-length"
+                    ]
+                    headers.append((b"content-encoding", encoding.encode("latin-1")))
+                    data = encoder.finish(body) if not more_body else encoder.chunk(body)
+                    if not more_body:
+                        headers.append((b"content-length", str(len(data)).encode("latin-1")))
+                    await send({**start, "headers": headers})
+                    start = None
+                else:
+                    data = encoder.chunk(body) if more_body else encoder.finish(body)
+                sent += len(data)
+                await send({**message, "body": data})
+            if not more_body:
+                stats.observe(uncompressed, sent, encoder is not None)
+
+        await self.app(scope, receive, send_compressed)
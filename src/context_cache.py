@@ -0,0 +1,179 @@
+"""Upstream context caching of the static system instructions."""
+
+import asyncio
+import datetime
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from . import gemini_sdk
+from .instructions.prompt import Prompt
+
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() != "false"
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_REFRESH_SECONDS = int(os.getenv("CONTEXT_CACHE_REFRESH_SECONDS", "300"))
+CONTEXT_CACHE_RETRY_SECONDS = int(os.getenv("CONTEXT_CACHE_RETRY_SECONDS", "600"))
+CONTEXT_CACHE_MAX_HANDLES = int(os.getenv("CONTEXT_CACHE_MAX_HANDLES", "64"))
+
+
+@dataclass
+class _Handle:
+    cached_content: Any
+    model: Any
+    expires_at: float
+
+
+class ContextCache:
+    """Hands out a model whose static instructions are already cached upstream.
+
+    Cache handles are created and refreshed in the background; until one is
+    available, or whenever caching fails, requests fall back to a model that
+    sends the instruction as a plain ``system_instruction``.
+
+    With an ``api_key`` other than the configured default, models use their
+    own client and upstream caching is off (the SDK caches through the
+    default client only).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        enabled: bool = CONTEXT_CACHE_ENABLED,
+        ttl: int = CONTEXT_CACHE_TTL_SECONDS,
+        refresh_margin: int = CONTEXT_CACHE_REFRESH_SECONDS,
+        retry_after: int = CONTEXT_CACHE_RETRY_SECONDS,
+        max_handles: int = CONTEXT_CACHE_MAX_HANDLES,
+        api_key: str | None = None,
+    ):
+        self.model_name = model_name
+        self.enabled = enabled and api_key is None
+        self.api_key = api_key
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self.max_handles = max_handles
+        self.created = 0
+        self.refreshed = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self._handles: OrderedDict[str, _Handle] = OrderedDict()
+        self._fallback_models: OrderedDict[str, Any] = OrderedDict()
+        self._retry_at: dict[str, float] = {}
+        self._pending: dict[str, asyncio.Task] = {}
+        self._async_client = None
+
+    async def model_for(self, prompt: Prompt):
+        key = prompt.instruction_key
+        now = time.monotonic()
+        handle = self._handles.get(key)
+        if (
+            self.enabled
+            and now >= self._retry_at.get(key, 0.0)
+            and (handle is None or handle.expires_at - now < self.refresh_margin)
+        ):
+            self._schedule(prompt)
+        if handle is not None and handle.expires_at > now:
+            self._handles.move_to_end(key)
+            return handle.model
+        self.fallbacks += 1
+        return self._fallback_model(prompt)
+
+    async def ensure(self, prompt: Prompt) -> bool:
+        if not self.enabled:
+            return False
+        await self._schedule(prompt)
+        return prompt.instruction_key in self._handles
+
+    async def warm_up(self, prompts: list[Prompt]) -> None:
+        """Create cache handles for ``prompts`` and open this key's connection."""
+        if self.enabled:
+            await asyncio.gather(*(self.ensure(prompt) for prompt in prompts))
+        # A free call; it sets up the channel the first real request would otherwise pay for.
+        await self._fallback_model(prompts[0]).count_tokens_async("ping")
+
+    def _schedule(self, prompt: Prompt) -> asyncio.Task:
+        key = prompt.instruction_key
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._create_or_refresh(prompt))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return task
+
+    async def _create_or_refresh(self, prompt: Prompt) -> None:
+        key = prompt.instruction_key
+        handle = self._handles.get(key)
+        try:
+            if handle is not None and handle.expires_at > time.monotonic():
+                await asyncio.to_thread(
+                    handle.cached_content.update,
+                    ttl=datetime.timedelta(seconds=self.ttl),
+                )
+                handle.expires_at = time.monotonic() + self.ttl
+                self.refreshed += 1
+                return
+            cached_content = await asyncio.to_thread(
+                gemini_sdk.load().caching.CachedContent.create,
+                model=self.model_name,
+                display_name=f"komplex-{key}",
+                system_instruction=prompt.system_instruction,
+                ttl=datetime.timedelta(seconds=self.ttl),
+            )
+        except Exception:
+            # Content too short to cache, caching unsupported, quota, ... keep
+            # serving through system_instruction and try again later.
+            self.failures += 1
+            self._handles.pop(key, None)
+            self._retry_at[key] = time.monotonic() + self.retry_after
+            return
+        self._handles[key] = _Handle(
+            cached_content,
+            gemini_sdk.load().GenerativeModel.from_cached_content(cached_content),
+            time.monotonic() + self.ttl,
+        )
+        self.created += 1
+        while len(self._handles) > self.max_handles:
+            _, evicted = self._handles.popitem(last=False)
+            asyncio.create_task(self._delete(evicted))
+
+    async def _delete(self, handle: _Handle) -> None:
+        try:
+            await asyncio.to_thread(handle.cached_content.delete)
+        except Exception:
+            pass  # the upstream TTL removes it anyway
+
+    def _fallback_model(self, prompt: Prompt):
+        key = prompt.instruction_key
+        model = self._fallback_models.get(key)
+        if model is None:
+            model = gemini_sdk.load().GenerativeModel(
+                self.model_name,
+                system_instruction=prompt.system_instruction,
+            )
+            if self.api_key is not None:
+                model._async_client = self._client()
+            self._fallback_models[key] = model
+            while len(self._fallback_models) > self.max_handles:
+                self._fallback_models.popitem(last=False)
+        else:
+            self._fallback_models.move_to_end(key)
+        return model
+
+    def _client(self):
+        # No public per-model credentials in the SDK; build a client for our key.
+        if self._async_client is None:
+            self._async_client = gemini_sdk.async_client(self.api_key)
+        return self._async_client
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "handles": len(self._handles),
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,98 @@
+"""Token-budgeted compaction of the client-supplied previousContext."""
+
+import os
+import re
+
+from . import metrics
+from .khmer import estimate_tokens
+from .topic_content import compact_json_spans
+
+
+CONTEXT_BUDGET_KOMPLEX_TOKENS = int(os.getenv("CONTEXT_BUDGET_KOMPLEX_TOKENS", "2500"))
+CONTEXT_BUDGET_NORMAL_TOKENS = int(os.getenv("CONTEXT_BUDGET_NORMAL_TOKENS", "2000"))
+
+_TURN_MARKER_RE = re.compile(
+    r"^[ \t]*(?:[-*#]+[ \t]*)?(?:\*\*)?"
+    r"(?P<role>prompt|response|user|assistant|ai|question|answer|សំណួរ|ចម្លើយ)[ \t]*\d*[ \t]*(?:\*\*)?[ \t]*[:：]",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Markers that open a turn; the others continue the turn they follow.
+_QUESTION_ROLES = {"prompt", "user", "question", "សំណួរ"}
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+
+
+def _split_turns(text: str) -> tuple[str, list[str], str]:
+    """Split into (summary, turns oldest first, separator used to re-join turns).
+
+    A marked turn is a prompt together with the response after it, so trimming
+    never keeps an answer without its question or the other way round.
+    """
+    markers = list(_TURN_MARKER_RE.finditer(text))
+    starts = [
+        match.start()
+        for index, match in enumerate(markers)
+        if index == 0 or match.group("role").lower() in _QUESTION_ROLES
+    ]
+    if len(markers) >= 2:
+        ends = starts[1:] + [len(text)]
+        return text[: starts[0]], [text[start:end] for start, end in zip(starts, ends)], ""
+    paragraphs = _PARAGRAPH_RE.split(text)
+    return paragraphs[0], paragraphs[1:], "\n\n"
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = max(int(len(text) * max_tokens / tokens) - 1, 0)
+    return text[:keep] + "…"
+
+
+class ContextCompactor:
+    def __init__(self, budgets: dict[str, int] | None = None):
+        self.budgets = budgets or {
+            "komplex": CONTEXT_BUDGET_KOMPLEX_TOKENS,
+            "normal": CONTEXT_BUDGET_NORMAL_TOKENS,
+        }
+        self.calls = 0
+        self.trimmed = 0
+        self.turns_dropped = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def compact(self, previous_context: str | None, mode: str) -> str | None:
+        if not previous_context:
+            return previous_context
+        self.calls += 1
+        tokens_in = estimate_tokens(previous_context)
+        self.tokens_in += tokens_in
+
+        text = compact_json_spans(previous_context)
+        budget = self.budgets.get(mode, CONTEXT_BUDGET_NORMAL_TOKENS)
+        dropped = 0
+        if estimate_tokens(text) > budget:
+            summary, turns, separator = _split_turns(text)
+            turn_tokens = [estimate_tokens(turn) for turn in turns]
+            total = estimate_tokens(summary) + sum(turn_tokens)
+            while turns and total > budget:
+                total -= turn_tokens[dropped]
+                dropped += 1
+                turns = turns[1:]
+            self.turns_dropped += dropped
+            text = separator.join([summary, *turns]) if turns else _truncate(summary, budget)
+
+        tokens_out = estimate_tokens(text)
+        self.tokens_out += tokens_out
+        if tokens_out < tokens_in:
+            self.trimmed += 1
+        metrics.observe_context_compaction(mode, tokens_in, tokens_out, dropped)
+        return text
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "trimmed": self.trimmed,
+            "turnsDropped": self.turns_dropped,
+            "tokensIn": self.tokens_in,
+            "tokensOut": self.tokens_out,
+        }
@@ -0,0 +1,56 @@
+"""Deferred import and configuration of ``google.generativeai``.
+
+Importing the SDK pulls in gRPC and every generated proto module, roughly a
+second of a cold start. The service only needs it once the first upstream call
+is made, so it is loaded on first use (normally by the warm-up in
+``startup``, on a worker thread) instead of at import time.
+"""
+
+import threading
+from typing import Any
+
+
+_lock = threading.Lock()
+_api_key: str | None = None
+_genai = None
+
+
+def configure(api_key: str) -> None:
+    """Remember the default key; applied when the SDK is first loaded."""
+    global _api_key
+    _api_key = api_key
+
+
+def loaded() -> bool:
+    return _genai is not None
+
+
+def load():
+    """Import and configure the SDK once, returning the ``google.generativeai`` module."""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=_api_key)
+                _genai = genai
+    return _genai
+
+
+def async_client(api_key: str):
+    """A generative async client bound to ``api_key`` instead of the default key."""
+    from google.generativeai import client as genai_client
+
+    load()
+    manager = genai_client._ClientManager()
+    manager.configure(api_key=api_key)
+    return manager.get_default_client("generative_async")
+
+
+def generation_config(config: dict) -> dict[str, Any]:
+    """Convert a plain generation config (schemas included) to the SDK's form once."""
+    from google.generativeai.types import generation_types
+
+    load()
+    return generation_types.to_generation_config_dict(config)
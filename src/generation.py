@@ -0,0 +1,200 @@
+"""Generation pipeline between the tutoring endpoints and the Gemini upstream."""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from . import capture, metrics, prompt_classifier
+from .admission import check_deadline
+from .instructions.prompt import Prompt
+from .near_duplicate import NearDuplicateIndex
+from .response_cache import ResponseCache, cache_key
+from .singleflight import SingleFlight
+from .upstream import GeminiUpstream, chunk_text, finish_reason, usage_to_dict
+
+
+# Turns a complete upstream answer into the one that is cached and served (see komplex_output.finalize).
+Finalize = Callable[[str], Awaitable[str]]
+
+
+@dataclass
+class Generation:
+    text: str
+    usage: dict | None = None
+    cached: bool = False
+
+
+@dataclass
+class CachedChunk:
+    text: str
+    usage_metadata: Any = None
+
+
+class GenerationService:
+    def __init__(
+        self,
+        upstream: GeminiUpstream,
+        cache: ResponseCache,
+        near: NearDuplicateIndex | None = None,
+        finalizers: dict[str, Finalize] | None = None,
+    ):
+        self.upstream = upstream
+        self.cache = cache
+        self.near = near
+        # Keyed by Prompt.response_format. Answers are finalized before they are cached,
+        # so a hit never repeats the repair or its upstream regeneration.
+        self.finalizers = finalizers or {}
+        self.flights = SingleFlight()
+        self._background: set[asyncio.Task] = set()
+        self.finalize_errors = 0
+
+    async def _cached(self, key: str, prompt: Prompt, use_cache: bool) -> str | None:
+        if not use_cache:
+            self.cache.bypassed += 1
+            return None
+        cached = await self.cache.get(key)
+        if cached is not None:
+            metrics.observe_cache_hit()
+            return cached
+        if self.near is None or prompt.near_query is None:
+            return None
+        near_key = self.near.get(prompt.near_query)
+        if near_key is None or near_key == key:
+            return None
+        cached = await self.cache.get(near_key)
+        if cached is None:
+            self.near.expire(near_key)
+            return None
+        metrics.observe_near_duplicate_hit()
+        return cached
+
+    async def _store(self, key: str, prompt: Prompt, text: str) -> None:
+        await self.cache.set(key, text)
+        if self.near is not None and prompt.near_query is not None:
+            self.near.add(prompt.near_query, key)
+
+    async def generate(self, prompt: Prompt, use_cache: bool = True) -> Generation:
+        key = cache_key(prompt.system_instruction, prompt.contents)
+        cached = await self._cached(key, prompt, use_cache)
+        if cached is not None:
+            capture.observe_generation(prompt, cached, None, 0.0, cached=True)
+            return Generation(cached, cached=True)
+        check_deadline()
+        started = time.perf_counter()
+        generation = await self.flights.do(key, lambda: self._generate_and_store(key, prompt))
+        capture.observe_generation(
+            prompt, generation.text, generation.usage, time.perf_counter() - started, cached=False
+        )
+        return generation
+
+    async def _generate_and_store(self, key: str, prompt: Prompt) -> Generation:
+        started = time.perf_counter()
+        try:
+            response = await self.upstream.generate(prompt)
+            text = response.text
+        except Exception as exc:
+            metrics.observe_upstream_error(exc)
+            raise
+        finally:
+            metrics.observe_upstream(time.perf_counter() - started)
+        prompt_classifier.observe_upstream(
+            prompt.prompt_class, time.perf_counter() - started, finish_reason(response)
+        )
+        usage = usage_to_dict(response.usage_metadata)
+        metrics.observe_usage(usage)
+        finalize = self.finalizers.get(prompt.response_format)
+        if text and finalize is not None:
+            text = await finalize(text)
+        if text:
+            await self._store(key, prompt, text)
+        return Generation(text, usage)
+
+    async def stream(self, prompt: Prompt, use_cache: bool = True):
+        key = cache_key(prompt.system_instruction, prompt.contents)
+        cached = await self._cached(key, prompt, use_cache)
+        if cached is not None:
+            capture.observe_generation(prompt, cached, None, 0.0, cached=True)
+            yield CachedChunk(cached)
+            return
+        check_deadline()
+        if not capture.active():
+            async for chunk in self.flights.stream(key, lambda: self._stream_and_store(key, prompt)):
+                yield chunk
+            return
+        parts = []
+        usage = None
+        first_token = None
+        started = time.perf_counter()
+        async for chunk in self.flights.stream(key, lambda: self._stream_and_store(key, prompt)):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            parts.append(chunk_text(chunk))
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+        capture.observe_generation(
+            prompt,
+            "".join(parts),
+            usage_to_dict(usage) if usage is not None else None,
+            time.perf_counter() - started,
+            cached=False,
+            first_token_seconds=first_token,
+        )
+
+    async def _stream_and_store(self, key: str, prompt: Prompt):
+        parts = []
+        usage = None
+        reason = None
+        started = time.perf_counter()
+        try:
+            async for chunk in self.upstream.stream(prompt):
+                if not parts:
+                    metrics.observe_first_token(time.perf_counter() - started)
+                parts.append(chunk_text(chunk))
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                reason = finish_reason(chunk) or reason
+                yield chunk
+        except Exception as exc:
+            metrics.observe_upstream_error(exc)
+            raise
+        finally:
+            metrics.observe_upstream(time.perf_counter() - started)
+        prompt_classifier.observe_upstream(prompt.prompt_class, time.perf_counter() - started, reason)
+        if usage is not None:
+            metrics.observe_usage(usage_to_dict(usage))
+        text = "".join(parts)
+        if not text:
+            return
+        finalize = self.finalizers.get(prompt.response_format)
+        if finalize is None:
+            await self._store(key, prompt, text)
+            return
+        # The streamed boxes were validated as they went out; the cached copy is
+        # finalized off the stream so its end is not held back.
+        task = asyncio.create_task(self._finalize_and_store(key, prompt, text, finalize))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _finalize_and_store(self, key: str, prompt: Prompt, text: str, finalize: Finalize) -> None:
+        # Nobody awaits this task: a failure (e.g. in the regeneration) is counted, not raised.
+        try:
+            text = await finalize(text)
+        except Exception as exc:
+            self.finalize_errors += 1
+            metrics.observe_upstream_error(exc)
+            return
+        if text:
+            await self._store(key, prompt, text)
+
+    def stats(self) -> dict:
+        return {
+            "upstream": {
+                "inFlight": self.upstream.in_flight,
+                "maxInFlight": self.upstream.max_in_flight,
+                "hedging": self.upstream.hedging.stats(),
+            },
+            "cache": self.cache.stats(),
+            "coalescing": self.flights.stats(),
+            "nearDuplicateCache": self.near.stats() if self.near is not None else None,
+            "backgroundFinalizeErrors": self.finalize_errors,
+        }
@@ -0,0 +1,113 @@
+"""When to send a second copy of a slow Gemini call, and how often we may."""
+
+import os
+from collections import deque
+
+from . import metrics
+
+
+UPSTREAM_HEDGE_ENABLED = os.getenv("UPSTREAM_HEDGE_ENABLED", "false").lower() == "true"
+UPSTREAM_HEDGE_PERCENTILE = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "0.95"))
+UPSTREAM_HEDGE_INITIAL_DELAY_SECONDS = float(os.getenv("UPSTREAM_HEDGE_INITIAL_DELAY_SECONDS", "8"))
+UPSTREAM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+UPSTREAM_HEDGE_BUDGET = float(os.getenv("UPSTREAM_HEDGE_BUDGET", "0.05"))
+UPSTREAM_HEDGE_WINDOW = int(os.getenv("UPSTREAM_HEDGE_WINDOW", "500"))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "50"))
+
+_RECOMPUTE_EVERY = 20
+_MAX_CREDIT = 10.0
+
+
+class _LatencyWindow:
+    def __init__(self, size: int):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.added = 0
+        self.cached: float | None = None
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.added += 1
+        if self.added % _RECOMPUTE_EVERY == 0:
+            self.cached = None
+
+    def percentile(self, fraction: float) -> float:
+        if self.cached is None:
+            ordered = sorted(self.samples)
+            self.cached = ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+        return self.cached
+
+
+class HedgePolicy:
+    """Percentile-based hedge delays per kind of call, under a budget.
+
+    Every call earns ``budget`` credit and every hedge spends one, so hedges
+    stay below that share of calls however slow the upstream gets.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = UPSTREAM_HEDGE_ENABLED,
+        percentile: float = UPSTREAM_HEDGE_PERCENTILE,
+        initial_delay: float = UPSTREAM_HEDGE_INITIAL_DELAY_SECONDS,
+        min_delay: float = UPSTREAM_HEDGE_MIN_DELAY_SECONDS,
+        budget: float = UPSTREAM_HEDGE_BUDGET,
+        window: int = UPSTREAM_HEDGE_WINDOW,
+        min_samples: int = UPSTREAM_HEDGE_MIN_SAMPLES,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.budget = budget
+        self.window = window
+        self.min_samples = min_samples
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+        self._credit = 0.0
+        self._windows: dict[str, _LatencyWindow] = {}
+
+    def delay(self, kind: str) -> float:
+        self.calls += 1
+        self._credit = min(self._credit + self.budget, _MAX_CREDIT)
+        window = self._windows.get(kind)
+        if window is None or len(window.samples) < self.min_samples:
+            return self.initial_delay
+        return max(window.percentile(self.percentile), self.min_delay)
+
+    def observe(self, kind: str, seconds: float) -> None:
+        window = self._windows.get(kind)
+        if window is None:
+            window = self._windows[kind] = _LatencyWindow(self.window)
+        window.add(seconds)
+
+    def try_hedge(self) -> bool:
+        if self._credit < 1:
+            self.over_budget += 1
+            metrics.observe_hedge("over_budget")
+            return False
+        self._credit -= 1
+        self.hedged += 1
+        metrics.observe_hedge("sent")
+        return True
+
+    def finished(self, hedge_won: bool) -> None:
+        if hedge_won:
+            self.hedge_wins += 1
+        metrics.observe_hedge("won" if hedge_won else "lost")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedgeWins": self.hedge_wins,
+            "winRate": round(self.hedge_wins / self.hedged, 3) if self.hedged else 0.0,
+            "overBudget": self.over_budget,
+            "delays": {
+                kind: round(window.percentile(self.percentile), 3)
+                for kind, window in self._windows.items()
+                if len(window.samples) >= self.min_samples
+            },
+        }
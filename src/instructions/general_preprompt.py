@@ -1,12 +1,13 @@
 from enum import Enum
 
+from .prompt import Prompt
+
 class ResponseType(str, Enum):
     KOMPLEX = "komplex"
     NORMAL = "normal"
 
 
-def _komplex_prompt(prompt: str, previous_context: str) -> str:
-    return f"""
+KOMPLEX_INSTRUCTION = """
         You are តារា AI (Dara AI), an AI assistant of KOMPLEX—a STEM learning platform designed for high school students in Cambodia. You respond using TopicContent_V3 JSON only.
 
         ---
@@ -66,10 +67,10 @@ def _komplex_prompt(prompt: str, previous_context: str) -> str:
             * exercise → questions[] array where each question has: question (string), options[] (string array, 2-4 options), correctAnswer (number index 0-based). Options support LaTeX math via InlineMath nodes.
             * graph  → **expressions** array (never "equations") where each item has id, latex, color?, hidden?; options? may include xAxisLabel, yAxisLabel, showGrid, etc.
         - Node tree requirements:
-            * Plain text → {{ "type": "text", "value": "…" }}
-            * Inline math → {{ "type": "InlineMath", "props": {{ "math": "…" }} }}
-            * Block math → {{ "type": "BlockMath", "props": {{ "math": "…" }} }}
-            * Lucide icons or custom elements → {{ "type": "LucideIcon", "props": {{ "name": "ArrowDown", "className": "…" }} }}
+            * Plain text → { "type": "text", "value": "…" }
+            * Inline math → { "type": "InlineMath", "props": { "math": "…" } }
+            * Block math → { "type": "BlockMath", "props": { "math": "…" } }
+            * Lucide icons or custom elements → { "type": "LucideIcon", "props": { "name": "ArrowDown", "className": "…" } }
             * HTML containers → type "div"/"span"/"p"/"table"/etc with props.children arrays; include Tailwind className for spacing/layout.
         - Children arrays must preserve order; nest nodes exactly as needed.
         - Never invent new property names (e.g., do not create "equations" on a graph); reuse only those listed above to prevent renderer crashes.
@@ -85,7 +86,11 @@ def _komplex_prompt(prompt: str, previous_context: str) -> str:
         7. For academic content, omit conversational endings; for greetings/about KOMPLEX, keep it natural
 
         ---
+    """
+
 
+def _komplex_user_prompt(prompt: str, previous_context: str) -> str:
+    return f"""
         ## Learner prompt
         {prompt}
 
@@ -99,8 +104,7 @@ def _komplex_prompt(prompt: str, previous_context: str) -> str:
     """
 
 
-def _normal_prompt(prompt: str, previous_context: str) -> str:
-    return f"""
+NORMAL_INSTRUCTION = """
         You are **តារា AI** (Dara AI), an AI assistant of KOMPLEX—a STEM learning platform designed for high school students in Cambodia.
 
         Your job is to **explain clearly** and **format beautifully**.
@@ -174,7 +178,11 @@ def _normal_prompt(prompt: str, previous_context: str) -> str:
            - Only include exercises when explicitly requested; never provide answers—remind learners to solve them.
 
         ---
+    """
 
+
+def _normal_user_prompt(prompt: str, previous_context: str) -> str:
+    return f"""
         ### Input:
         "{prompt}"
 
@@ -188,8 +196,21 @@ def _normal_prompt(prompt: str, previous_context: str) -> str:
     """
 
 
-def pre_prompt(prompt: str, previous_context: str, response_type: ResponseType) -> str:
+def general_prompt(prompt: str, previous_context: str, response_type: ResponseType) -> Prompt:
     previous_context = previous_context or "គ្មានព័ត៌មានមុន"
     if response_type == ResponseType.KOMPLEX:
-        return _komplex_prompt(prompt, previous_context)
-    return _normal_prompt(prompt, previous_context)
+        return Prompt(
+            "general:komplex",
+            KOMPLEX_INSTRUCTION,
+            _komplex_user_prompt(prompt, previous_context),
+            "json",
+        )
+    return Prompt(
+        "general:normal",
+        NORMAL_INSTRUCTION,
+        _normal_user_prompt(prompt, previous_context),
+    )
+
+
+def pre_prompt(prompt: str, previous_context: str, response_type: ResponseType) -> str:
+    return general_prompt(prompt, previous_context, response_type).text
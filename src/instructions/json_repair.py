@@ -0,0 +1,40 @@
+from .prompt import Prompt
+
+
+SYSTEM_INSTRUCTION = """
+        You repair broken TopicContent_V3 boxes produced by តារា AI (Dara AI) on the KOMPLEX platform.
+
+        ## Rules
+        - You receive numbered fragments; each one was meant to be a single box but is invalid JSON or breaks the contract.
+        - Return a JSON array with exactly one corrected box per fragment, in the same order.
+        - Keep the wording, Khmer text and LaTeX exactly as they are; only fix syntax, structure and prop names.
+        - If a fragment was cut off, close it at the last complete sentence instead of inventing new content.
+
+        ## Contract
+        - Each box = { "type": …, "props": { … } } with type definition, tip, hint, warning, example, exercise, graph or graphExplanation.
+        - definition → title, content; tip → title?, icon?, content; hint/warning → content, icon?
+        - example → question, content?, steps[] (title?, content?), answer?
+        - exercise → questions[] of { question (string), options[] (2-4 strings), correctAnswer (0-based number) }
+        - graph / graphExplanation → expressions[] of { id, latex, color?, hidden? } (never "equations"), options?
+        - Node trees: { "type": "text", "value": … }, { "type": "InlineMath" | "BlockMath", "props": { "math": … } }, HTML containers with props.children arrays.
+    """
+
+
+def repair_prompt(fragments: list[str]) -> Prompt:
+    numbered = "\n\n".join(
+        f"### Fragment {number}\n{fragment}" for number, fragment in enumerate(fragments, start=1)
+    )
+
+    return Prompt(
+        "komplex:repair",
+        SYSTEM_INSTRUCTION,
+        f"""
+        ## Broken fragments
+        {numbered}
+
+        ---
+
+        Return the corrected JSON array now.
+    """,
+        "json",
+    )
@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+
+from ..near_duplicate import NearQuery
+
+
+@dataclass(frozen=True)
+class Prompt:
+    instruction_key: str
+    system_instruction: str
+    contents: str
+    # "json" asks the upstream for application/json output (see komplex_output).
+    response_format: str = "text"
+    # Generation budget class picked by prompt_classifier; "" keeps the defaults.
+    prompt_class: str = ""
+    # Set when a close rephrasing may reuse a cached answer (see near_duplicate).
+    near_query: NearQuery | None = None
+
+    @property
+    def text(self) -> str:
+        return self.system_instruction + self.contents
@@ -0,0 +1,35 @@
+from .prompt import Prompt
+
+
+SYSTEM_INSTRUCTION = """
+        You maintain the running summary of a tutoring chat between a Cambodian high school student and តារា AI (Dara AI) on the KOMPLEX platform.
+
+        ## Rules
+        - Merge the new turns into the existing summary; never drop facts from the existing summary unless a newer turn contradicts them.
+        - Keep what later answers need: the subject and lesson being studied, what the student asked, what was explained, formulas and results that were derived, and anything the student found confusing.
+        - Drop greetings, formatting, layout details and TopicContent_V3 JSON structure; keep the math itself in LaTeX.
+        - Write in Khmer, as short bullet points, at most 150 words in total.
+        - Return the summary text only, without headings or commentary.
+    """
+
+
+def _format_turns(turns: list[tuple[str, str]]) -> str:
+    return "\n".join(
+        f"Prompt: {prompt}\nResponse: {response}" for prompt, response in turns
+    )
+
+
+def summary_prompt(summary: str, turns: list[tuple[str, str]]) -> Prompt:
+    summary = summary or "គ្មានព័ត៌មានមុន"
+
+    return Prompt(
+        "session:summary",
+        SYSTEM_INSTRUCTION,
+        f"""
+        ## Existing summary
+        {summary}
+
+        ## New turns
+        {_format_turns(turns)}
+    """,
+    )
@@ -1,6 +1,8 @@
 import json
 from typing import Any, Optional
 
+from .prompt import Prompt
+
 
 def _stringify_topic_content(topic_content: Any) -> str:
     if topic_content is None:
@@ -8,16 +10,12 @@ def _stringify_topic_content(topic_content: Any) -> str:
     if isinstance(topic_content, str):
         return topic_content
     try:
-        return json.dumps(topic_content, ensure_ascii=False, indent=2)
+        return json.dumps(topic_content, ensure_ascii=False, separators=(",", ":"))
     except TypeError:
         return str(topic_content)
 
 
-def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional[str]) -> str:
-    topic_payload = _stringify_topic_content(topic_content)
-    previous_context = previous_context or "គ្មានព័ត៌មានមុន"
-
-    return f"""
+SYSTEM_INSTRUCTION = """
         You are **តារា AI** (Dara AI), a male AI assistant of KOMPLEX—a STEM learning platform designed for high school students in Cambodia. You should rely on the provided topic JSON for roughly 60% of each answer while using up to 40% creative, in-scope reasoning that still matches the lesson's level. Use "បាទ" as yes/no response.
 
         ---
@@ -76,10 +74,10 @@ def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional
             * exercise → questions[] array where each question has: question (string), options[] (string array, 2-4 options), correctAnswer (number index 0-based). Options support LaTeX math via InlineMath nodes.
             * graph / graphExplanation → **expressions** array (never "equations") where each item has id, latex, color?, hidden?; options? may include xAxisLabel, yAxisLabel, showGrid, etc.
         - Node tree requirements:
-            * Plain text → {{ "type": "text", "value": "…" }}
-            * Inline math → {{ "type": "InlineMath", "props": {{ "math": "…" }} }}
-            * Block math → {{ "type": "BlockMath", "props": {{ "math": "…" }} }}
-            * Lucide icons or custom elements → {{ "type": "LucideIcon", "props": {{ "name": "ArrowDown", "className": "…" }} }}
+            * Plain text → { "type": "text", "value": "…" }
+            * Inline math → { "type": "InlineMath", "props": { "math": "…" } }
+            * Block math → { "type": "BlockMath", "props": { "math": "…" } }
+            * Lucide icons or custom elements → { "type": "LucideIcon", "props": { "name": "ArrowDown", "className": "…" } }
             * HTML containers → type "div"/"span"/"p"/"table"/etc with props.children arrays; include Tailwind className for spacing/layout.
         - Children arrays must preserve order; nest nodes exactly as needed.
         - Never invent new property names (e.g., do not create "equations" on a graph); reuse only those listed above to prevent renderer crashes.
@@ -94,10 +92,22 @@ def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional
         6. When graphs/tables are required, build them minimally (few expressions/rows) and omit unrelated theory
         7. For academic content, stop once the request is satisfied—no conversational farewell; for greetings/about KOMPLEX, keep it natural
         8. Include only the boxes strictly needed; never restate the full topic JSON
+    """
+
 
+def _topic_section(topic_content: Any) -> str:
+    topic_payload = _stringify_topic_content(topic_content)
+
+    return f"""
         ## Topic JSON (authoritative source to mirror)
         {topic_payload}
+    """
+
 
+def _learner_section(prompt: str, previous_context: Optional[str]) -> str:
+    previous_context = previous_context or "គ្មានព័ត៌មានមុន"
+
+    return f"""
         ## Learner prompt
         {prompt}
 
@@ -109,3 +119,33 @@ def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional
 
         Produce the final answer now as valid TopicContent_V3 JSON, strictly obeying every rule above.
     """
+
+
+def topic_user_prompt(prompt: str, topic_content: Any, previous_context: Optional[str]) -> str:
+    return _topic_section(topic_content) + _learner_section(prompt, previous_context)
+
+
+def topic_prompt(
+    prompt: str,
+    topic_content: Any,
+    previous_context: Optional[str],
+    topic_key: Optional[str] = None,
+) -> Prompt:
+    if topic_key is None:
+        return Prompt(
+            "topic:komplex",
+            SYSTEM_INSTRUCTION,
+            topic_user_prompt(prompt, topic_content, previous_context),
+            "json",
+        )
+    # Hot registered topics carry the lesson JSON in the cached prefix too.
+    return Prompt(
+        f"topic:komplex:{topic_key}",
+        SYSTEM_INSTRUCTION + _topic_section(topic_content),
+        _learner_section(prompt, previous_context),
+        "json",
+    )
+
+
+def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional[str]) -> str:
+    return topic_prompt(prompt, topic_content, previous_context).text
@@ -1,6 +1,8 @@
 import json
 from typing import Any, Optional
 
+from .prompt import Prompt
+
 
 def _stringify_topic_content(topic_content: Any) -> str:
     if topic_content is None:
@@ -8,16 +10,12 @@ def _stringify_topic_content(topic_content: Any) -> str:
     if isinstance(topic_content, str):
         return topic_content
     try:
-        return json.dumps(topic_content, ensure_ascii=False, indent=2)
+        return json.dumps(topic_content, ensure_ascii=False, separators=(",", ":"))
     except TypeError:
         return str(topic_content)
 
 
-def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional[str]) -> str:
-    topic_payload = _stringify_topic_content(topic_content)
-    previous_context = previous_context or "គ្មានព័ត៌មានមុន"
-
-    return f"""
+SYSTEM_INSTRUCTION = """
         You are **តារា AI** (Dara AI), a male AI assistant of KOMPLEX—a STEM learning platform designed for high school students in Cambodia. You should rely on the provided topic JSON for roughly 60% of each answer while using up to 40% creative, in-scope reasoning (still aligned with the same lesson level). Use "បាទ" as yes/no response.
 
         ---
@@ -71,10 +69,22 @@ def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional
         5. Examples/exercises → present as math solution steps with Khmer annotations only when necessary
         6. When summarizing or comparing, prefer compact tables or bullet lists; keep them minimal
         7. For academic content, omit conversational endings; for greetings/about KOMPLEX, keep it natural
+    """
+
+
+def _topic_section(topic_content: Any) -> str:
+    topic_payload = _stringify_topic_content(topic_content)
 
+    return f"""
         ## Topic JSON (messy but authoritative)
         {topic_payload}
+    """
 
+
+def _learner_section(prompt: str, previous_context: Optional[str]) -> str:
+    previous_context = previous_context or "គ្មានព័ត៌មានមុន"
+
+    return f"""
         ## Learner prompt
         {prompt}
 
@@ -86,3 +96,31 @@ def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional
 
         Produce the final explanation now, strictly obeying every rule above.
     """
+
+
+def topic_user_prompt(prompt: str, topic_content: Any, previous_context: Optional[str]) -> str:
+    return _topic_section(topic_content) + _learner_section(prompt, previous_context)
+
+
+def topic_prompt(
+    prompt: str,
+    topic_content: Any,
+    previous_context: Optional[str],
+    topic_key: Optional[str] = None,
+) -> Prompt:
+    if topic_key is None:
+        return Prompt(
+            "topic:normal",
+            SYSTEM_INSTRUCTION,
+            topic_user_prompt(prompt, topic_content, previous_context),
+        )
+    # Hot registered topics carry the lesson JSON in the cached prefix too.
+    return Prompt(
+        f"topic:normal:{topic_key}",
+        SYSTEM_INSTRUCTION + _topic_section(topic_content),
+        _learner_section(prompt, previous_context),
+    )
+
+
+def topic_pre_prompt(prompt: str, topic_content: Any, previous_context: Optional[str]) -> str:
+    return topic_prompt(prompt, topic_content, previous_context).text
@@ -0,0 +1,45 @@
+"""Khmer-aware text helpers shared by the prompt pipeline."""
+
+import re
+import unicodedata
+
+
+KHMER_RE = re.compile(r"[\u1780-\u17FF\u19E0-\u19FF]")
+
+_KHMER_RUN = r"[\u1780-\u17D3\u17DD\u19E0-\u19FF]+"
+_TOKEN_RE = re.compile(_KHMER_RUN + r"|\\[A-Za-z]+|[A-Za-z]+|\d+(?:\.\d+)?|[=+\-*/^<>]")
+_KHMER_RUN_RE = re.compile(_KHMER_RUN)
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))
+_SPACES_RE = re.compile(r"\s+")
+
+# Rough Gemini tokenizer ratios: Khmer syllables split into far more pieces
+# than Latin words do.
+KHMER_TOKENS_PER_CHAR = 0.5
+OTHER_TOKENS_PER_CHAR = 0.25
+
+
+def is_khmer(text: str) -> bool:
+    return bool(KHMER_RE.search(text))
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFC", text).translate(_INVISIBLE).lower()
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def tokenize(text: str) -> list[str]:
+    """Word tokens for Latin/math, character bigrams for unsegmented Khmer runs."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(normalize(text)):
+        token = match.group()
+        if len(token) > 1 and _KHMER_RUN_RE.fullmatch(token):
+            tokens.extend(token[i : i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    khmer_chars = len(KHMER_RE.findall(text))
+    other_chars = len(text) - khmer_chars
+    return int(khmer_chars * KHMER_TOKENS_PER_CHAR + other_chars * OTHER_TOKENS_PER_CHAR) + 1
@@ -0,0 +1,491 @@
+"""JSON-mode generation and validation of TopicContent_V3 (komplex) answers.
+
+Gemini is asked for ``application/json`` against a schema derived from the
+serializer contract in the komplex prompts. Its schema dialect has no
+references, so node trees are only described down to ``_SCHEMA_NODE_DEPTH``
+levels; everything is validated again here. Boxes that break the contract are
+repaired locally where the fix is mechanical (renamed props, bare strings
+where node arrays belong, a trailing comma, ...). Whatever is still broken gets
+one targeted regeneration of just those fragments.
+"""
+
+import json
+import os
+import re
+from typing import Any, Awaitable, Callable
+
+import orjson
+
+from . import metrics
+from .instructions.json_repair import repair_prompt
+from .instructions.prompt import Prompt
+from .payloads import dumps
+from .streaming import TopLevelBoxSplitter
+from .topic_content import compact_nodes
+
+
+KOMPLEX_JSON_MODE = os.getenv("KOMPLEX_JSON_MODE", "true").lower() != "false"
+KOMPLEX_REGENERATE = os.getenv("KOMPLEX_REGENERATE", "true").lower() != "false"
+# Drop empty text nodes and single-child wrappers before answers go out; className stays.
+KOMPLEX_COMPACT = os.getenv("KOMPLEX_COMPACT", "true").lower() != "false"
+
+_SCHEMA_NODE_DEPTH = 4
+
+BOX_PROPS = {
+    "definition": {"title", "content"},
+    "tip": {"title", "icon", "content"},
+    "hint": {"title", "icon", "content"},
+    "warning": {"title", "icon", "content"},
+    "example": {"title", "question", "content", "steps", "answer"},
+    "exercise": {"title", "questions"},
+    "graph": {"title", "expressions", "options"},
+    "graphExplanation": {"title", "expressions", "options", "content"},
+}
+_NODE_PROPS = ("content", "question", "answer")
+_TYPE_ALIASES = {
+    "note": "tip",
+    "info": "tip",
+    "caution": "warning",
+    "explanation": "definition",
+    "summary": "definition",
+    "text": "definition",
+    "quiz": "exercise",
+}
+_PROP_ALIASES = {
+    "equations": "expressions",
+    "children": "content",
+    "body": "content",
+    "solution": "answer",
+    "questionList": "questions",
+    # A text node sent as a box (aliased to definition) keeps its words as content.
+    "value": "content",
+}
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+# Schema ======================================================================
+
+
+def _node_schema(depth: int) -> dict:
+    props = {
+        "math": {"type": "STRING"},
+        "name": {"type": "STRING"},
+        "className": {"type": "STRING"},
+        "href": {"type": "STRING"},
+    }
+    if depth > 0:
+        props["children"] = {"type": "ARRAY", "items": _node_schema(depth - 1)}
+    return {
+        "type": "OBJECT",
+        "properties": {
+            "type": {"type": "STRING"},
+            "value": {"type": "STRING"},
+            "props": {"type": "OBJECT", "properties": props},
+        },
+        "required": ["type"],
+    }
+
+
+def _response_schema() -> dict:
+    nodes = {"type": "ARRAY", "items": _node_schema(_SCHEMA_NODE_DEPTH)}
+    return {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {
+                "type": {"type": "STRING", "enum": sorted(BOX_PROPS)},
+                "props": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "title": {"type": "STRING"},
+                        "icon": {"type": "STRING"},
+                        "content": nodes,
+                        "question": nodes,
+                        "answer": nodes,
+                        "steps": {
+                            "type": "ARRAY",
+                            "items": {
+                                "type": "OBJECT",
+                                "properties": {"title": {"type": "STRING"}, "content": nodes},
+                            },
+                        },
+                        "questions": {
+                            "type": "ARRAY",
+                            "items": {
+                                "type": "OBJECT",
+                                "properties": {
+                                    "question": {"type": "STRING"},
+                                    "options": {"type": "ARRAY", "items": {"type": "STRING"}},
+                                    "correctAnswer": {"type": "INTEGER"},
+                                },
+                                "required": ["question", "options", "correctAnswer"],
+                            },
+                        },
+                        "expressions": {
+                            "type": "ARRAY",
+                            "items": {
+                                "type": "OBJECT",
+                                "properties": {
+                                    "id": {"type": "STRING"},
+                                    "latex": {"type": "STRING"},
+                                    "color": {"type": "STRING"},
+                                    "hidden": {"type": "BOOLEAN"},
+                                },
+                                "required": ["id", "latex"],
+                            },
+                        },
+                        "options": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "xAxisLabel": {"type": "STRING"},
+                                "yAxisLabel": {"type": "STRING"},
+                                "showGrid": {"type": "BOOLEAN"},
+                            },
+                        },
+                    },
+                },
+            },
+            "required": ["type", "props"],
+        },
+    }
+
+
+# Plain dicts; the upstream converts them to the SDK's protos once, on first use.
+GENERATION_CONFIGS = (
+    {
+        "json": {
+            "response_mime_type": "application/json",
+            "response_schema": _response_schema(),
+        }
+    }
+    if KOMPLEX_JSON_MODE
+    else {}
+)
+
+
+# Repair ======================================================================
+
+
+class _Stats:
+    def __init__(self):
+        self.responses = 0
+        self.valid = 0
+        self.repaired = 0
+        self.regenerated = 0
+        self.dropped = 0
+        self.bytes_before_compaction = 0
+        self.bytes_after_compaction = 0
+
+    def count(self, outcome: str, boxes: int = 1) -> None:
+        setattr(self, outcome, getattr(self, outcome) + boxes)
+        metrics.observe_komplex_boxes(outcome, boxes)
+
+    def compacted(self, before: int, after: int) -> None:
+        self.bytes_before_compaction += before
+        self.bytes_after_compaction += after
+        metrics.observe_komplex_compaction(before, after)
+
+    def to_dict(self) -> dict:
+        return {
+            "jsonMode": KOMPLEX_JSON_MODE,
+            "compact": KOMPLEX_COMPACT,
+            "bytesBeforeCompaction": self.bytes_before_compaction,
+            "bytesAfterCompaction": self.bytes_after_compaction,
+            "responses": self.responses,
+            "validBoxes": self.valid,
+            "repairedBoxes": self.repaired,
+            "regeneratedBoxes": self.regenerated,
+            "droppedBoxes": self.dropped,
+        }
+
+
+stats = _Stats()
+
+
+def _repair_node(node: Any) -> tuple[Any, bool]:
+    if isinstance(node, str):
+        return {"type": "text", "value": node}, True
+    if not isinstance(node, dict) or not isinstance(node.get("type"), str):
+        return None, True
+    changed = False
+    if node["type"] == "text":
+        if not isinstance(node.get("value"), str):
+            node["value"] = "" if node.get("value") is None else str(node["value"])
+            changed = True
+        return node, changed
+    props = node.get("props")
+    if not isinstance(props, dict):
+        props = node["props"] = {}
+        changed = True
+    if "math" in node and "math" not in props:
+        props["math"] = node.pop("math")
+        changed = True
+    if "children" in node and "children" not in props:
+        props["children"] = node.pop("children")
+        changed = True
+    if "children" in props:
+        children, children_changed = _repair_nodes(props["children"])
+        props["children"] = children
+        changed = changed or children_changed
+    return node, changed
+
+
+def _repair_nodes(nodes: Any) -> tuple[list, bool]:
+    if not isinstance(nodes, list):
+        nodes = [nodes]
+        changed = True
+    else:
+        changed = False
+    repaired = []
+    for node in nodes:
+        fixed, node_changed = _repair_node(node)
+        changed = changed or node_changed
+        if fixed is not None:
+            repaired.append(fixed)
+    return repaired, changed
+
+
+def _repair_questions(questions: Any) -> tuple[list, bool]:
+    if not isinstance(questions, list):
+        return [], True
+    kept = []
+    changed = False
+    for question in questions:
+        if not isinstance(question, dict):
+            changed = True
+            continue
+        options = question.get("options")
+        answer = question.get("correctAnswer")
+        if isinstance(answer, str) and answer.strip().isdigit():
+            question["correctAnswer"] = answer = int(answer)
+            changed = True
+        if (
+            not isinstance(question.get("question"), str)
+            or not isinstance(options, list)
+            or not 2 <= len(options) <= 4
+            or not isinstance(answer, int)
+            or not 0 <= answer < len(options)
+        ):
+            # A wrong answer key is worse than a missing question.
+            changed = True
+            continue
+        kept.append(question)
+    return kept, changed
+
+
+def _repair_expressions(expressions: Any) -> tuple[list, bool]:
+    if not isinstance(expressions, list):
+        return [], True
+    kept = []
+    changed = False
+    for number, expression in enumerate(expressions, start=1):
+        if isinstance(expression, str):
+            expression = {"id": str(number), "latex": expression}
+            changed = True
+        if not isinstance(expression, dict) or not isinstance(expression.get("latex"), str):
+            changed = True
+            continue
+        if not isinstance(expression.get("id"), str):
+            expression["id"] = str(expression.get("id", number))
+            changed = True
+        kept.append(expression)
+    return kept, changed
+
+
+def repair_box(box: Any) -> tuple[dict | None, bool]:
+    """Return the box fixed up to the contract (or None) and whether it changed."""
+    if not isinstance(box, dict):
+        return None, True
+    changed = False
+    box_type = box.get("type")
+    if box_type not in BOX_PROPS:
+        box_type = _TYPE_ALIASES.get(box_type)
+        if box_type is None:
+            return None, True
+        box["type"] = box_type
+        changed = True
+
+    props = box.get("props")
+    if not isinstance(props, dict):
+        # Props flattened onto the box itself.
+        props = {key: value for key, value in box.items() if key != "type"}
+        box.clear()
+        box.update({"type": box_type, "props": props})
+        changed = True
+
+    allowed = BOX_PROPS[box_type]
+    for key in list(props):
+        target = _PROP_ALIASES.get(key, key)
+        if target not in allowed:
+            del props[key]
+            changed = True
+        elif target != key:
+            if target not in props:
+                props[target] = props[key]
+            del props[key]
+            changed = True
+
+    for key in _NODE_PROPS:
+        if key in props:
+            props[key], node_changed = _repair_nodes(props[key])
+            changed = changed or node_changed
+    if "title" in props and not isinstance(props["title"], str):
+        props["title"] = "" if props["title"] is None else str(props["title"])
+        changed = True
+    if "steps" in props:
+        steps = props["steps"] if isinstance(props["steps"], list) else []
+        for step in steps:
+            if isinstance(step, dict) and "content" in step:
+                step["content"], node_changed = _repair_nodes(step["content"])
+                changed = changed or node_changed
+        props["steps"] = [step for step in steps if isinstance(step, dict)]
+        changed = changed or len(props["steps"]) != len(steps)
+    if "questions" in props:
+        props["questions"], questions_changed = _repair_questions(props["questions"])
+        changed = changed or questions_changed
+    if "expressions" in props:
+        props["expressions"], expressions_changed = _repair_expressions(props["expressions"])
+        changed = changed or expressions_changed
+
+    if box_type == "exercise" and not props.get("questions"):
+        return None, True
+    if box_type == "graph" and not props.get("expressions"):
+        return None, True
+    return box, changed
+
+
+def _loads_fragment(fragment: str) -> Any:
+    try:
+        return json.loads(fragment)
+    except json.JSONDecodeError:
+        return json.loads(_TRAILING_COMMA_RE.sub(r"\1", fragment))
+
+
+def parse_box(fragment: str) -> tuple[dict | None, bool]:
+    """Parse and repair one box; ``(None, True)`` means it needs regenerating."""
+    try:
+        box = _loads_fragment(fragment)
+    except json.JSONDecodeError:
+        return None, True
+    return repair_box(box)
+
+
+def _top_level(value: Any) -> list:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        for key in ("boxes", "content", "items"):
+            if isinstance(value.get(key), list) and "type" not in value:
+                return value[key]
+        return [value]
+    return []
+
+
+def parse_boxes(text: str) -> tuple[list[dict | str], bool]:
+    """Boxes in order, with fragments that could not be repaired left as strings."""
+    try:
+        values, changed = _top_level(orjson.loads(text)), False
+    except json.JSONDecodeError:
+        stripped = _FENCE_RE.sub("", text)
+        splitter = TopLevelBoxSplitter()
+        values = splitter.feed(stripped)
+        if splitter.pending.strip():
+            values.append(splitter.pending)
+        changed = True
+
+    items: list[dict | str] = []
+    for value in values:
+        box, box_changed = parse_box(value) if isinstance(value, str) else repair_box(value)
+        changed = changed or box_changed
+        if box is not None:
+            stats.count("repaired" if box_changed else "valid")
+            items.append(box)
+        elif isinstance(value, str):
+            items.append(value)
+        else:
+            stats.count("dropped")
+    return items, changed
+
+
+Generate = Callable[[Prompt], Awaitable[Any]]
+
+
+async def regenerate(fragments: list[str], generate: Generate) -> list[dict | None]:
+    """One upstream call that fixes every fragment; positions are preserved."""
+    try:
+        generation = await generate(repair_prompt(fragments))
+        values = _top_level(json.loads(generation.text))
+    except Exception:
+        values = []
+    fixed: list[dict | None] = []
+    for number in range(len(fragments)):
+        box = repair_box(values[number])[0] if number < len(values) else None
+        fixed.append(box)
+        stats.count("regenerated" if box is not None else "dropped")
+    return fixed
+
+
+async def finalize(text: str, generate: Generate) -> str:
+    """Validate a complete komplex answer, returning it untouched when already valid."""
+    stats.responses += 1
+    items, changed = parse_boxes(text)
+    if not changed:
+        return text
+    broken = [item for item in items if isinstance(item, str)]
+    if broken and KOMPLEX_REGENERATE:
+        replacements = iter(await regenerate(broken, generate))
+    else:
+        stats.count("dropped", len(broken))
+        replacements = iter([])
+
+    boxes = []
+    for item in items:
+        if isinstance(item, str):
+            item = next(replacements, None)
+            if item is None:
+                continue
+        boxes.append(item)
+    return dumps(boxes)
+
+
+def postprocess(text: str, parsed: bool = False) -> str | list:
+    """Compact a finalized answer; ``parsed`` returns the box list instead of its JSON string."""
+    if not (KOMPLEX_COMPACT or parsed):
+        return text
+    try:
+        boxes = _top_level(orjson.loads(text))
+    except orjson.JSONDecodeError:
+        return text
+    if not KOMPLEX_COMPACT:
+        return boxes
+    boxes = compact_nodes(boxes, strip_layout=False)
+    compacted = dumps(boxes)
+    stats.compacted(len(text.encode("utf-8")), len(compacted.encode("utf-8")))
+    return boxes if parsed else compacted
+
+
+class StreamValidator:
+    """Validates boxes as the stream splits them out.
+
+    A box that cannot be repaired locally is regenerated on the spot, so box
+    order is kept; only the first such box per response gets a regeneration.
+    """
+
+    def __init__(self, generate: Generate):
+        self.generate = generate
+        self.regenerations_left = 1 if KOMPLEX_REGENERATE else 0
+        stats.responses += 1
+
+    async def accept(self, fragment: str) -> dict | None:
+        box, changed = parse_box(fragment)
+        if box is not None:
+            stats.count("repaired" if changed else "valid")
+        elif self.regenerations_left:
+            self.regenerations_left -= 1
+            box = (await regenerate([fragment], self.generate))[0]
+        else:
+            stats.count("dropped")
+        if box is not None and KOMPLEX_COMPACT:
+            box = compact_nodes(box, strip_layout=False)
+        return box
@@ -1,18 +1,56 @@
 # import re
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import dataclasses
 import os
+from contextlib import asynccontextmanager
 from enum import Enum
-# import requests
-# from requests.auth import HTTPBasicAuth
-import google.generativeai as genai
+from typing import Any
 from dotenv import load_dotenv
 from fastapi import FastAPI, Header, HTTPException, Request
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, conint
 
 
 # from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline  # COMMENTED OUT
 
+from . import capture, compression, gemini_sdk, komplex_output, metrics, prompt_classifier
+from .admission import (
+    ADMISSION_ENABLED,
+    BATCH,
+    INTERACTIVE,
+    AdmissionController,
+    AdmissionMiddleware,
+    DeadlineExceededError,
+)
+from .batch import BATCH_DEFAULT_PARALLELISM, BATCH_MAX_ITEMS, BATCH_MAX_PARALLELISM, run_batch
+from .context_compaction import ContextCompactor
+from .generation import Generation, GenerationService
 from .instructions import topic_preprompt_box, topic_preprompt_md
-from .instructions.general_preprompt import pre_prompt
+from .instructions.general_preprompt import general_prompt
+from .instructions.prompt import Prompt
+from .near_duplicate import NEAR_CACHE_ENABLED, NearDuplicateIndex, NearQuery
+from .payloads import REQUEST_MAX_BYTES, TOPIC_REQUEST_MAX_BYTES, dumps, read_json, read_model
+from .response_cache import build_response_cache
+from .sessions import build_session_store
+from .startup import STARTUP_WARMUP_ENABLED, Readiness, WarmupStep
+from .streaming import sse_response
+from .summarizer import (
+    OUTPUT_LENGTHS,
+    SUMMARIZER_PRELOAD,
+    Summarizer,
+    SummarizerOverloadedError,
+    SummarizerTimeoutError,
+    SummarizerUnavailableError,
+)
+from .topic_index import prune_topic
+from .topic_registry import TopicRegistry, serialize_topic, topic_digest
+from .translation import TranslationClient
+from .upstream import GeminiUpstream, UpstreamTimeoutError, chunk_text
+from .upstream_pool import UpstreamUnavailableError, build_upstream_pool
 
 
 # Environment & external services ==============================================================================
@@ -23,35 +61,87 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("GEMINI_API_KEY not set in environment")
 
-genai.configure(api_key=api_key)
+# The SDK itself is only imported by the warm-up (or the first upstream call).
+gemini_sdk.configure(api_key)
+
+# Extra keys (comma separated) share the load with GEMINI_API_KEY.
+api_keys = [api_key] + [
+    key.strip()
+    for key in os.getenv("GEMINI_API_KEYS", "").split(",")
+    if key.strip() and key.strip() != api_key
+]
 
 INTERNAL_KEY = os.getenv("INTERNAL_API_KEY")
 if not INTERNAL_KEY:
     raise ValueError("INTERNAL_API_KEY not set in environment")
 
-# HF_TOKEN_KEY = os.getenv("HF_TOKEN_KEY")
-# if not HF_TOKEN_KEY:
-#     # If HF_TOKEN_KEY is only needed for models, you can skip this check or remove HF usage
-#     pass  # COMMENTED OUT or remove if not used
-
 # COMMENTED OUT: heavy model initializations
 # classifier = pipeline(
 #     "zero-shot-classification",
 #     model="MoritzLaurer/xlm-v-base-mnli-xnli",
 # )
-#
-# model_name = "songhieng/khmer-mt5-summarization"
-# summary_tokenizer = AutoTokenizer.from_pretrained(
-#     model_name,
-#     use_auth_token=HF_TOKEN_KEY,
-# )
-# summary_model = AutoModelForSeq2SeqLM.from_pretrained(
-#     model_name,
-#     use_auth_token=HF_TOKEN_KEY,
-# )
 
-app = FastAPI()
-gemini_model = genai.GenerativeModel("gemini-2.5-flash")
+admission = AdmissionController()
+readiness = Readiness(IMPORT_STARTED)
+capture_writer = capture.CaptureWriter()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The summarization model loads in its worker process without holding /ready back.
+    preload = asyncio.create_task(summarizer.warm_up()) if SUMMARIZER_PRELOAD else None
+    try:
+        if not STARTUP_WARMUP_ENABLED:
+            readiness.mark_ready()
+            yield
+            return
+        # In the background: /ping answers at once, /ready once this is done.
+        warmup = asyncio.create_task(readiness.warm_up(_warmup_steps()))
+        yield
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+    finally:
+        if preload is not None:
+            preload.cancel()
+        await summarizer.close()
+        await translator.close()
+        capture_writer.close()
+
+
+app = FastAPI(lifespan=lifespan)
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+if ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=admission,
+        paths={
+            "/gemini": INTERACTIVE,
+            "/gemini/stream": INTERACTIVE,
+            "/topic/gemini": INTERACTIVE,
+            "/topic/gemini/stream": INTERACTIVE,
+            "/gemini/batch": BATCH,
+            "/topic/gemini/batch": BATCH,
+        },
+    )
+if capture.CAPTURE_ENABLED:
+    # Outside admission and compression: rejections are recorded, sizes are as sent.
+    app.add_middleware(capture.CaptureMiddleware, writer=capture_writer)
+app.add_middleware(metrics.MetricsMiddleware)
+upstream_pool = build_upstream_pool(api_keys)
+gemini_upstream = GeminiUpstream(upstream_pool, generation_configs=komplex_output.GENERATION_CONFIGS)
+generation_service = GenerationService(
+    gemini_upstream,
+    build_response_cache(),
+    NearDuplicateIndex() if NEAR_CACHE_ENABLED else None,
+    finalizers={"json": lambda text: komplex_output.finalize(text, gemini_upstream.generate)},
+)
+topic_registry = TopicRegistry()
+context_compactor = ContextCompactor()
+session_store = build_session_store(gemini_upstream)
+summarizer = Summarizer()
+translator = TranslationClient()
+readiness.imported()
 
 
 # ========================================================================================================================
@@ -62,14 +152,61 @@ class ResponseType(str, Enum):
     NORMAL = "normal"
 
 
-# class SummarizeRequest(BaseModel):
-#     text: str
-#     outputType: str
+class GenerateRequest(BaseModel):
+    prompt: str | None = None
+    responseType: str | None = None
+    previousContext: str | None = None
+    sessionId: str | None = None
+    stream: bool = False
+    cache: bool | None = None
+    # Komplex answers as a JSON array in ``result`` instead of a JSON string.
+    parsed: bool = False
+
+
+class TopicGenerateRequest(GenerateRequest):
+    # Already-serialized lessons (a JSON string) are used as they are.
+    topicContent: Any = None
+    topicId: str | None = None
+
+
+class BatchItem(BaseModel):
+    # Items without a prompt get a per-item "Missing prompt" error.
+    prompt: str | None = None
+    previousContext: str | None = None
+
+
+class BatchRequest(BaseModel):
+    items: list[BatchItem] | None = None
+    responseType: str | None = None
+    parallelism: conint(ge=1, le=BATCH_MAX_PARALLELISM) = BATCH_DEFAULT_PARALLELISM
+    stream: bool = False
+    cache: bool | None = None
+    parsed: bool = False
+
+
+class TopicBatchRequest(BatchRequest):
+    topicContent: Any = None
+    topicId: str | None = None
+
+
+class GenerateResponse(BaseModel):
+    result: str | list | None = None
+    error: str | None = None
+
+
+class SummarizeRequest(BaseModel):
+    text: str
+    outputType: str
 
 
 # Helper functions ============================================================================================
 
 
+def _check_api_key(x_api_key: str | None) -> None:
+    if x_api_key != INTERNAL_KEY:
+        raise HTTPException(status_code=401, detail="Invalid or missing API key")
+
+
 def _parse_response_type(raw_response_type: str | None) -> ResponseType:
     if raw_response_type is None:
         return ResponseType.NORMAL
@@ -79,53 +216,268 @@ def _parse_response_type(raw_response_type: str | None) -> ResponseType:
         raise HTTPException(status_code=400, detail="Invalid responseType") from exc
 
 
+def _warmup_steps() -> list[WarmupStep]:
+    async def load_sdk() -> None:
+        await asyncio.to_thread(gemini_sdk.load)
+
+    # The static instructions every request starts with; cached upstream where enabled.
+    prompts = [
+        general_prompt("", "", ResponseType.KOMPLEX),
+        general_prompt("", "", ResponseType.NORMAL),
+        topic_preprompt_box.topic_prompt("", None, None),
+        topic_preprompt_md.topic_prompt("", None, None),
+    ]
+
+    def build_generation_configs() -> None:
+        for prompt in prompts:
+            for prompt_class in prompt_classifier.CLASSES:
+                gemini_upstream.generation_config(dataclasses.replace(prompt, prompt_class=prompt_class))
+
+    async def generation_configs() -> None:
+        await asyncio.to_thread(build_generation_configs)
+
+    async def upstream() -> None:
+        await upstream_pool.warm_up(prompts)
+
+    return [("sdk", load_sdk), ("generationConfigs", generation_configs), ("upstream", upstream)]
+
+
+def _classified(built_prompt: Prompt, prompt: str, has_context: bool) -> Prompt:
+    if not prompt_classifier.PROMPT_CLASSIFIER_ENABLED:
+        return built_prompt
+    return dataclasses.replace(built_prompt, prompt_class=prompt_classifier.classify(prompt, has_context))
+
+
+def _near_duplicate(built_prompt: Prompt, prompt: str, scope: str, previous_context: str | None) -> Prompt:
+    """Let rephrasings of a standalone question share answers within ``scope``."""
+    # Follow-up turns depend on the conversation; greetings are cheap and personal.
+    if previous_context or built_prompt.prompt_class in (prompt_classifier.GREETING, prompt_classifier.REFERENCE):
+        return built_prompt
+    if not built_prompt.prompt_class and prompt_classifier.is_greeting(prompt):
+        return built_prompt
+    return dataclasses.replace(built_prompt, near_query=NearQuery(scope, prompt))
+
+
+def _topic_scope(response_type: ResponseType, topic: tuple[str, str, str | None]) -> str:
+    return f"topic:{response_type.value}:{topic[1]}"
+
+
 def _build_topic_prompt(
     response_type: ResponseType,
     prompt: str,
     topic_content,
     previous_context: str | None,
-) -> str:
+    topic_key: str | None = None,
+) -> Prompt:
     if response_type == ResponseType.KOMPLEX:
-        return topic_preprompt_box.topic_pre_prompt(
+        return topic_preprompt_box.topic_prompt(
             prompt,
             topic_content,
             previous_context,
+            topic_key,
         )
-    return topic_preprompt_md.topic_pre_prompt(
+    return topic_preprompt_md.topic_prompt(
         prompt,
         topic_content,
         previous_context,
+        topic_key,
+    )
+
+
+def _resolve_topic(topic_content, topic_id: str | None) -> tuple[str, str, str | None]:
+    """Return the serialized topic, its digest and, for hot topics, the cache key."""
+    if topic_content:
+        topic_payload = serialize_topic(topic_content)
+        return topic_payload, topic_digest(topic_payload), None
+
+    topic = topic_registry.get(topic_id)
+    if topic is None:
+        raise HTTPException(status_code=404, detail="Unknown topicId")
+    topic_key = topic.digest if topic_registry.is_hot(topic) else None
+    return topic.payload, topic.digest, topic_key
+
+
+def _topic_prompt(
+    response_type: ResponseType,
+    prompt: str,
+    topic: tuple[str, str, str | None],
+    previous_context: str | None,
+) -> Prompt:
+    topic_payload, digest, topic_key = topic
+    # Hot topics already sit in the upstream context cache in full.
+    if topic_key is None:
+        topic_payload = prune_topic(topic_payload, prompt, digest)
+    return _build_topic_prompt(
+        response_type,
+        prompt,
+        topic_payload,
+        previous_context,
+        topic_key,
     )
 
 
-# def is_khmer(text):
-#     pattern = r"[\u1780-\u17FF\u19E0-\u19FF]"
-#     return bool(re.search(pattern, text))
+async def _previous_context(body: GenerateRequest) -> str | None:
+    previous_context = body.previousContext
+    if previous_context is None and body.sessionId:
+        session = await session_store.get(body.sessionId)
+        previous_context = session.previous_context()
+    return previous_context
 
 
-# def translate_to_english(text: str) -> str:
-#     username = os.getenv("USERNAME_TRANSLATE_API")
-#     password = os.getenv("PASSWORD_TRANSLATE_API")
-#     url = os.getenv("TRANSLATE_API_URL")
+async def _prepare_general(body: GenerateRequest) -> tuple[Prompt, ResponseType] | None:
+    prompt = body.prompt
+    if not prompt:
+        return None
+
+    response_type = _parse_response_type(body.responseType)
+    metrics.set_response_type(response_type.value)
+    with metrics.prompt_assembly():
+        previous_context = await _previous_context(body)
+        previous_context = context_compactor.compact(previous_context, response_type.value)
+        model_prompt = (await translator.glossed([prompt])).get(prompt, prompt)
+
+        built_prompt = general_prompt(model_prompt, previous_context, response_type)
+        built_prompt = _classified(built_prompt, prompt, bool(previous_context))
+        built_prompt = _near_duplicate(built_prompt, prompt, f"general:{response_type.value}", previous_context)
+    metrics.observe_prompt(built_prompt)
+    return built_prompt, response_type
+
+
+async def _prepare_topic(body: TopicGenerateRequest) -> tuple[Prompt, ResponseType] | None:
+    prompt = body.prompt
+    if not prompt or not (body.topicContent or body.topicId):
+        return None
+
+    response_type = _parse_response_type(body.responseType)
+    metrics.set_response_type(response_type.value)
+    with metrics.prompt_assembly():
+        topic = _resolve_topic(body.topicContent, body.topicId)
+        previous_context = await _previous_context(body)
+        previous_context = context_compactor.compact(previous_context, response_type.value)
+        model_prompt = (await translator.glossed([prompt])).get(prompt, prompt)
+
+        built_prompt = _topic_prompt(response_type, model_prompt, topic, previous_context)
+        built_prompt = _classified(built_prompt, prompt, has_context=True)
+        built_prompt = _near_duplicate(built_prompt, prompt, _topic_scope(response_type, topic), previous_context)
+    metrics.observe_prompt(built_prompt)
+    return built_prompt, response_type
+
+
+def _use_cache(cache) -> bool:
+    return cache is not False
+
+
+async def _record_turn(body: GenerateRequest, text: str) -> None:
+    if body.sessionId and text:
+        await session_store.record(body.sessionId, body.prompt, text)
+
+
+async def _recorded(body: GenerateRequest, chunks):
+    if not body.sessionId:
+        async for chunk in chunks:
+            yield chunk
+        return
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk_text(chunk))
+        yield chunk
+    await _record_turn(body, "".join(parts))
+
+
+def _batch_items(body: BatchRequest) -> list[BatchItem] | None:
+    if not body.items:
+        return None
+    if len(body.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    return body.items
+
+
+async def _batch_glosses(items: list[BatchItem]) -> dict[str, str]:
+    return await translator.glossed(list({item.prompt for item in items if item.prompt}))
+
+
+def _batch_prompts(items: list[BatchItem], build) -> list[Prompt | None]:
+    """Build each distinct (prompt, previousContext) pair once."""
+    built: dict[tuple, Prompt] = {}
+    prompts = []
+    with metrics.prompt_assembly():
+        for item in items:
+            if not item.prompt:
+                prompts.append(None)
+                continue
+            key = (item.prompt, item.previousContext)
+            if key not in built:
+                built[key] = build(*key)
+                metrics.observe_prompt(built[key])
+            prompts.append(built[key])
+    return prompts
+
+
+async def _ndjson(outcomes):
+    try:
+        async for outcome in outcomes:
+            yield dumps(outcome) + "\n"
+    finally:
+        await outcomes.aclose()
+
+
+async def _batch_response(body: BatchRequest, prompts: list[Prompt | None], response_type: "ResponseType"):
+    use_cache = _use_cache(body.cache)
+
+    async def answer(built_prompt: Prompt) -> str | list:
+        # Finalized by the generation service and compacted like the single-prompt endpoints.
+        generation = await generation_service.generate(built_prompt, use_cache)
+        return _answer_result(generation.text, response_type, body.parsed)
 
-#     if not url or not username or not password:
-#         raise ValueError("Translation API credentials are not set in environment")
+    outcomes = run_batch(prompts, answer, body.parallelism)
+    if body.stream:
+        return StreamingResponse(_ndjson(outcomes), media_type="application/x-ndjson")
 
-#     payload = {"input_text": [text], "src_lang": "kh", "tgt_lang": "eng"}
+    results: list[dict | None] = [None] * len(prompts)
+    async for outcome in outcomes:
+        results[outcome.pop("index")] = outcome
+    return {"results": results}
 
-#     response = requests.post(
-#         url,
-#         json=payload,
-#         headers={"Content-Type": "application/json"},
-#         auth=HTTPBasicAuth(username, password),
-#     )
-#     if response.status_code == 200:
-#         result = response.json()
-#         translated_texts = result.get("translate_text", [])
-#         if translated_texts:
-#             return translated_texts[0]
-#         else:
-#             raise ValueError("No translated text found in the response")
+
+async def _generate(built_prompt: Prompt, use_cache: bool) -> Generation:
+    try:
+        return await generation_service.generate(built_prompt, use_cache)
+    except UpstreamTimeoutError as exc:
+        raise HTTPException(status_code=504, detail="Upstream timeout") from exc
+    except UpstreamUnavailableError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="Upstream overloaded",
+            headers={"Retry-After": str(max(int(exc.retry_after), 1))},
+        ) from exc
+    except DeadlineExceededError as exc:
+        raise HTTPException(status_code=504, detail="Deadline exceeded") from exc
+
+
+def _stream_response(
+    request: Request,
+    body: GenerateRequest,
+    built_prompt: Prompt,
+    response_type: ResponseType,
+) -> StreamingResponse:
+    return sse_response(
+        request,
+        _recorded(body, generation_service.stream(built_prompt, _use_cache(body.cache))),
+        split_boxes=response_type == ResponseType.KOMPLEX,
+        validate=_box_validator(response_type),
+    )
+
+
+def _answer_result(text: str, response_type: "ResponseType", parsed: bool) -> str | list:
+    if response_type != ResponseType.KOMPLEX:
+        return text
+    return komplex_output.postprocess(text, parsed)
+
+
+def _box_validator(response_type: "ResponseType"):
+    if response_type != ResponseType.KOMPLEX:
+        return None
+    return komplex_output.StreamValidator(gemini_upstream.generate).accept
 
 
 @app.get("/ping")
@@ -133,86 +485,234 @@ async def ping():
     return {"message": "pong"}
 
 
-@app.post("/gemini")
+@app.get("/ready")
+async def ready():
+    if not readiness.ready:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return readiness.stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+@app.get("/stats")
+async def stats(x_api_key: str = Header(None)):
+    _check_api_key(x_api_key)
+    return {
+        **generation_service.stats(),
+        "upstreamPool": upstream_pool.stats(),
+        "topics": topic_registry.stats(),
+        "contextCompaction": context_compactor.stats(),
+        "sessions": session_store.stats(),
+        "admission": admission.stats(),
+        "komplexOutput": komplex_output.stats.to_dict(),
+        "startup": readiness.stats(),
+        "promptClasses": prompt_classifier.stats.to_dict(),
+        "summarizer": summarizer.stats(),
+        "translation": translator.stats(),
+        "compression": compression.stats.to_dict(),
+        "capture": capture_writer.stats(),
+    }
+
+
+@app.get("/upstream")
+async def upstream_status(x_api_key: str = Header(None)):
+    _check_api_key(x_api_key)
+    return upstream_pool.stats()
+
+
+@app.put("/topics/{topic_id}")
+async def register_topic(
+    topic_id: str,
+    request: Request,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+
+    data = await read_json(request, TOPIC_REQUEST_MAX_BYTES)
+    topic_content = data.get("topicContent")
+    if not topic_content:
+        return {"error": "Missing topicContent"}
+
+    try:
+        topic = topic_registry.put(topic_id, topic_content)
+    except ValueError as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+
+    return {"topicId": topic.topic_id, "hash": topic.digest, "bytes": topic.size}
+
+
+@app.delete("/sessions/{session_id}")
+async def end_session(
+    session_id: str,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+
+    await session_store.delete(session_id)
+    return {"deleted": session_id}
+
+
+@app.delete("/topics/{topic_id}")
+async def unregister_topic(
+    topic_id: str,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+
+    if not topic_registry.delete(topic_id):
+        raise HTTPException(status_code=404, detail="Unknown topicId")
+    return {"deleted": topic_id}
+
+
+@app.post("/gemini", response_model=GenerateResponse, response_model_exclude_none=True)
 async def explain_ai(
     request: Request,
     x_api_key: str = Header(None),
 ):
-    if x_api_key != INTERNAL_KEY:
-        raise HTTPException(status_code=401, detail="Invalid or missing API key")
+    _check_api_key(x_api_key)
 
-    data = await request.json()
-    prompt = data.get("prompt")
-    raw_response_type = data.get("responseType")
-    previous_context = data.get("previousContext")
+    body = await read_model(request, GenerateRequest, REQUEST_MAX_BYTES)
+    prepared = await _prepare_general(body)
+    if prepared is None:
+        return {"error": "Missing prompt"}
 
-    if not prompt:
+    built_prompt, response_type = prepared
+    if body.stream:
+        return _stream_response(request, body, built_prompt, response_type)
+    generation = await _generate(built_prompt, _use_cache(body.cache))
+    await _record_turn(body, generation.text)
+
+    return {"result": _answer_result(generation.text, response_type, body.parsed)}
+
+
+@app.post("/gemini/stream")
+async def stream_ai(
+    request: Request,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+
+    body = await read_model(request, GenerateRequest, REQUEST_MAX_BYTES)
+    prepared = await _prepare_general(body)
+    if prepared is None:
         return {"error": "Missing prompt"}
 
-    response_type = _parse_response_type(raw_response_type)
+    return _stream_response(request, body, *prepared)
+
+
+@app.post("/gemini/batch")
+async def explain_ai_batch(
+    request: Request,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+
+    body = await read_model(request, BatchRequest, TOPIC_REQUEST_MAX_BYTES)
+    items = _batch_items(body)
+    if items is None:
+        return {"error": "Missing items"}
+
+    response_type = _parse_response_type(body.responseType)
+    metrics.set_response_type(response_type.value)
+    glosses = await _batch_glosses(items)
 
-    prompt_text = pre_prompt(prompt, previous_context, response_type)
-    response = gemini_model.generate_content(prompt_text)
+    def build(prompt: str, previous_context: str | None) -> Prompt:
+        previous_context = context_compactor.compact(previous_context, response_type.value)
+        built_prompt = general_prompt(glosses.get(prompt, prompt), previous_context, response_type)
+        built_prompt = _classified(built_prompt, prompt, bool(previous_context))
+        return _near_duplicate(built_prompt, prompt, f"general:{response_type.value}", previous_context)
 
-    return {"result": response.text}
+    return await _batch_response(body, _batch_prompts(items, build), response_type)
 
 
-@app.post("/topic/gemini")
+@app.post("/topic/gemini", response_model=GenerateResponse, response_model_exclude_none=True)
 async def explain_topic(
     request: Request,
     x_api_key: str = Header(None),
 ):
-    if x_api_key != INTERNAL_KEY:
-        raise HTTPException(status_code=401, detail="Invalid or missing API key")
+    _check_api_key(x_api_key)
+
+    body = await read_model(request, TopicGenerateRequest, TOPIC_REQUEST_MAX_BYTES)
+    prepared = await _prepare_topic(body)
+    if prepared is None:
+        return {"error": "Missing prompt or topicContent"}
+
+    built_prompt, response_type = prepared
+    if body.stream:
+        return _stream_response(request, body, built_prompt, response_type)
+    generation = await _generate(built_prompt, _use_cache(body.cache))
+    await _record_turn(body, generation.text)
+
+    return {"result": _answer_result(generation.text, response_type, body.parsed)}
 
-    data = await request.json()
-    prompt = data.get("prompt")
-    topic_content = data.get("topicContent")
-    previous_context = data.get("previousContext")
-    raw_response_type = data.get("responseType")
 
-    if not prompt or not topic_content:
+@app.post("/topic/gemini/stream")
+async def stream_topic(
+    request: Request,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+
+    body = await read_model(request, TopicGenerateRequest, TOPIC_REQUEST_MAX_BYTES)
+    prepared = await _prepare_topic(body)
+    if prepared is None:
         return {"error": "Missing prompt or topicContent"}
 
-    response_type = _parse_response_type(raw_response_type)
+    return _stream_response(request, body, *prepared)
 
-    prompt_text = _build_topic_prompt(
-        response_type,
-        prompt,
-        topic_content,
-        previous_context,
-    )
-    response = gemini_model.generate_content(prompt_text)
-
-    return {"result": response.text}
-
-
-# COMMENTED OUT: summarization endpoint (heavy)
-# @app.post("/summarize")
-# async def summarize(
-#     request: SummarizeRequest,
-#     x_api_key: str = Header(None),
-# ):
-#     output_type = request.outputType
-#     if x_api_key != INTERNAL_KEY:
-#         raise HTTPException(status_code=401, detail="Invalid or missing API key")
-#     inputs = summary_tokenizer(
-#         f"summarize: {request.text}",
-#         return_tensors="pt",
-#         truncation=True,
-#         max_length=512,
-#     )
-#     length_map = {"summary": 512, "title": 10}
-#     output_length = length_map.get(output_type)
-#     summary_ids = summary_model.generate(
-#         **inputs,
-#         max_length=output_length,
-#         num_beams=5,
-#         length_penalty=2.0,
-#         early_stopping=True,
-#     )
-#     summary = summary_tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-#     return {"summary": summary}
+
+@app.post("/topic/gemini/batch")
+async def explain_topic_batch(
+    request: Request,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+
+    body = await read_model(request, TopicBatchRequest, TOPIC_REQUEST_MAX_BYTES)
+    items = _batch_items(body)
+    if items is None or not (body.topicContent or body.topicId):
+        return {"error": "Missing items or topicContent"}
+
+    response_type = _parse_response_type(body.responseType)
+    metrics.set_response_type(response_type.value)
+    topic = _resolve_topic(body.topicContent, body.topicId)
+    glosses = await _batch_glosses(items)
+
+    def build(prompt: str, previous_context: str | None) -> Prompt:
+        previous_context = context_compactor.compact(previous_context, response_type.value)
+        built_prompt = _topic_prompt(response_type, glosses.get(prompt, prompt), topic, previous_context)
+        built_prompt = _classified(built_prompt, prompt, has_context=True)
+        return _near_duplicate(built_prompt, prompt, _topic_scope(response_type, topic), previous_context)
+
+    return await _batch_response(body, _batch_prompts(items, build), response_type)
+
+
+@app.post("/summarize")
+async def summarize(
+    request: Request,
+    x_api_key: str = Header(None),
+):
+    _check_api_key(x_api_key)
+
+    body = await read_model(request, SummarizeRequest, REQUEST_MAX_BYTES)
+    if body.outputType not in OUTPUT_LENGTHS:
+        raise HTTPException(status_code=400, detail="Invalid outputType")
+    if not body.text:
+        return {"error": "Missing text"}
+
+    try:
+        summary = await summarizer.summarize(body.text, body.outputType)
+    except SummarizerUnavailableError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    except SummarizerOverloadedError as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"}) from exc
+    except SummarizerTimeoutError as exc:
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
+    return {"summary": summary}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,360 @@
+"""Prometheus metrics and per-request stage timings (also sent as Server-Timing)."""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+from .instructions.prompt import Prompt
+
+
+LABELS = ("endpoint", "response_type")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+_PROMPT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+_BYTES_BUCKETS = tuple(2 ** power for power in range(10, 23))
+
+REQUEST_SECONDS = Histogram(
+    "komplex_request_seconds",
+    "End-to-end request latency, until the last body byte is sent.",
+    LABELS,
+    buckets=_LATENCY_BUCKETS,
+)
+PROMPT_SECONDS = Histogram(
+    "komplex_prompt_assembly_seconds",
+    "Time spent building the prompt (topic resolution, pruning, compaction).",
+    LABELS,
+    buckets=_PROMPT_BUCKETS,
+)
+UPSTREAM_FIRST_TOKEN_SECONDS = Histogram(
+    "komplex_upstream_first_token_seconds",
+    "Time from calling Gemini to the first streamed chunk.",
+    LABELS,
+    buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_SECONDS = Histogram(
+    "komplex_upstream_seconds",
+    "Total time of a Gemini call, including the whole stream.",
+    LABELS,
+    buckets=_LATENCY_BUCKETS,
+)
+PROMPT_BYTES = Histogram(
+    "komplex_prompt_bytes",
+    "UTF-8 size of the assembled prompt (system instruction plus contents).",
+    LABELS,
+    buckets=_BYTES_BUCKETS,
+)
+TOKENS = Counter(
+    "komplex_tokens",
+    "Tokens reported in Gemini usage_metadata.",
+    LABELS + ("kind",),
+)
+CACHE_HITS = Counter(
+    "komplex_response_cache_hits",
+    "Requests answered from the response cache.",
+    LABELS,
+)
+NEAR_DUPLICATE_HITS = Counter(
+    "komplex_near_duplicate_hits",
+    "Requests answered with the cached answer of a near-duplicate question.",
+    LABELS,
+)
+UPSTREAM_ERRORS = Counter(
+    "komplex_upstream_errors",
+    "Failed Gemini calls by exception type.",
+    LABELS + ("error",),
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "komplex_admission_wait_seconds",
+    "Time spent queued for an admission slot.",
+    ("priority",),
+    buckets=_LATENCY_BUCKETS,
+)
+ADMISSION_REJECTIONS = Counter(
+    "komplex_admission_rejections",
+    "Requests refused by admission control.",
+    ("reason",),
+)
+HEDGES = Counter(
+    "komplex_upstream_hedges",
+    "Hedged upstream calls: sent, won/lost by the hedge, or skipped over budget.",
+    ("outcome",),
+)
+KOMPLEX_COMPACTION_BYTES = Counter(
+    "komplex_output_compaction_bytes",
+    "Komplex answer bytes before and after compaction.",
+    ("stage",),
+)
+CONTEXT_COMPACTION_TOKENS = Counter(
+    "komplex_context_compaction_tokens",
+    "Estimated previousContext tokens before and after compaction.",
+    ("mode", "stage"),
+)
+CONTEXT_COMPACTION_TURNS_DROPPED = Counter(
+    "komplex_context_compaction_turns_dropped",
+    "Oldest previousContext turns dropped to fit the token budget.",
+    ("mode",),
+)
+RESPONSE_BYTES = Counter(
+    "komplex_response_bytes",
+    "Response body bytes before compression (uncompressed) and as sent.",
+    LABELS + ("stage",),
+)
+KOMPLEX_BOXES = Counter(
+    "komplex_output_boxes",
+    "Komplex boxes by validation outcome: valid, repaired, regenerated or dropped.",
+    ("outcome",),
+)
+
+PROMPT_CLASSES = Counter(
+    "komplex_prompt_classes",
+    "Learner prompts by generation budget class.",
+    ("prompt_class",),
+)
+CLASSIFY_SECONDS = Histogram(
+    "komplex_prompt_classify_seconds",
+    "Time to classify a prompt.",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025),
+)
+CLASS_UPSTREAM_SECONDS = Histogram(
+    "komplex_prompt_class_upstream_seconds",
+    "Upstream call duration by prompt class.",
+    ("prompt_class",),
+    buckets=_LATENCY_BUCKETS,
+)
+CLASS_TRUNCATIONS = Counter(
+    "komplex_prompt_class_truncations",
+    "Answers cut off at their class's max_output_tokens, i.e. likely misclassified.",
+    ("prompt_class",),
+)
+SUMMARIZE_BATCH_SIZE = Histogram(
+    "komplex_summarize_batch_size",
+    "Texts per summarization batch.",
+    ("output_type",),
+    buckets=(1, 2, 4, 8, 16, 32),
+)
+SUMMARIZE_SECONDS = Histogram(
+    "komplex_summarize_batch_seconds",
+    "Summarization worker time per batch.",
+    ("output_type",),
+    buckets=_LATENCY_BUCKETS,
+)
+STARTUP_SECONDS = Gauge(
+    "komplex_startup_seconds",
+    "Seconds spent on import, on the warm-up, and from import to ready.",
+    ("phase",),
+    multiprocess_mode="max",
+)
+
+
+class RequestTimings:
+    def __init__(self, endpoint: str, scope: dict | None = None):
+        self._endpoint = endpoint
+        self._scope = scope
+        self.response_type = ""
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.cache_hit = False
+
+    @property
+    def endpoint(self) -> str:
+        if self._scope is None:
+            return self._endpoint
+        # Route templates, not raw paths, to keep label cardinality bounded.
+        route = self._scope.get("route")
+        return getattr(route, "path", None) or self._endpoint
+
+    def labels(self) -> tuple[str, str]:
+        return self.endpoint, self.response_type
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        if self.cache_hit:
+            entries.append('cache;desc="hit"')
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def current() -> RequestTimings:
+    timings = _current.get()
+    if timings is None:
+        # Work started outside a request, e.g. warm-up.
+        timings = RequestTimings("background")
+        _current.set(timings)
+    return timings
+
+
+def set_response_type(response_type: str) -> None:
+    current().response_type = response_type
+
+
+@contextmanager
+def prompt_assembly():
+    timings = current()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        timings.add("prompt", seconds)
+        PROMPT_SECONDS.labels(*timings.labels()).observe(seconds)
+
+
+def observe_prompt(prompt: Prompt) -> None:
+    size = len(prompt.system_instruction.encode("utf-8")) + len(prompt.contents.encode("utf-8"))
+    PROMPT_BYTES.labels(*current().labels()).observe(size)
+
+
+def observe_first_token(seconds: float) -> None:
+    timings = current()
+    timings.add("ttft", seconds)
+    UPSTREAM_FIRST_TOKEN_SECONDS.labels(*timings.labels()).observe(seconds)
+
+
+def observe_upstream(seconds: float) -> None:
+    timings = current()
+    timings.add("upstream", seconds)
+    UPSTREAM_SECONDS.labels(*timings.labels()).observe(seconds)
+
+
+def observe_usage(usage: dict | None) -> None:
+    if not usage:
+        return
+    labels = current().labels()
+    TOKENS.labels(*labels, "input").inc(usage["promptTokens"])
+    TOKENS.labels(*labels, "output").inc(usage["outputTokens"])
+    TOKENS.labels(*labels, "cached").inc(usage["cachedTokens"])
+
+
+def observe_cache_hit() -> None:
+    timings = current()
+    timings.cache_hit = True
+    CACHE_HITS.labels(*timings.labels()).inc()
+
+
+def observe_near_duplicate_hit() -> None:
+    timings = current()
+    timings.cache_hit = True
+    NEAR_DUPLICATE_HITS.labels(*timings.labels()).inc()
+
+
+def observe_upstream_error(exc: BaseException) -> None:
+    UPSTREAM_ERRORS.labels(*current().labels(), type(exc).__name__).inc()
+
+
+def observe_admission_wait(priority: str, seconds: float) -> None:
+    ADMISSION_WAIT_SECONDS.labels(priority).observe(seconds)
+
+
+def observe_admission_rejected(reason: str) -> None:
+    ADMISSION_REJECTIONS.labels(reason).inc()
+
+
+def observe_hedge(outcome: str) -> None:
+    HEDGES.labels(outcome).inc()
+
+
+def observe_komplex_compaction(before: int, after: int) -> None:
+    KOMPLEX_COMPACTION_BYTES.labels("before").inc(before)
+    KOMPLEX_COMPACTION_BYTES.labels("after").inc(after)
+
+
+def observe_context_compaction(mode: str, before: int, after: int, turns_dropped: int) -> None:
+    CONTEXT_COMPACTION_TOKENS.labels(mode, "before").inc(before)
+    CONTEXT_COMPACTION_TOKENS.labels(mode, "after").inc(after)
+    if turns_dropped:
+        CONTEXT_COMPACTION_TURNS_DROPPED.labels(mode).inc(turns_dropped)
+
+
+def observe_response_bytes(uncompressed: int, sent: int) -> None:
+    labels = current().labels()
+    RESPONSE_BYTES.labels(*labels, "uncompressed").inc(uncompressed)
+    RESPONSE_BYTES.labels(*labels, "sent").inc(sent)
+
+
+def observe_komplex_boxes(outcome: str, boxes: int = 1) -> None:
+    if boxes:
+        KOMPLEX_BOXES.labels(outcome).inc(boxes)
+
+
+def observe_prompt_class(prompt_class: str, seconds: float) -> None:
+    timings = current()
+    timings.add("classify", seconds)
+    PROMPT_CLASSES.labels(prompt_class).inc()
+    CLASSIFY_SECONDS.observe(seconds)
+
+
+def observe_class_upstream(prompt_class: str, seconds: float, truncated: bool) -> None:
+    CLASS_UPSTREAM_SECONDS.labels(prompt_class).observe(seconds)
+    if truncated:
+        CLASS_TRUNCATIONS.labels(prompt_class).inc()
+
+
+def observe_summarize_batch(output_type: str, size: int, seconds: float) -> None:
+    SUMMARIZE_BATCH_SIZE.labels(output_type).observe(size)
+    SUMMARIZE_SECONDS.labels(output_type).observe(seconds)
+
+
+def observe_startup(phase: str, seconds: float) -> None:
+    STARTUP_SECONDS.labels(phase).set(seconds)
+
+
+def render() -> tuple[bytes, str]:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and adds a Server-Timing header.
+
+    The header carries the stages finished before the response starts; for
+    streamed responses the latency histogram is observed on the last chunk.
+    """
+
+    def __init__(self, app, skip_paths: tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings("unmatched", scope)
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                REQUEST_SECONDS.labels(*timings.labels()).observe(timings.elapsed())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,203 @@
+"""Near-duplicate lookup of earlier questions, so rephrasings reuse a cached answer.
+
+Questions are normalized (spacing, ZWSP, punctuation, Khmer digits and
+subscript variants, the optional question particle), cut into character
+shingles and sketched with MinHash. LSH bands find candidates within the same
+scope (instructions, topic and response type); a candidate only matches if the
+exact shingle Jaccard reaches the threshold *and* its numbers, math symbols
+and negations are identical, so "x^2+1" never answers "x^2+2".
+
+The index only maps a question to the exact response-cache key of its answer;
+the answer itself stays in the response cache (and its SQLite tier).
+"""
+
+import os
+import random
+import re
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .khmer import normalize
+
+
+NEAR_CACHE_ENABLED = os.getenv("NEAR_CACHE_ENABLED", "true").lower() != "false"
+NEAR_CACHE_THRESHOLD = float(os.getenv("NEAR_CACHE_THRESHOLD", "0.8"))
+NEAR_CACHE_MAX_ENTRIES = int(os.getenv("NEAR_CACHE_MAX_ENTRIES", "20000"))
+NEAR_CACHE_TTL_SECONDS = float(os.getenv("NEAR_CACHE_TTL_SECONDS", os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")))
+NEAR_CACHE_SHINGLE_SIZE = int(os.getenv("NEAR_CACHE_SHINGLE_SIZE", "3"))
+NEAR_CACHE_PERMUTATIONS = int(os.getenv("NEAR_CACHE_PERMUTATIONS", "64"))
+NEAR_CACHE_BANDS = int(os.getenv("NEAR_CACHE_BANDS", "16"))
+
+_MERSENNE = (1 << 61) - 1
+_KHMER_DIGITS = str.maketrans("០១២៣៤៥៦៧៨៩", "0123456789")
+# Subscript DA and TA are written interchangeably (ស្តី / ស្ដី).
+_SUBSCRIPT_VARIANTS = (("្ដ", "្ត"),)
+_QUESTION_PARTICLES_RE = re.compile(r"^តើ|\bplease\b|សូម")
+_NOISE_RE = re.compile(r"[\s!?.,;:។៕៖\"'()\[\]{}]+")
+# What must agree exactly: numbers, variables, operators, functions and negation.
+_EXACT_RE = re.compile(
+    r"\d+(?:\.\d+)?|\b[a-z]\b|[=+\-*/^<>√∫πθ]|\b(?:sin|cos|tan|cot|sec|csc|log|ln|exp|lim)\b"
+    r"|មិន|គ្មាន|អត់|\bnot\b|\bno\b|n't"
+)
+
+
+@dataclass(frozen=True)
+class NearQuery:
+    scope: str
+    question: str
+
+
+@dataclass
+class _Entry:
+    scope: str
+    exact: tuple[str, ...]
+    # Flat arrays keep an entry near 1 KiB instead of a set and tuples of boxed ints.
+    shingles: array
+    bands: array
+    key: str
+    expires_at: float
+
+
+def canonical(question: str) -> str:
+    text = normalize(question).translate(_KHMER_DIGITS)
+    for variant, canonical_form in _SUBSCRIPT_VARIANTS:
+        text = text.replace(variant, canonical_form)
+    text = _QUESTION_PARTICLES_RE.sub("", text)
+    # Khmer spacing is free-form, so spaces carry no meaning here.
+    return _NOISE_RE.sub("", text)
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        threshold: float = NEAR_CACHE_THRESHOLD,
+        max_entries: int = NEAR_CACHE_MAX_ENTRIES,
+        ttl: float = NEAR_CACHE_TTL_SECONDS,
+        shingle_size: int = NEAR_CACHE_SHINGLE_SIZE,
+        permutations: int = NEAR_CACHE_PERMUTATIONS,
+        bands: int = NEAR_CACHE_BANDS,
+        seed: int = 0x5EED,
+    ):
+        if permutations % bands:
+            raise ValueError("NEAR_CACHE_PERMUTATIONS must be a multiple of NEAR_CACHE_BANDS")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shingle_size = shingle_size
+        self.rows = permutations // bands
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(permutations)
+        ]
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._buckets: dict[tuple, set[int]] = {}
+        self._by_key: dict[str, int] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.evictions = 0
+        self.stale = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _sketch(self, query: NearQuery) -> tuple[tuple[str, ...], frozenset[int], list[int]]:
+        text = canonical(query.question)
+        exact = tuple(sorted(_EXACT_RE.findall(normalize(query.question).translate(_KHMER_DIGITS))))
+        size = self.shingle_size
+        # Per-process string hashes are fine: the index lives in this process only.
+        shingles = frozenset(
+            hash(text[start:start + size]) & _MERSENNE
+            for start in range(max(len(text) - size + 1, 1))
+        )
+        signature = [
+            min((a * shingle + b) % _MERSENNE for shingle in shingles)
+            for a, b in self._permutations
+        ]
+        bands = [
+            hash((query.scope, exact, band, tuple(signature[band * self.rows:(band + 1) * self.rows])))
+            for band in range(len(signature) // self.rows)
+        ]
+        return exact, shingles, bands
+
+    def get(self, query: NearQuery) -> str | None:
+        """Response-cache key of the closest earlier question at or above the threshold."""
+        exact, shingles, bands = self._sketch(query)
+        candidates = set()
+        for band in bands:
+            candidates |= self._buckets.get(band, set())
+
+        now = time.monotonic()
+        best_key, best_id, best_score = None, None, 0.0
+        for entry_id in candidates:
+            entry = self._entries.get(entry_id)
+            if entry is None or entry.scope != query.scope or entry.exact != exact:
+                continue
+            if entry.expires_at < now:
+                self._remove(entry_id)
+                continue
+            shared = sum(1 for shingle in entry.shingles if shingle in shingles)
+            score = shared / (len(shingles) + len(entry.shingles) - shared)
+            if score > best_score:
+                best_key, best_score, best_id = entry.key, score, entry_id
+        if best_key is None or best_score < self.threshold:
+            if best_key is not None:
+                self.rejected += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_id)
+        self.hits += 1
+        return best_key
+
+    def add(self, query: NearQuery, key: str) -> None:
+        if self.max_entries <= 0:
+            return
+        if key in self._by_key:
+            self._remove(self._by_key[key])
+        exact, shingles, bands = self._sketch(query)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = _Entry(
+            query.scope, exact, array("q", shingles), array("q", bands), key, time.monotonic() + self.ttl
+        )
+        self._by_key[key] = entry_id
+        for band in bands:
+            self._buckets.setdefault(band, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def expire(self, key: str) -> None:
+        """Drop the entry pointing at ``key``, e.g. once that answer has left the response cache."""
+        entry_id = self._by_key.get(key)
+        if entry_id is not None:
+            self._remove(entry_id)
+            self.stale += 1
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        del self._by_key[entry.key]
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": NEAR_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "buckets": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "belowThreshold": self.rejected,
+            "evictions": self.evictions,
+            "stale": self.stale,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,55 @@
+"""Request bodies read with orjson under a size limit, validated into models."""
+
+import os
+from typing import TypeVar
+
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+
+REQUEST_MAX_BYTES = int(os.getenv("REQUEST_MAX_BYTES", str(256 * 1024)))
+# Topic and batch bodies carry whole lessons or many prompts.
+TOPIC_REQUEST_MAX_BYTES = int(os.getenv("TOPIC_REQUEST_MAX_BYTES", str(4 * 1024 * 1024)))
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Request body is larger than {max_bytes} bytes")
+
+
+async def read_json(request: Request, max_bytes: int = REQUEST_MAX_BYTES) -> dict:
+    """Parse a JSON object body, refusing anything over ``max_bytes`` before buffering it."""
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise _too_large(max_bytes)
+
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        chunks.append(chunk)
+
+    try:
+        data = orjson.loads(b"".join(chunks))
+    except orjson.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail="Invalid JSON body") from exc
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    return data
+
+
+async def read_model(request: Request, model: type[Model], max_bytes: int = REQUEST_MAX_BYTES) -> Model:
+    data = await read_json(request, max_bytes)
+    try:
+        return model.model_validate(data)
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors(include_url=False)) from exc
+
+
+def dumps(value) -> str:
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
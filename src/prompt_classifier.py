@@ -0,0 +1,232 @@
+"""Cheap local classification of learner prompts into generation budgets.
+
+Greetings, questions about KOMPLEX itself and short yes/no questions get a
+single concise box (see the komplex instructions), so they do not need the
+preferred model's thinking or its full output budget. Everything else keeps
+the defaults. The classes only ever lower the budget; a prompt that might be
+academic, or that points back at the lesson or the conversation, stays on the
+full budget.
+"""
+
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+
+from . import metrics
+from .khmer import estimate_tokens, normalize
+
+
+PROMPT_CLASSIFIER_ENABLED = os.getenv("PROMPT_CLASSIFIER_ENABLED", "true").lower() != "false"
+# JSON object of class -> {"tier", "maxOutputTokens", "temperature"} overrides.
+PROMPT_CLASS_POLICIES = os.getenv("PROMPT_CLASS_POLICIES", "")
+PROMPT_CLASS_SHORT_MAX_TOKENS = int(os.getenv("PROMPT_CLASS_SHORT_MAX_TOKENS", "24"))
+
+GREETING = "greeting"
+PLATFORM = "platform"
+SHORT = "short"
+REFERENCE = "reference"
+ACADEMIC = "academic"
+CLASSES = (GREETING, PLATFORM, SHORT, REFERENCE, ACADEMIC)
+
+_GREETINGS = (
+    "ជំរាបសួរ", "ជម្រាបសួរ", "សួស្តី", "សួស្ដី", "សុខសប្បាយទេ", "សុខសប្បាយជាទេ", "សុខសប្បាយ",
+    "អរគុណច្រើន", "អរគុណ", "លាសិនហើយ", "លាហើយ", "អរុណសួស្តី", "សាយណ្ហសួស្តី", "រាត្រីសួស្តី",
+    "hello", "hi", "hey", "good morning", "good afternoon", "good evening", "thank you", "thanks",
+    "bye", "goodbye", "how are you",
+)
+# Words that may surround a greeting without making it a question.
+_FILLERS = (
+    "តារា", "ai", "dara", "បង", "អ្នក", "លោកគ្រូ", "អ្នកគ្រូ", "ណា", "ហើយ", "ផង", "ដែរ",
+    "បាទ", "ចាស", "ចា", "ទេ", "there", "you", "so", "much", "very", "ok", "okay",
+)
+# Not the Khmer spelling: "ចំនួនកុំផ្លិច" is a complex number.
+_PLATFORM = (
+    "komplex", "អ្នកជានរណា", "អ្នកជាអ្នកណា", "អ្នកឈ្មោះអ្វី", "who are you", "your name",
+)
+# Pointers back at the lesson or the conversation: answering needs that context.
+_REFERENCES = (
+    "នេះ", "នោះ", "ខាងលើ", "ខាងក្រោម", "មុននេះ", "ពីមុន", "ម្តងទៀត", "ម្ដងទៀត", "ទីមួយ", "ទីពីរ",
+    "this", "that", "above", "previous", "again", "earlier",
+)
+_YES_NO_ENDINGS = ("ឬទេ", "មែនទេ", "ឬអត់", "ត្រូវទេ", "ទេ")
+_YES_NO_STARTS = (
+    "is", "are", "was", "were", "do", "does", "did", "can", "could", "should", "will", "has", "have",
+)
+# Asking for work, not a verdict; never a short answer.
+_WORK_WORDS = (
+    "ពន្យល់", "ហេតុអ្វី", "របៀប", "ដោះស្រាយ", "គណនា", "បង្ហាញ", "ស្រាយបញ្ជាក់", "ឧទាហរណ៍", "លំហាត់",
+    "សង្ខេប", "explain", "why", "how", "solve", "prove", "calculate", "show", "example", "exercise",
+    "summarize", "derive", "មិនយល់", "understand",
+)
+
+_PUNCTUATION_RE = re.compile(r"[\s!?.,;:\u17d4\u17d5\u17d6\"'()\-]+")
+_LATIN_WORD_RE = re.compile(r"[a-z]+")
+
+
+@dataclass(frozen=True)
+class GenerationPolicy:
+    # Index into UPSTREAM_MODELS; clamped to the tiers that exist.
+    tier: int = 0
+    max_output_tokens: int | None = None
+    temperature: float | None = None
+
+    def generation_config(self) -> dict:
+        config = {}
+        if self.max_output_tokens is not None:
+            config["max_output_tokens"] = self.max_output_tokens
+        if self.temperature is not None:
+            config["temperature"] = self.temperature
+        return config
+
+
+# Sized for a single komplex box; JSON node trees cost several times the prose.
+_DEFAULT_POLICIES = {
+    GREETING: GenerationPolicy(tier=1, max_output_tokens=1024, temperature=0.7),
+    PLATFORM: GenerationPolicy(tier=1, max_output_tokens=2048, temperature=0.4),
+    SHORT: GenerationPolicy(tier=1, max_output_tokens=1536, temperature=0.2),
+    REFERENCE: GenerationPolicy(),
+    ACADEMIC: GenerationPolicy(),
+}
+
+
+def _load_policies(raw: str) -> dict[str, GenerationPolicy]:
+    policies = dict(_DEFAULT_POLICIES)
+    for name, override in (json.loads(raw) if raw else {}).items():
+        if name not in policies:
+            raise ValueError(f"Unknown prompt class in PROMPT_CLASS_POLICIES: {name}")
+        policies[name] = GenerationPolicy(
+            tier=int(override.get("tier", policies[name].tier)),
+            max_output_tokens=override.get("maxOutputTokens", policies[name].max_output_tokens),
+            temperature=override.get("temperature", policies[name].temperature),
+        )
+    return policies
+
+
+POLICIES = _load_policies(PROMPT_CLASS_POLICIES)
+_DEFAULT_POLICY = GenerationPolicy()
+
+
+def policy_for(prompt_class: str) -> GenerationPolicy:
+    return POLICIES.get(prompt_class, _DEFAULT_POLICY)
+
+
+def _contains(text: str, words: tuple[str, ...], latin_words: set[str]) -> bool:
+    # Latin words match whole words only; Khmer is unsegmented, so substrings.
+    return any(word in latin_words if word.isascii() and " " not in word else word in text for word in words)
+
+
+def _words_re(words: tuple[str, ...]) -> re.Pattern:
+    # Longest first so "អរគុណច្រើន" goes before "អរគុណ"; Latin words on word boundaries.
+    alternatives = [
+        rf"\b{re.escape(word)}\b" if word.isascii() else re.escape(word)
+        for word in sorted(words, key=len, reverse=True)
+    ]
+    return re.compile("|".join(alternatives))
+
+
+_GREETINGS_RE = _words_re(_GREETINGS)
+_FILLERS_RE = _words_re(_FILLERS)
+
+
+def _is_greeting(text: str) -> bool:
+    remainder, greetings = _GREETINGS_RE.subn(" ", text)
+    if not greetings:
+        return False
+    return not _PUNCTUATION_RE.sub("", _FILLERS_RE.sub(" ", remainder))
+
+
+def _is_yes_no(text: str, latin_words: set[str]) -> bool:
+    if _contains(text, _WORK_WORDS, latin_words):
+        return False
+    stripped = _PUNCTUATION_RE.sub(" ", text).strip()
+    if not stripped:
+        return False
+    if stripped.endswith(_YES_NO_ENDINGS):
+        return True
+    first = stripped.split(" ", 1)[0]
+    return first in _YES_NO_STARTS
+
+
+class _Stats:
+    def __init__(self):
+        self.counts = dict.fromkeys(CLASSES, 0)
+        self.truncated = dict.fromkeys(CLASSES, 0)
+        self.upstream_seconds = dict.fromkeys(CLASSES, 0.0)
+        self.upstream_calls = dict.fromkeys(CLASSES, 0)
+        self.classify_seconds = 0.0
+
+    def to_dict(self) -> dict:
+        classified = sum(self.counts.values())
+        return {
+            "enabled": PROMPT_CLASSIFIER_ENABLED,
+            "classified": classified,
+            "classifyMicroseconds": round(self.classify_seconds / classified * 1e6, 1) if classified else 0.0,
+            "classes": {
+                name: {
+                    "count": self.counts[name],
+                    "truncated": self.truncated[name],
+                    # Cut off at the budget is how a misclassification shows up.
+                    "accuracy": (
+                        round(1 - self.truncated[name] / self.upstream_calls[name], 3)
+                        if self.upstream_calls[name]
+                        else None
+                    ),
+                    "upstreamSeconds": (
+                        round(self.upstream_seconds[name] / self.upstream_calls[name], 3)
+                        if self.upstream_calls[name]
+                        else None
+                    ),
+                    "policy": {
+                        "tier": policy_for(name).tier,
+                        "maxOutputTokens": policy_for(name).max_output_tokens,
+                        "temperature": policy_for(name).temperature,
+                    },
+                }
+                for name in CLASSES
+            },
+        }
+
+
+stats = _Stats()
+
+
+def classify(prompt: str, has_context: bool = False) -> str:
+    """Class of a learner prompt; ``has_context`` when a lesson or previous turns come with it."""
+    started = time.perf_counter()
+    text = normalize(prompt)
+    latin_words = set(_LATIN_WORD_RE.findall(text))
+    short = estimate_tokens(text) <= PROMPT_CLASS_SHORT_MAX_TOKENS
+    if not short:
+        prompt_class = ACADEMIC
+    elif _is_greeting(text):
+        prompt_class = GREETING
+    elif _contains(text, _PLATFORM, latin_words) and not _contains(text, _WORK_WORDS, latin_words):
+        prompt_class = PLATFORM
+    elif has_context and _contains(text, _REFERENCES, latin_words):
+        prompt_class = REFERENCE
+    elif _is_yes_no(text, latin_words):
+        prompt_class = SHORT
+    else:
+        prompt_class = ACADEMIC
+    seconds = time.perf_counter() - started
+    stats.classify_seconds += seconds
+    stats.counts[prompt_class] += 1
+    metrics.observe_prompt_class(prompt_class, seconds)
+    return prompt_class
+
+
+def is_greeting(prompt: str) -> bool:
+    return _is_greeting(normalize(prompt))
+
+
+def observe_upstream(prompt_class: str, seconds: float, finish_reason: str | None) -> None:
+    if prompt_class not in stats.counts:
+        return
+    truncated = finish_reason == "MAX_TOKENS"
+    stats.upstream_calls[prompt_class] += 1
+    stats.upstream_seconds[prompt_class] += seconds
+    if truncated:
+        stats.truncated[prompt_class] += 1
+    metrics.observe_class_upstream(prompt_class, seconds, truncated)
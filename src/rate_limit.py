@@ -0,0 +1,43 @@
+"""Token-bucket rate limiting."""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def consume(self, amount: float) -> None:
+        """Take ``amount`` unconditionally; a negative balance delays later callers."""
+        self._refill()
+        self.tokens -= amount
+
+    def delay_for(self, amount: float = 1.0) -> float:
+        self._refill()
+        if self.tokens >= amount or self.rate <= 0:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        while not self.try_acquire(amount):
+            await asyncio.sleep(max(self.delay_for(amount), 0.001))
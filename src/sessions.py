@@ -0,0 +1,298 @@
+"""Server-side conversation sessions with incrementally updated summaries."""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+
+from .instructions.session_summary import summary_prompt
+from .topic_content import compact_json_spans
+from .upstream import GeminiUpstream
+
+
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "3"))
+SESSION_MAX_PENDING_TURNS = int(os.getenv("SESSION_MAX_PENDING_TURNS", "12"))
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH")
+
+_SWEEP_INTERVAL_SECONDS = 60.0
+# Retries when another worker saved the same session in between, with jittered backoff.
+_SAVE_ATTEMPTS = 8
+_SAVE_BACKOFF_SECONDS = 0.005
+
+
+@dataclass
+class Session:
+    session_id: str
+    summary: str = ""
+    # Turns that fell out of the window but are not folded into the summary yet.
+    pending: list[tuple[str, str]] = field(default_factory=list)
+    turns: list[tuple[str, str]] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.time)
+    # Turns ever recorded; numbers turns so pending ones can be told apart after a reload.
+    recorded: int = 0
+    # Row version in the shared backend, for compare-and-swap saves.
+    version: int = 0
+
+    def first_pending(self) -> int:
+        """Sequence number of the oldest pending turn."""
+        return self.recorded - len(self.turns) - len(self.pending)
+
+    def previous_context(self) -> str | None:
+        turns = self.pending + self.turns
+        if not self.summary and not turns:
+            return None
+        lines = [self.summary] if self.summary else []
+        for number, (prompt, response) in enumerate(turns, start=1):
+            lines.append(f"Prompt {number}: {prompt}\nResponse {number}: {response}")
+        return "\n\n".join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"summary": self.summary, "pending": self.pending, "turns": self.turns, "recorded": self.recorded},
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, session_id: str, data: str, updated_at: float, version: int = 0) -> "Session":
+        payload = json.loads(data)
+        pending = [tuple(turn) for turn in payload.get("pending", [])]
+        turns = [tuple(turn) for turn in payload.get("turns", [])]
+        return cls(
+            session_id,
+            payload.get("summary", ""),
+            pending,
+            turns,
+            updated_at,
+            payload.get("recorded", len(pending) + len(turns)),
+            version,
+        )
+
+
+class SQLiteSessions:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(sessions)")}
+        if "version" not in columns:
+            connection.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load(self, session_id: str) -> Session | None:
+        row = self._connection().execute(
+            "SELECT data, updated_at, version FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return Session.from_json(session_id, row[0], row[1], row[2])
+
+    def refresh(self, session_id: str, cached: Session | None) -> Session | None:
+        """``cached`` if it is still the stored version, else the stored session."""
+        row = self._connection().execute(
+            "SELECT version FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if cached is not None and cached.version == row[0]:
+            return cached
+        return self.load(session_id)
+
+    def save(self, session_id: str, data: str, updated_at: float, version: int) -> bool:
+        """Write if the stored row is still at ``version`` (0: no row yet); False on a conflict."""
+        if version == 0:
+            cursor = self._connection().execute(
+                "INSERT OR IGNORE INTO sessions (id, data, updated_at, version) VALUES (?, ?, ?, 1)",
+                (session_id, data, updated_at),
+            )
+        else:
+            cursor = self._connection().execute(
+                "UPDATE sessions SET data = ?, updated_at = ?, version = version + 1 "
+                "WHERE id = ? AND version = ?",
+                (data, updated_at, session_id, version),
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, session_id: str) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def delete_idle(self, before: float) -> None:
+        self._connection().execute("DELETE FROM sessions WHERE updated_at < ?", (before,))
+
+
+class SessionStore:
+    def __init__(
+        self,
+        upstream: GeminiUpstream,
+        shared: SQLiteSessions | None = None,
+        max_turns: int = SESSION_MAX_TURNS,
+        idle_seconds: float = SESSION_IDLE_SECONDS,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+    ):
+        self.upstream = upstream
+        self.shared = shared
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.summaries = 0
+        self.summary_failures = 0
+        self.evictions = 0
+        self._sessions: dict[str, Session] = {}
+        self._summarizing: dict[str, asyncio.Task] = {}
+        # One writer per session in this worker; other workers are caught by the version check.
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+        self.save_conflicts = 0
+        self.lost_writes = 0
+        self._last_sweep = time.time()
+
+    async def get(self, session_id: str) -> Session:
+        await self._sweep()
+        session = self._sessions.get(session_id)
+        if self.shared is not None:
+            # Other workers may have written since; the memory copy only saves the data read.
+            session = await asyncio.to_thread(self.shared.refresh, session_id, session)
+        if session is None:
+            session = Session(session_id)
+        elif session.updated_at < time.time() - self.idle_seconds:
+            session = Session(session_id, version=session.version)
+        self._sessions[session_id] = session
+        return session
+
+    async def record(self, session_id: str, prompt: str, response: str) -> None:
+        turn = (prompt, compact_json_spans(response))
+        async with self._lock(session_id):
+            for _ in range(_SAVE_ATTEMPTS):
+                session = await self.get(session_id)
+                session.turns.append(turn)
+                session.recorded += 1
+                overflow = len(session.turns) - self.max_turns
+                if overflow > 0:
+                    session.pending.extend(session.turns[:overflow])
+                    session.turns = session.turns[overflow:]
+                    del session.pending[:-SESSION_MAX_PENDING_TURNS]
+                session.updated_at = time.time()
+                if await self._save(session):
+                    break
+            else:
+                self.lost_writes += 1
+                return
+        if session.pending and session_id not in self._summarizing:
+            task = asyncio.create_task(self._update_summary(session_id))
+            self._summarizing[session_id] = task
+            task.add_done_callback(lambda _: self._summarizing.pop(session_id, None))
+
+    async def delete(self, session_id: str) -> bool:
+        existed = self._sessions.pop(session_id, None) is not None
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.delete, session_id)
+        return existed
+
+    async def _update_summary(self, session_id: str) -> None:
+        # Runs off the request path; turns that arrive meanwhile stay pending
+        # and are folded in by the next pass.
+        while True:
+            session = await self.get(session_id)
+            if not session.pending:
+                return
+            base = session.summary
+            first = session.first_pending()
+            folded = list(session.pending)
+            try:
+                response = await self.upstream.generate(summary_prompt(base, folded))
+                summary = response.text.strip()
+            except Exception:
+                self.summary_failures += 1
+                return
+            async with self._lock(session_id):
+                for _ in range(_SAVE_ATTEMPTS):
+                    session = await self.get(session_id)
+                    if session.summary != base:
+                        # Another worker folded these turns already.
+                        break
+                    # By sequence number: record() may have added or truncated pending turns meanwhile.
+                    del session.pending[: max(first + len(folded) - session.first_pending(), 0)]
+                    session.summary = summary
+                    if await self._save(session):
+                        self.summaries += 1
+                        break
+                else:
+                    self.lost_writes += 1
+                    return
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def _save(self, session: Session) -> bool:
+        """False if another worker saved the session first; the stale copy is dropped."""
+        if self.shared is None:
+            return True
+        # Serialized here, not on the thread, so the snapshot is consistent.
+        saved = await asyncio.to_thread(
+            self.shared.save, session.session_id, session.to_json(), session.updated_at, session.version
+        )
+        if saved:
+            session.version += 1
+            return True
+        self.save_conflicts += 1
+        if self._sessions.get(session.session_id) is session:
+            del self._sessions[session.session_id]
+        await asyncio.sleep(random.uniform(0, _SAVE_BACKOFF_SECONDS))
+        return False
+
+    async def _sweep(self) -> None:
+        now = time.time()
+        if now - self._last_sweep < _SWEEP_INTERVAL_SECONDS and len(self._sessions) < self.max_sessions:
+            return
+        self._last_sweep = now
+        idle_before = now - self.idle_seconds
+        for session_id, session in list(self._sessions.items()):
+            if session.updated_at < idle_before and session_id not in self._summarizing:
+                del self._sessions[session_id]
+                self.evictions += 1
+        overflow = len(self._sessions) - int(self.max_sessions * 0.9)
+        if overflow > 0:
+            # Memory only; the shared backend still has them.
+            oldest = sorted(self._sessions.values(), key=lambda session: session.updated_at)
+            for session in oldest[:overflow]:
+                del self._sessions[session.session_id]
+                self.evictions += 1
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.delete_idle, idle_before)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "summarizing": len(self._summarizing),
+            "summaries": self.summaries,
+            "summaryFailures": self.summary_failures,
+            "evictions": self.evictions,
+            "saveConflicts": self.save_conflicts,
+            "lostWrites": self.lost_writes,
+        }
+
+
+def build_session_store(upstream: GeminiUpstream) -> SessionStore:
+    shared = SQLiteSessions(SESSION_SQLITE_PATH) if SESSION_SQLITE_PATH else None
+    return SessionStore(upstream, shared)
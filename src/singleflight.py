@@ -0,0 +1,106 @@
+"""Coalesce identical in-flight upstream generations into a single call."""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable
+
+
+class _Broadcast:
+    """Replays one upstream stream to any number of late-joining subscribers."""
+
+    def __init__(self, source: AsyncIterator):
+        self.chunks = []
+        self.done = False
+        self.subscribers = 0
+        self.error: BaseException | None = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._run(source))
+
+    async def _run(self, source: AsyncIterator) -> None:
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            if index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.create_task(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish_call(key, done))
+        else:
+            self.followers += 1
+        # Shielded so a disconnecting caller never cancels the shared call.
+        return await asyncio.shield(task)
+
+    def _finish_call(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator]):
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = _Broadcast(factory())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._finish_stream(key, broadcast))
+        else:
+            self.followers += 1
+        # Counted before the first await, so a joiner is never missed.
+        broadcast.subscribers += 1
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+        finally:
+            broadcast.subscribers -= 1
+            if not broadcast.subscribers and not broadcast.done:
+                # Everyone disconnected: stop paying for tokens nobody reads. Later
+                # callers start a fresh call instead of joining the cancelled one.
+                self._finish_stream(key, broadcast)
+                broadcast.task.cancel()
+                self.abandoned += 1
+
+    def _finish_stream(self, key: str, broadcast: _Broadcast) -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "abandonedStreams": self.abandoned,
+            "inFlight": len(self._calls) + len(self._streams),
+        }
@@ -0,0 +1,79 @@
+"""Startup warm-up and the readiness state behind ``/ready``."""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+from . import metrics
+
+
+STARTUP_WARMUP_ENABLED = os.getenv("STARTUP_WARMUP_ENABLED", "true").lower() != "false"
+STARTUP_WARMUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_WARMUP_TIMEOUT_SECONDS", "30"))
+
+WarmupStep = tuple[str, Callable[[], Awaitable[None]]]
+
+
+class Readiness:
+    """Times import, warm-up and import-to-ready from ``started`` (a perf_counter reading).
+
+    A failed or slow warm-up step is recorded and skipped rather than holding
+    readiness back: an upstream outage should not take every instance out of
+    rotation, and the lazy paths still initialize on first use.
+    """
+
+    def __init__(self, started: float, timeout: float = STARTUP_WARMUP_TIMEOUT_SECONDS):
+        self.started = started
+        self.timeout = timeout
+        self.import_seconds: float | None = None
+        self.ready_seconds: float | None = None
+        self.steps: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_seconds is not None
+
+    def imported(self) -> None:
+        self.import_seconds = time.perf_counter() - self.started
+        metrics.observe_startup("import", self.import_seconds)
+
+    async def _run(self, name: str, step: Callable[[], Awaitable[None]]) -> None:
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as exc:
+            self.errors[name] = f"{type(exc).__name__}: {exc}"
+        self.steps[name] = time.perf_counter() - started
+
+    async def warm_up(self, steps: list[WarmupStep]) -> None:
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        try:
+            for name, step in steps:
+                remaining = deadline - time.perf_counter()
+                try:
+                    await asyncio.wait_for(self._run(name, step), timeout=max(remaining, 0.0))
+                except asyncio.TimeoutError:
+                    self.errors[name] = f"Timed out after {self.timeout:g}s"
+                    break
+        finally:
+            metrics.observe_startup("warmup", time.perf_counter() - started)
+            self.mark_ready()
+
+    def mark_ready(self) -> None:
+        if self.ready_seconds is None:
+            self.ready_seconds = time.perf_counter() - self.started
+            metrics.observe_startup("ready", self.ready_seconds)
+
+    def stats(self) -> dict:
+        def rounded(seconds: float | None) -> float | None:
+            return None if seconds is None else round(seconds, 3)
+
+        return {
+            "ready": self.ready,
+            "importSeconds": rounded(self.import_seconds),
+            "importToReadySeconds": rounded(self.ready_seconds),
+            "warmupSteps": {name: rounded(seconds) for name, seconds in self.steps.items()},
+            "warmupErrors": self.errors,
+        }
@@ -0,0 +1,159 @@
+"""Server-Sent Events helpers for the streaming tutoring endpoints."""
+
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .admission import DeadlineExceededError
+from .payloads import dumps
+from .upstream import UpstreamTimeoutError, chunk_text, usage_to_dict
+from .upstream_pool import UpstreamUnavailableError
+
+
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+_HEARTBEAT = ": ping\n\n"
+_DONE = object()
+
+# Turns one top-level box fragment into the box to send, or None to drop it.
+BoxValidator = Callable[[str], Awaitable[dict | None]]
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+class TopLevelBoxSplitter:
+    """Cuts a streamed TopicContent_V3 array into its complete top-level boxes."""
+
+    def __init__(self):
+        self._depth = 0
+        self._box_depth = None
+        self._in_string = False
+        self._escaped = False
+        self._box = []
+
+    def feed(self, text: str) -> list[str]:
+        boxes = []
+        for char in text:
+            if self._box_depth is not None:
+                self._box.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = self._depth > 0
+            elif char in "[{":
+                if char == "{" and self._box_depth is None and self._depth <= 1:
+                    self._box_depth = self._depth
+                    self._box = [char]
+                self._depth += 1
+            elif char in "]}":
+                self._depth = max(self._depth - 1, 0)
+                if self._box_depth is not None and self._depth == self._box_depth:
+                    boxes.append("".join(self._box))
+                    self._box_depth = None
+                    self._box = []
+        return boxes
+
+    @property
+    def pending(self) -> str:
+        """The unfinished box, if the text stopped in the middle of one."""
+        return "".join(self._box) if self._box_depth is not None else ""
+
+
+async def _pump(chunks: AsyncIterator, queue: asyncio.Queue) -> None:
+    try:
+        async for chunk in chunks:
+            await queue.put(chunk)
+    except Exception as exc:  # surfaced to the client as an error event
+        await queue.put(exc)
+    finally:
+        await queue.put(_DONE)
+
+
+async def _sse_events(
+    request: Request,
+    chunks: AsyncIterator,
+    split_boxes: bool,
+    validate: BoxValidator | None,
+):
+    queue: asyncio.Queue = asyncio.Queue()
+    pump = asyncio.create_task(_pump(chunks, queue))
+    splitter = TopLevelBoxSplitter() if split_boxes else None
+    usage = None
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield _HEARTBEAT
+                continue
+
+            if item is _DONE:
+                break
+            if isinstance(item, UpstreamTimeoutError):
+                yield sse_event("error", {"detail": "Upstream timeout"})
+                return
+            if isinstance(item, DeadlineExceededError):
+                yield sse_event("error", {"detail": "Deadline exceeded"})
+                return
+            if isinstance(item, UpstreamUnavailableError):
+                yield sse_event("error", {"detail": "Upstream overloaded"})
+                return
+            if isinstance(item, Exception):
+                yield sse_event("error", {"detail": "Upstream error"})
+                return
+
+            usage = getattr(item, "usage_metadata", None) or usage
+            text = chunk_text(item)
+            if not text:
+                continue
+            if splitter is None:
+                yield sse_event("chunk", {"text": text})
+                continue
+            for box in splitter.feed(text):
+                if validate is not None:
+                    validated = await validate(box)
+                    if validated is not None:
+                        yield sse_event("box", validated)
+                    continue
+                try:
+                    yield sse_event("box", orjson.loads(box))
+                except orjson.JSONDecodeError:
+                    yield sse_event("chunk", {"text": box})
+
+        if validate is not None and splitter is not None and splitter.pending.strip():
+            # The answer was cut off mid-box; salvage it rather than drop it.
+            validated = await validate(splitter.pending)
+            if validated is not None:
+                yield sse_event("box", validated)
+        yield sse_event("usage", usage_to_dict(usage))
+    finally:
+        pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
+        await chunks.aclose()
+
+
+def sse_response(
+    request: Request,
+    chunks: AsyncIterator,
+    split_boxes: bool,
+    validate: BoxValidator | None = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_events(request, chunks, split_boxes, validate),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
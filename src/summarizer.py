@@ -0,0 +1,237 @@
+"""Dynamic batching of ``/summarize`` requests onto a dedicated CPU worker process.
+
+The mT5 model is heavy on import, memory and CPU, so the API process never
+loads it. It lives in a spawned worker pool (started on first use, or by the
+warm-up with SUMMARIZER_PRELOAD), and concurrent requests of the same output
+type are grouped into one padded batch: whatever queued up while the worker
+was busy, topped up for at most SUMMARIZER_MAX_WAIT_MS, up to
+SUMMARIZER_MAX_BATCH texts.
+
+torch and transformers are optional; without them ``/summarize`` answers 503.
+"""
+
+import asyncio
+import functools
+import importlib.util
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from . import metrics, summarizer_worker
+
+
+SUMMARIZER_ENABLED = os.getenv("SUMMARIZER_ENABLED", "true").lower() != "false"
+# "tiny" runs a small randomly initialized model offline (development, benchmarks).
+SUMMARIZER_MODEL = os.getenv("SUMMARIZER_MODEL", "songhieng/khmer-mt5-summarization")
+SUMMARIZER_PRELOAD = os.getenv("SUMMARIZER_PRELOAD", "false").lower() == "true"
+SUMMARIZER_WORKERS = int(os.getenv("SUMMARIZER_WORKERS", "1"))
+SUMMARIZER_TORCH_THREADS = int(os.getenv("SUMMARIZER_TORCH_THREADS", "4"))
+SUMMARIZER_MAX_BATCH = int(os.getenv("SUMMARIZER_MAX_BATCH", "8"))
+SUMMARIZER_MAX_WAIT_MS = float(os.getenv("SUMMARIZER_MAX_WAIT_MS", "25"))
+SUMMARIZER_MAX_QUEUE = int(os.getenv("SUMMARIZER_MAX_QUEUE", "64"))
+SUMMARIZER_NUM_BEAMS = int(os.getenv("SUMMARIZER_NUM_BEAMS", "5"))
+SUMMARIZER_TIMEOUT_SECONDS = float(os.getenv("SUMMARIZER_TIMEOUT_SECONDS", "120"))
+HF_TOKEN_KEY = os.getenv("HF_TOKEN_KEY")
+
+# Generated tokens per output type.
+OUTPUT_LENGTHS = {"summary": 512, "title": 10}
+
+
+class SummarizerUnavailableError(Exception):
+    pass
+
+
+class SummarizerOverloadedError(Exception):
+    pass
+
+
+class SummarizerTimeoutError(Exception):
+    pass
+
+
+@dataclass
+class _Pending:
+    text: str
+    future: asyncio.Future
+    enqueued: float
+
+
+@functools.cache
+def _installed() -> bool:
+    return all(importlib.util.find_spec(name) is not None for name in ("torch", "transformers"))
+
+
+def available() -> bool:
+    """Whether the worker could load a model; checked without importing torch."""
+    return SUMMARIZER_ENABLED and _installed()
+
+
+class Summarizer:
+    def __init__(
+        self,
+        model_name: str = SUMMARIZER_MODEL,
+        workers: int = SUMMARIZER_WORKERS,
+        threads: int = SUMMARIZER_TORCH_THREADS,
+        max_batch: int = SUMMARIZER_MAX_BATCH,
+        max_wait: float = SUMMARIZER_MAX_WAIT_MS / 1000,
+        max_queue: int = SUMMARIZER_MAX_QUEUE,
+        num_beams: int = SUMMARIZER_NUM_BEAMS,
+        timeout: float = SUMMARIZER_TIMEOUT_SECONDS,
+    ):
+        self.model_name = model_name
+        self.workers = max(workers, 1)
+        self.threads = threads
+        self.max_batch = max(max_batch, 1)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.num_beams = num_beams
+        self.timeout = timeout
+        self._pool: ProcessPoolExecutor | None = None
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._dispatchers: dict[str, asyncio.Task] = {}
+        self._slots: asyncio.Semaphore | None = None
+        self._running: set[asyncio.Task] = set()
+        self._loaded = False
+        self.requests = 0
+        self.batches = 0
+        self.batched_texts = 0
+        self.inference_seconds = 0.0
+        self.errors = 0
+        self.rejected = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned, not forked: the worker starts clean, without the event loop or the SDK.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=summarizer_worker.load,
+                initargs=(self.model_name, HF_TOKEN_KEY, self.threads),
+            )
+        return self._pool
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor(), func, *args)
+        except BrokenProcessPool as exc:
+            # A crashed or failed-to-load worker; start a fresh pool next time.
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            self._loaded = False
+            raise SummarizerUnavailableError("Summarizer worker failed") from exc
+
+    async def warm_up(self) -> None:
+        """Start the workers and load the model before the first request."""
+        if not available():
+            return
+        await asyncio.gather(*(self._run(summarizer_worker.ready) for _ in range(self.workers)))
+        self._loaded = True
+
+    async def summarize(self, text: str, output_type: str) -> str:
+        if not available():
+            raise SummarizerUnavailableError("Summarizer unavailable")
+        queued = sum(queue.qsize() for queue in self._queues.values())
+        if queued >= self.max_queue:
+            self.rejected += 1
+            raise SummarizerOverloadedError("Summarizer queue full")
+
+        self.requests += 1
+        queue = self._queue(output_type)
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait(_Pending(text, future, time.monotonic()))
+        # On timeout or disconnect the future is cancelled: still queued, the dispatcher
+        # skips it; already in a batch, the batch just finishes without it.
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError as exc:
+            raise SummarizerTimeoutError("Summarizer timeout") from exc
+
+    def _queue(self, output_type: str) -> asyncio.Queue:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        if output_type not in self._queues:
+            self._queues[output_type] = asyncio.Queue()
+            self._dispatchers[output_type] = asyncio.create_task(self._dispatch(output_type))
+        return self._queues[output_type]
+
+    async def _dispatch(self, output_type: str) -> None:
+        queue = self._queues[output_type]
+        while True:
+            batch = [await queue.get()]
+            # Wait for a free worker first: requests keep queueing meanwhile and join this batch.
+            await self._slots.acquire()
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            deadline = batch[0].enqueued + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch = [pending for pending in batch if not pending.future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._run_batch(output_type, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, output_type: str, batch: list[_Pending]) -> None:
+        started = time.perf_counter()
+        try:
+            summaries = await self._run(
+                summarizer_worker.summarize,
+                [pending.text for pending in batch],
+                OUTPUT_LENGTHS[output_type],
+                self.num_beams,
+            )
+        except Exception as exc:
+            self.errors += 1
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(exc)
+            return
+        finally:
+            self._slots.release()
+        seconds = time.perf_counter() - started
+        self._loaded = True
+        self.batches += 1
+        self.batched_texts += len(batch)
+        self.inference_seconds += seconds
+        metrics.observe_summarize_batch(output_type, len(batch), seconds)
+        for pending, summary in zip(batch, summaries):
+            if not pending.future.done():
+                pending.future.set_result(summary)
+
+    async def close(self) -> None:
+        for task in self._dispatchers.values():
+            task.cancel()
+        await asyncio.gather(*self._dispatchers.values(), return_exceptions=True)
+        self._dispatchers.clear()
+        self._queues.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SUMMARIZER_ENABLED,
+            "available": available(),
+            "model": self.model_name,
+            "loaded": self._loaded,
+            "requests": self.requests,
+            "queued": sum(queue.qsize() for queue in self._queues.values()),
+            "batches": self.batches,
+            "averageBatchSize": round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+            "averageBatchSeconds": round(self.inference_seconds / self.batches, 3) if self.batches else 0.0,
+            "errors": self.errors,
+            "rejected": self.rejected,
+        }
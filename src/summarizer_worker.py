@@ -0,0 +1,77 @@
+"""Summarization model, loaded and run inside the summarizer worker process.
+
+Nothing here is imported by the API process itself: ``summarizer`` submits
+these functions to a spawned process pool, so torch and transformers (and the
+model weights) only ever live in the worker.
+"""
+
+# Builds a small randomly initialized model instead of downloading one.
+TINY_MODEL = "tiny"
+MAX_INPUT_TOKENS = 512
+
+_tokenizer = None
+_model = None
+
+
+def _tiny_model():
+    import torch
+    from transformers import ByT5Tokenizer, T5Config, T5ForConditionalGeneration
+
+    # Byte-level, so it needs no vocabulary file; Khmer text still round-trips.
+    tokenizer = ByT5Tokenizer()
+    torch.manual_seed(0)
+    config = T5Config(
+        vocab_size=len(tokenizer),
+        d_model=32,
+        d_kv=8,
+        d_ff=64,
+        num_layers=2,
+        num_heads=4,
+        pad_token_id=tokenizer.pad_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        decoder_start_token_id=tokenizer.pad_token_id,
+    )
+    return tokenizer, T5ForConditionalGeneration(config)
+
+
+def load(model_name: str, token: str | None, threads: int) -> None:
+    """Process-pool initializer: pin torch's threads and load the model once."""
+    global _tokenizer, _model
+    import torch
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    if model_name == TINY_MODEL:
+        _tokenizer, _model = _tiny_model()
+    else:
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        _tokenizer = AutoTokenizer.from_pretrained(model_name, token=token)
+        _model = AutoModelForSeq2SeqLM.from_pretrained(model_name, token=token)
+    _model.eval()
+
+
+def ready() -> bool:
+    return _model is not None
+
+
+def summarize(texts: list[str], max_length: int, num_beams: int) -> list[str]:
+    import torch
+
+    # One padded batch: a single encoder pass and beam search for every text.
+    inputs = _tokenizer(
+        [f"summarize: {text}" for text in texts],
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+        max_length=MAX_INPUT_TOKENS,
+    )
+    with torch.inference_mode():
+        summary_ids = _model.generate(
+            **inputs,
+            max_length=max_length,
+            num_beams=num_beams,
+            length_penalty=2.0,
+            early_stopping=True,
+        )
+    return _tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
@@ -0,0 +1,85 @@
+"""Helpers for TopicContent_V3 node trees."""
+
+import json
+from typing import Any
+
+
+_LAYOUT_PROPS = ("className", "style")
+_WRAPPER_TYPES = {"div", "span"}
+_DECORATION_TYPES = {"LucideIcon"}
+
+_decoder = json.JSONDecoder()
+
+
+def compact_nodes(node: Any, strip_layout: bool = True) -> Any:
+    """Drop empty text nodes and single-child wrappers; optionally layout too.
+
+    ``strip_layout`` also drops layout props, decorations and whitespace-only
+    text nodes. Without it, a ``" "`` between inline nodes is kept: it is the
+    spacing between a word and the math after it.
+
+    Returns ``None`` when nothing worth keeping is left of ``node``.
+    """
+    if isinstance(node, list):
+        children = [compact_nodes(child, strip_layout) for child in node]
+        return [child for child in children if child is not None]
+    if not isinstance(node, dict):
+        return node
+
+    node_type = node.get("type")
+    if node_type == "text":
+        value = node.get("value")
+        if not isinstance(value, str) or not value or (strip_layout and not value.strip()):
+            return None
+        return node
+    if strip_layout and node_type in _DECORATION_TYPES:
+        return None
+
+    props = node.get("props")
+    if not isinstance(props, dict):
+        if node_type is None:
+            # Plain containers (example steps, exercise questions) hold node lists too.
+            return {
+                key: compact_nodes(value, strip_layout) if isinstance(value, list) else value
+                for key, value in node.items()
+            }
+        return node
+    props = {
+        key: compact_nodes(value, strip_layout)
+        for key, value in props.items()
+        if not (strip_layout and key in _LAYOUT_PROPS)
+    }
+    children = props.get("children")
+    if node_type in _WRAPPER_TYPES and isinstance(children, list):
+        if not children:
+            return None
+        if len(children) == 1 and set(props) == {"children"}:
+            return children[0]
+    return {**node, "props": props}
+
+
+def compact_json_spans(text: str, strip_layout: bool = True) -> str:
+    """Compact every embedded JSON array/object in free text, leaving prose as is."""
+    parts = []
+    position = 0
+    length = len(text)
+    while position < length:
+        start = min(
+            (index for index in (text.find("[", position), text.find("{", position)) if index != -1),
+            default=-1,
+        )
+        if start == -1:
+            break
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            parts.append(text[position : start + 1])
+            position = start + 1
+            continue
+        parts.append(text[position:start])
+        compacted = compact_nodes(value, strip_layout)
+        if compacted is not None:
+            parts.append(json.dumps(compacted, ensure_ascii=False, separators=(",", ":")))
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
@@ -0,0 +1,167 @@
+"""BM25 index over TopicContent boxes used to trim long lessons per question."""
+
+import math
+import os
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+
+from .khmer import estimate_tokens, tokenize
+
+
+TOPIC_PRUNE_ENABLED = os.getenv("TOPIC_PRUNE_ENABLED", "true").lower() != "false"
+TOPIC_PRUNE_TOKEN_BUDGET = int(os.getenv("TOPIC_PRUNE_TOKEN_BUDGET", "3000"))
+TOPIC_PRUNE_TOP_K = int(os.getenv("TOPIC_PRUNE_TOP_K", "6"))
+TOPIC_INDEX_CACHE_SIZE = int(os.getenv("TOPIC_INDEX_CACHE_SIZE", "256"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Props that only drive rendering and carry nothing worth matching on.
+_LAYOUT_KEYS = {"className", "type", "icon", "color", "id", "hidden", "style"}
+_SKELETON_TYPES = {"definition"}
+
+
+def _collect_text(node: Any, parts: list[str]) -> None:
+    if isinstance(node, str):
+        parts.append(node)
+    elif isinstance(node, list):
+        for child in node:
+            _collect_text(child, parts)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            if key not in _LAYOUT_KEYS:
+                _collect_text(value, parts)
+
+
+def _stub(box: dict) -> dict | None:
+    title = (box.get("props") or {}).get("title")
+    if not isinstance(title, str) or not title:
+        return None
+    return {"type": box.get("type"), "props": {"title": title}}
+
+
+@dataclass
+class _IndexedBox:
+    box: Any
+    terms: Counter
+    length: int
+    tokens: int
+    skeleton: bool
+
+
+class TopicIndex:
+    def __init__(self, boxes: list):
+        self.boxes = []
+        document_frequency: Counter = Counter()
+        for box in boxes:
+            parts: list[str] = []
+            _collect_text(box, parts)
+            terms = Counter(tokenize(" ".join(parts)))
+            document_frequency.update(terms.keys())
+            self.boxes.append(
+                _IndexedBox(
+                    box,
+                    terms,
+                    sum(terms.values()),
+                    estimate_tokens(orjson.dumps(box).decode("utf-8")),
+                    isinstance(box, dict) and box.get("type") in _SKELETON_TYPES,
+                )
+            )
+        self.total_tokens = sum(indexed.tokens for indexed in self.boxes)
+        self.average_length = sum(indexed.length for indexed in self.boxes) / max(len(self.boxes), 1)
+        count = len(self.boxes)
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> list[float]:
+        query_terms = set(tokenize(query))
+        scores = []
+        for indexed in self.boxes:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * indexed.length / (self.average_length or 1))
+            score = 0.0
+            for term in query_terms:
+                frequency = indexed.terms.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (BM25_K1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+    def select(self, query: str, token_budget: int, top_k: int) -> list:
+        """Skeleton boxes plus the best-matching boxes that fit, in lesson order."""
+        keep: set[int] = set()
+        used = 0
+        for position, indexed in enumerate(self.boxes):
+            if indexed.skeleton and used + indexed.tokens <= token_budget:
+                keep.add(position)
+                used += indexed.tokens
+
+        scores = self.scores(query)
+        ranked = sorted(
+            (position for position in range(len(self.boxes)) if scores[position] > 0),
+            key=lambda position: scores[position],
+            reverse=True,
+        )
+        picked = 0
+        for position in ranked:
+            if picked >= top_k:
+                break
+            indexed = self.boxes[position]
+            if position in keep or used + indexed.tokens > token_budget:
+                continue
+            keep.add(position)
+            used += indexed.tokens
+            picked += 1
+
+        selected = []
+        for position, indexed in enumerate(self.boxes):
+            if position in keep:
+                selected.append(indexed.box)
+            elif isinstance(indexed.box, dict):
+                stub = _stub(indexed.box)
+                if stub is not None:
+                    selected.append(stub)
+        return selected
+
+
+_indexes: OrderedDict[str, TopicIndex | None] = OrderedDict()
+
+
+def _index_for(payload: str, digest: str) -> TopicIndex | None:
+    if digest in _indexes:
+        _indexes.move_to_end(digest)
+        return _indexes[digest]
+    try:
+        boxes = orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        boxes = None
+    index = TopicIndex(boxes) if isinstance(boxes, list) else None
+    _indexes[digest] = index
+    while len(_indexes) > TOPIC_INDEX_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return index
+
+
+def prune_topic(
+    payload: str,
+    query: str,
+    digest: str,
+    token_budget: int = TOPIC_PRUNE_TOKEN_BUDGET,
+    top_k: int = TOPIC_PRUNE_TOP_K,
+) -> str:
+    """Return only the parts of a serialized lesson that matter for ``query``.
+
+    Lessons that already fit the budget, or that are not a list of boxes, are
+    returned untouched.
+    """
+    if not TOPIC_PRUNE_ENABLED or estimate_tokens(payload) <= token_budget:
+        return payload
+    index = _index_for(payload, digest)
+    if index is None or index.total_tokens <= token_budget:
+        return payload
+    selected = index.select(query, token_budget, top_k)
+    return orjson.dumps(selected).decode("utf-8")
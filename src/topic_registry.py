@@ -0,0 +1,100 @@
+"""Registered lesson payloads so /topic/gemini can reference them by id or hash."""
+
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+
+
+TOPIC_REGISTRY_MAX_BYTES = int(os.getenv("TOPIC_REGISTRY_MAX_BYTES", str(128 * 1024 * 1024)))
+TOPIC_REGISTRY_HOT_HITS = int(os.getenv("TOPIC_REGISTRY_HOT_HITS", "20"))
+
+
+def serialize_topic(topic_content: Any) -> str:
+    if isinstance(topic_content, str):
+        return topic_content
+    return orjson.dumps(topic_content).decode("utf-8")
+
+
+def topic_digest(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class RegisteredTopic:
+    topic_id: str
+    digest: str
+    payload: str
+    size: int
+    hits: int = 0
+
+
+class TopicRegistry:
+    """LRU of pre-serialized topics, addressable by their id or content hash."""
+
+    def __init__(
+        self,
+        max_bytes: int = TOPIC_REGISTRY_MAX_BYTES,
+        hot_hits: int = TOPIC_REGISTRY_HOT_HITS,
+    ):
+        self.max_bytes = max_bytes
+        self.hot_hits = hot_hits
+        self.size_bytes = 0
+        self.evictions = 0
+        self._topics: OrderedDict[str, RegisteredTopic] = OrderedDict()
+        self._by_digest: dict[str, str] = {}
+
+    def put(self, topic_id: str, topic_content: Any) -> RegisteredTopic:
+        payload = serialize_topic(topic_content)
+        topic = RegisteredTopic(
+            topic_id,
+            topic_digest(payload),
+            payload,
+            len(payload.encode("utf-8")),
+        )
+        if topic.size > self.max_bytes:
+            raise ValueError("Topic is larger than the registry")
+        previous = self._topics.get(topic_id)
+        if previous is not None:
+            if previous.digest == topic.digest:
+                self._topics.move_to_end(topic_id)
+                return previous
+            self.delete(topic_id)
+        self._topics[topic_id] = topic
+        self._by_digest[topic.digest] = topic_id
+        self.size_bytes += topic.size
+        while self.size_bytes > self.max_bytes:
+            self.delete(next(iter(self._topics)))
+            self.evictions += 1
+        return topic
+
+    def get(self, topic_ref: str) -> RegisteredTopic | None:
+        topic_id = topic_ref if topic_ref in self._topics else self._by_digest.get(topic_ref)
+        if topic_id is None:
+            return None
+        self._topics.move_to_end(topic_id)
+        topic = self._topics[topic_id]
+        topic.hits += 1
+        return topic
+
+    def delete(self, topic_id: str) -> bool:
+        topic = self._topics.pop(topic_id, None)
+        if topic is None:
+            return False
+        if self._by_digest.get(topic.digest) == topic_id:
+            del self._by_digest[topic.digest]
+        self.size_bytes -= topic.size
+        return True
+
+    def is_hot(self, topic: RegisteredTopic) -> bool:
+        return self.hot_hits > 0 and topic.hits >= self.hot_hits
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._topics),
+            "bytes": self.size_bytes,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,220 @@
+"""Khmer→English translation client: pooled, cached and micro-batched.
+
+Concurrent strings are collected for up to TRANSLATION_MAX_WAIT_MS (or until
+TRANSLATION_MAX_BATCH) and sent as one ``input_text`` array over a keep-alive
+connection pool. Translations are kept in an LRU, identical in-flight strings
+share one request, and text without Khmer never leaves the process.
+
+With TRANSLATION_PROMPT_STAGE the learner prompt reaches Gemini with its
+English translation appended; the stage is best-effort and a failed
+translation leaves the prompt as it was.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import httpx
+
+from .khmer import is_khmer
+
+
+TRANSLATE_API_URL = os.getenv("TRANSLATE_API_URL")
+USERNAME_TRANSLATE_API = os.getenv("USERNAME_TRANSLATE_API")
+PASSWORD_TRANSLATE_API = os.getenv("PASSWORD_TRANSLATE_API")
+TRANSLATION_PROMPT_STAGE = os.getenv("TRANSLATION_PROMPT_STAGE", "false").lower() == "true"
+TRANSLATION_MAX_BATCH = int(os.getenv("TRANSLATION_MAX_BATCH", "32"))
+TRANSLATION_MAX_WAIT_MS = float(os.getenv("TRANSLATION_MAX_WAIT_MS", "10"))
+TRANSLATION_MAX_CONNECTIONS = int(os.getenv("TRANSLATION_MAX_CONNECTIONS", "8"))
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "4096"))
+TRANSLATION_TIMEOUT_SECONDS = float(os.getenv("TRANSLATION_TIMEOUT_SECONDS", "5"))
+
+
+class TranslationError(Exception):
+    pass
+
+
+@dataclass
+class _Pending:
+    text: str
+    future: asyncio.Future
+
+
+def gloss(prompt: str, english: str) -> str:
+    return f"{prompt}\n(English: {english})"
+
+
+class TranslationClient:
+    def __init__(
+        self,
+        url: str | None = TRANSLATE_API_URL,
+        username: str | None = USERNAME_TRANSLATE_API,
+        password: str | None = PASSWORD_TRANSLATE_API,
+        max_batch: int = TRANSLATION_MAX_BATCH,
+        max_wait: float = TRANSLATION_MAX_WAIT_MS / 1000,
+        max_connections: int = TRANSLATION_MAX_CONNECTIONS,
+        cache_entries: int = TRANSLATION_CACHE_MAX_ENTRIES,
+        timeout: float = TRANSLATION_TIMEOUT_SECONDS,
+        prompt_stage: bool = TRANSLATION_PROMPT_STAGE,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.url = url
+        self.prompt_stage = prompt_stage
+        self.auth = httpx.BasicAuth(username, password) if username and password else None
+        self.max_batch = max(max_batch, 1)
+        self.max_wait = max_wait
+        self.max_connections = max_connections
+        self.cache_entries = cache_entries
+        self.timeout = timeout
+        # Tests and benchmarks can answer in-process (e.g. ``httpx.ASGITransport``).
+        self.transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._queue: list[_Pending] = []
+        self._flush: asyncio.TimerHandle | None = None
+        self._running: set[asyncio.Task] = set()
+        self.requests = 0
+        self.skipped = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.batched_texts = 0
+        self.errors = 0
+        self.upstream_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                auth=self.auth,
+                timeout=self.timeout,
+                transport=self.transport,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def translate(self, text: str) -> str:
+        """English for Khmer ``text``; anything else comes back unchanged."""
+        self.requests += 1
+        if not is_khmer(text):
+            self.skipped += 1
+            return text
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            self.cache_hits += 1
+            return cached
+        if not self.enabled:
+            raise TranslationError("TRANSLATE_API_URL is not set")
+        future = self._in_flight.get(text)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[text] = future
+        self._queue.append(_Pending(text, future))
+        if len(self._queue) >= self.max_batch:
+            self._send()
+        elif self._flush is None:
+            self._flush = asyncio.get_running_loop().call_later(self.max_wait, self._send)
+        return await asyncio.shield(future)
+
+    async def translate_many(self, texts: list[str]) -> list[str]:
+        return list(await asyncio.gather(*(self.translate(text) for text in texts)))
+
+    async def glossed(self, prompts: list[str]) -> dict[str, str]:
+        """The prompt stage: prompt -> prompt with its translation, for those that got one."""
+        if not (self.prompt_stage and self.enabled):
+            return {}
+        translations = await asyncio.gather(*(self.translate(prompt) for prompt in prompts), return_exceptions=True)
+        return {
+            prompt: gloss(prompt, english)
+            for prompt, english in zip(prompts, translations)
+            if isinstance(english, str) and english and english != prompt
+        }
+
+    def _send(self) -> None:
+        if self._flush is not None:
+            self._flush.cancel()
+            self._flush = None
+        batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+        if self._queue:
+            self._flush = asyncio.get_running_loop().call_later(self.max_wait, self._send)
+        if not batch:
+            return
+        task = asyncio.create_task(self._post(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _post(self, batch: list[_Pending]) -> None:
+        started = time.perf_counter()
+        try:
+            response = await self._http().post(
+                self.url,
+                json={"input_text": [pending.text for pending in batch], "src_lang": "kh", "tgt_lang": "eng"},
+            )
+            response.raise_for_status()
+            translated = response.json().get("translate_text", [])
+            if len(translated) != len(batch):
+                raise TranslationError(f"Expected {len(batch)} translations, got {len(translated)}")
+        except Exception as exc:
+            self.errors += 1
+            error = exc if isinstance(exc, TranslationError) else TranslationError(f"{type(exc).__name__}: {exc}")
+            for pending in batch:
+                self._settle(pending, error=error)
+            return
+        self.upstream_seconds += time.perf_counter() - started
+        self.batches += 1
+        self.batched_texts += len(batch)
+        for pending, english in zip(batch, translated):
+            self._remember(pending.text, english)
+            self._settle(pending, english)
+
+    def _settle(self, pending: _Pending, english: str | None = None, error: Exception | None = None) -> None:
+        self._in_flight.pop(pending.text, None)
+        if pending.future.done():
+            return
+        if error is not None:
+            pending.future.set_exception(error)
+        else:
+            pending.future.set_result(english)
+
+    def _remember(self, text: str, english: str) -> None:
+        if self.cache_entries <= 0:
+            return
+        self._cache[text] = english
+        self._cache.move_to_end(text)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    async def close(self) -> None:
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "promptStage": self.prompt_stage,
+            "requests": self.requests,
+            "skippedNonKhmer": self.skipped,
+            "cacheHits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "cacheEntries": len(self._cache),
+            "batches": self.batches,
+            "averageBatchSize": round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+            "averageBatchSeconds": round(self.upstream_seconds / self.batches, 3) if self.batches else 0.0,
+            "errors": self.errors,
+        }
@@ -0,0 +1,293 @@
+"""Async Gemini access shared by the tutoring endpoints."""
+
+import asyncio
+import contextlib
+import os
+import time
+
+from . import gemini_sdk
+from .hedging import HedgePolicy
+from .instructions.prompt import Prompt
+from .prompt_classifier import policy_for
+from .upstream_pool import (
+    RATE_LIMIT_ERRORS,
+    UPSTREAM_BACKOFF_BASE_SECONDS,
+    Route,
+    UpstreamPool,
+    UpstreamUnavailableError,
+    estimate_prompt_tokens,
+)
+
+
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "256"))
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "60"))
+
+
+class UpstreamTimeoutError(Exception):
+    pass
+
+
+_END = object()
+
+
+async def _next_chunk(chunks):
+    try:
+        return await anext(chunks)
+    except StopAsyncIteration:
+        return _END
+
+
+async def _discard(task: asyncio.Task, chunks) -> None:
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await chunks.aclose()
+
+
+class GeminiUpstream:
+    def __init__(
+        self,
+        pool: UpstreamPool,
+        max_in_flight: int = UPSTREAM_MAX_IN_FLIGHT,
+        timeout: float = UPSTREAM_TIMEOUT_SECONDS,
+        hedging: HedgePolicy | None = None,
+        generation_configs: dict | None = None,
+    ):
+        self.pool = pool
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.hedging = hedging or HedgePolicy()
+        # Keyed by Prompt.response_format; formats without an entry use the model defaults.
+        self.generation_configs = generation_configs or {}
+        self._sdk_generation_configs: dict[tuple[str, str], dict | None] = {}
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    def generation_config(self, prompt: Prompt) -> dict | None:
+        """The response format's config with the prompt class's budget applied, built once."""
+        key = (prompt.response_format, prompt.prompt_class)
+        if key not in self._sdk_generation_configs:
+            config = {
+                **self.generation_configs.get(prompt.response_format, {}),
+                **policy_for(prompt.prompt_class).generation_config(),
+            }
+            self._sdk_generation_configs[key] = gemini_sdk.generation_config(config) if config else None
+        return self._sdk_generation_configs[key]
+
+    def _retry(self, route: Route, exc: Exception, attempt: int) -> None:
+        """Re-raise ``exc`` unless another route should get the call."""
+        if not self.pool.failed(route, exc) or attempt >= self.pool.max_attempts:
+            if isinstance(exc, RATE_LIMIT_ERRORS):
+                raise UpstreamUnavailableError(
+                    "Gemini quota exhausted on every route",
+                    retry_after=UPSTREAM_BACKOFF_BASE_SECONDS,
+                ) from exc
+            raise exc
+
+    async def generate(self, prompt: Prompt):
+        tokens = estimate_prompt_tokens(prompt)
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                if not self.hedging.enabled:
+                    return await self._generate_routed(prompt, tokens, [])
+                return await self._generate_hedged(prompt, tokens)
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, prompt: Prompt):
+        tokens = estimate_prompt_tokens(prompt)
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                chunks = (
+                    self._stream_hedged(prompt, tokens)
+                    if self.hedging.enabled
+                    else self._stream_routed(prompt, tokens, [])
+                )
+                async with contextlib.aclosing(chunks):
+                    async for chunk in chunks:
+                        yield chunk
+            finally:
+                self.in_flight -= 1
+
+    async def _generate_routed(
+        self,
+        prompt: Prompt,
+        tokens: int,
+        placed: list[Route],
+        avoid: Route | None = None,
+    ):
+        for attempt in range(1, self.pool.max_attempts + 1):
+            route = await self.pool.acquire(tokens, avoid, policy_for(prompt.prompt_class).tier)
+            placed.append(route)
+            try:
+                # Inside the try: a failure here must still settle a half-open trial.
+                model = await route.models.model_for(prompt)
+                response = await asyncio.wait_for(
+                    model.generate_content_async(
+                        prompt.contents,
+                        generation_config=self.generation_config(prompt),
+                    ),
+                    timeout=self.timeout,
+                )
+            except asyncio.TimeoutError as exc:
+                self.pool.failed(route, exc)
+                raise UpstreamTimeoutError(
+                    f"Gemini did not respond within {self.timeout:g}s"
+                ) from exc
+            except asyncio.CancelledError:
+                self.pool.released(route)
+                raise
+            except Exception as exc:
+                self._retry(route, exc, attempt)
+                continue
+            self.pool.succeeded(route, response.usage_metadata, tokens)
+            return response
+
+    async def _stream_routed(
+        self,
+        prompt: Prompt,
+        tokens: int,
+        placed: list[Route],
+        avoid: Route | None = None,
+    ):
+        for attempt in range(1, self.pool.max_attempts + 1):
+            route = await self.pool.acquire(tokens, avoid, policy_for(prompt.prompt_class).tier)
+            placed.append(route)
+            started = False
+            usage = None
+            try:
+                model = await route.models.model_for(prompt)
+                response = await asyncio.wait_for(
+                    model.generate_content_async(
+                        prompt.contents,
+                        stream=True,
+                        generation_config=self.generation_config(prompt),
+                    ),
+                    timeout=self.timeout,
+                )
+                chunks = aiter(response)
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    started = True
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    yield chunk
+            except asyncio.TimeoutError as exc:
+                self.pool.failed(route, exc)
+                raise UpstreamTimeoutError(
+                    f"Gemini stream stalled for more than {self.timeout:g}s"
+                ) from exc
+            except (asyncio.CancelledError, GeneratorExit):
+                self.pool.released(route)
+                raise
+            except Exception as exc:
+                if started:
+                    # Part of the answer is already out; no retry.
+                    self.pool.failed(route, exc)
+                    raise
+                self._retry(route, exc, attempt)
+                continue
+            self.pool.succeeded(route, usage, tokens)
+            return
+
+    async def _generate_hedged(self, prompt: Prompt, tokens: int):
+        kind = f"{prompt.instruction_key}:{prompt.prompt_class}:response"
+        started = time.monotonic()
+        placed: list[Route] = []
+        primary = asyncio.create_task(self._generate_routed(prompt, tokens, placed))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedging.delay(kind))
+            if not done and self.hedging.try_hedge():
+                avoid = placed[-1] if placed else None
+                tasks.append(asyncio.create_task(self._generate_routed(prompt, tokens, [], avoid)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    self.hedging.observe(kind, time.monotonic() - started)
+                    if len(tasks) > 1:
+                        self.hedging.finished(hedge_won=task is not primary)
+                    return task.result()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let the loser settle its route (a half-open trial included) before returning.
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _stream_hedged(self, prompt: Prompt, tokens: int):
+        """Hedge on the first chunk; once one stream has produced, it is the answer."""
+        kind = f"{prompt.instruction_key}:{prompt.prompt_class}:first-chunk"
+        started = time.monotonic()
+        placed: list[Route] = []
+        primary = self._stream_routed(prompt, tokens, placed)
+        streams = {asyncio.create_task(_next_chunk(primary)): primary}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(streams, timeout=self.hedging.delay(kind))
+            if not done and self.hedging.try_hedge():
+                avoid = placed[-1] if placed else None
+                hedge = self._stream_routed(prompt, tokens, [], avoid)
+                streams[asyncio.create_task(_next_chunk(hedge))] = hedge
+
+            pending = set(streams)
+            error = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = error or task.exception()
+            if winner is None:
+                raise error
+
+            self.hedging.observe(kind, time.monotonic() - started)
+            if len(streams) > 1:
+                self.hedging.finished(hedge_won=streams[winner] is not primary)
+            for task, chunks in streams.items():
+                if task is not winner:
+                    await _discard(task, chunks)
+
+            first = winner.result()
+            if first is _END:
+                return
+            yield first
+            async for chunk in streams[winner]:
+                yield chunk
+        finally:
+            for task, chunks in streams.items():
+                await _discard(task, chunks)
+
+
+def chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+def finish_reason(chunk) -> str | None:
+    candidates = getattr(chunk, "candidates", None)
+    if not candidates:
+        return None
+    reason = candidates[0].finish_reason
+    return getattr(reason, "name", None) or str(reason)
+
+
+def usage_to_dict(usage) -> dict:
+    return {
+        "promptTokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "outputTokens": getattr(usage, "candidates_token_count", 0) or 0,
+        "cachedTokens": getattr(usage, "cached_content_token_count", 0) or 0,
+        "totalTokens": getattr(usage, "total_token_count", 0) or 0,
+    }
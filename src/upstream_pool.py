@@ -0,0 +1,296 @@
+"""Routing of Gemini calls across API keys and model tiers."""
+
+import asyncio
+import os
+import random
+import time
+from functools import lru_cache
+
+from google.api_core import exceptions
+
+from .context_cache import CONTEXT_CACHE_ENABLED, ContextCache
+from .instructions.prompt import Prompt
+from .khmer import estimate_tokens
+from .rate_limit import TokenBucket
+
+
+UPSTREAM_MODELS = os.getenv("UPSTREAM_MODELS", "gemini-2.5-flash,gemini-2.5-flash-lite")
+UPSTREAM_RPM = os.getenv("UPSTREAM_RPM", "1000,4000")
+UPSTREAM_TPM = os.getenv("UPSTREAM_TPM", "1000000,4000000")
+UPSTREAM_DEGRADE_ENABLED = os.getenv("UPSTREAM_DEGRADE_ENABLED", "false").lower() == "true"
+UPSTREAM_MAX_ATTEMPTS = int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3"))
+UPSTREAM_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_ACQUIRE_TIMEOUT_SECONDS", "10"))
+UPSTREAM_BACKOFF_BASE_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_BASE_SECONDS", "1"))
+UPSTREAM_BACKOFF_MAX_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_MAX_SECONDS", "60"))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+UPSTREAM_BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30"))
+# How often callers waiting on a half-open route look again while its trial call runs.
+UPSTREAM_TRIAL_PROBE_SECONDS = float(os.getenv("UPSTREAM_TRIAL_PROBE_SECONDS", "0.25"))
+
+RATE_LIMIT_ERRORS = (exceptions.ResourceExhausted, exceptions.TooManyRequests)
+# Worth trying again on another route before anything was streamed.
+RETRYABLE_ERRORS = RATE_LIMIT_ERRORS + (
+    exceptions.InternalServerError,
+    exceptions.ServiceUnavailable,
+    exceptions.BadGateway,
+)
+# Failures that say something about a route's health and count toward its breaker.
+# Client errors (a 400 for a malformed request, a blocked prompt) do not.
+BREAKER_ERRORS = RATE_LIMIT_ERRORS + (exceptions.ServerError, TimeoutError, ConnectionError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class UpstreamUnavailableError(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@lru_cache(maxsize=256)
+def _instruction_tokens(system_instruction: str) -> int:
+    return estimate_tokens(system_instruction)
+
+
+def estimate_prompt_tokens(prompt: Prompt) -> int:
+    return _instruction_tokens(prompt.system_instruction) + estimate_tokens(prompt.contents)
+
+
+def _per_tier(raw: str, tiers: int) -> list[int]:
+    values = [int(float(value)) for value in raw.split(",") if value.strip()]
+    return (values + values[-1:] * tiers)[:tiers]
+
+
+class Route:
+    """One API key serving one model, with its own quota and health."""
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        tier: int,
+        rpm: int,
+        tpm: int,
+        models,
+    ):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.tier = tier
+        self.models = models
+        self.requests = TokenBucket(rpm / 60, capacity=rpm)
+        self.tokens = TokenBucket(tpm / 60, capacity=tpm)
+        self.state = CLOSED
+        self.failures = 0
+        self.rate_limits = 0
+        self.backoff_until = 0.0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.served = 0
+        self.rate_limited = 0
+        self.errors = 0
+
+    @property
+    def name(self) -> str:
+        return f"…{self.api_key[-4:]}/{self.model_name}"
+
+    def available(self, now: float) -> bool:
+        if now < self.backoff_until:
+            return False
+        if self.state == OPEN:
+            if now - self.opened_at < UPSTREAM_BREAKER_RESET_SECONDS:
+                return False
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            return not self.trial_in_flight
+        return True
+
+    def headroom(self, tokens: int) -> float:
+        if self.requests.available() < 1 or self.tokens.available() < tokens:
+            return 0.0
+        return min(
+            self.requests.available() / self.requests.capacity,
+            self.tokens.available() / self.tokens.capacity,
+        )
+
+    def wait_time(self, now: float, tokens: int) -> float:
+        if self.state == OPEN:
+            blocked = self.opened_at + UPSTREAM_BREAKER_RESET_SECONDS - now
+        elif self.state == HALF_OPEN and self.trial_in_flight:
+            # Free again only once the trial settles; there is no time to wait for.
+            blocked = max(self.backoff_until - now, UPSTREAM_TRIAL_PROBE_SECONDS)
+        else:
+            blocked = self.backoff_until - now
+        return max(blocked, self.requests.delay_for(1), self.tokens.delay_for(tokens), 0.0)
+
+    def stats(self, now: float) -> dict:
+        return {
+            "route": self.name,
+            "model": self.model_name,
+            "tier": self.tier,
+            "state": self.state,
+            "requestsAvailable": round(self.requests.available(), 1),
+            "tokensAvailable": round(self.tokens.available()),
+            "backoffSeconds": round(max(self.backoff_until - now, 0.0), 2),
+            "consecutiveFailures": self.failures,
+            "served": self.served,
+            "rateLimited": self.rate_limited,
+            "errors": self.errors,
+            "contextCache": self.models.stats(),
+        }
+
+
+class UpstreamPool:
+    """Picks the route with the most quota headroom for each call.
+
+    Tier 0 is the preferred model unless the prompt's class asks for a
+    cheaper one; tiers below the preferred one are only used when ``degrade``
+    is on and no preferred route can take the request right now.
+    """
+
+    def __init__(
+        self,
+        routes: list[Route],
+        degrade: bool = UPSTREAM_DEGRADE_ENABLED,
+        max_attempts: int = UPSTREAM_MAX_ATTEMPTS,
+        acquire_timeout: float = UPSTREAM_ACQUIRE_TIMEOUT_SECONDS,
+    ):
+        self.routes = routes
+        self.degrade = degrade
+        self.max_attempts = max_attempts
+        self.acquire_timeout = acquire_timeout
+        self.degraded = 0
+        self.rejected = 0
+        self._random = random.Random()
+
+    def _tier_order(self, preferred: int) -> list[int]:
+        """``preferred`` first, then costlier tiers, then (when degrading) cheaper ones."""
+        tiers = sorted({route.tier for route in self.routes})
+        preferred = min(preferred, tiers[-1])
+        order = [preferred] + [tier for tier in reversed(tiers) if tier < preferred]
+        if self.degrade:
+            order += [tier for tier in tiers if tier > preferred]
+        return order
+
+    def _candidates(
+        self,
+        tokens: int,
+        now: float,
+        tiers: list[int],
+        avoid: Route | None = None,
+    ) -> list[Route]:
+        best = []
+        for tier in tiers:
+            scored = [
+                (route.headroom(tokens), route)
+                for route in self.routes
+                if route.tier == tier and route is not avoid and route.available(now)
+            ]
+            best = [route for headroom, route in sorted(scored, key=lambda item: -item[0]) if headroom > 0]
+            if best:
+                return best
+        return best
+
+    async def acquire(self, tokens: int, avoid: Route | None = None, tier: int = 0) -> Route:
+        """Reserve one request and ``tokens`` of quota on the best route.
+
+        ``avoid`` (a hedge's primary route) is only used when nothing else is.
+        ``tier`` is the preferred tier; a costlier one stands in when it has
+        no quota left, a cheaper one only when degrading is on.
+        """
+        tiers = self._tier_order(tier)
+        preferred = tiers[0]
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            now = time.monotonic()
+            candidates = self._candidates(tokens, now, tiers, avoid) or self._candidates(tokens, now, tiers)
+            if candidates:
+                route = candidates[0]
+                route.requests.consume(1)
+                route.tokens.consume(tokens)
+                if route.state == HALF_OPEN:
+                    route.trial_in_flight = True
+                if route.tier > preferred:
+                    self.degraded += 1
+                return route
+
+            usable = [route for route in self.routes if route.tier in tiers]
+            wait = min(route.wait_time(now, tokens) for route in usable)
+            if now + wait > deadline:
+                self.rejected += 1
+                raise UpstreamUnavailableError(
+                    "No Gemini quota available", retry_after=max(wait, 1.0)
+                )
+            await asyncio.sleep(max(wait, 0.01))
+
+    def succeeded(self, route: Route, usage=None, estimated_tokens: int = 0) -> None:
+        route.served += 1
+        route.failures = 0
+        route.rate_limits = 0
+        route.trial_in_flight = False
+        route.state = CLOSED
+        total = getattr(usage, "total_token_count", 0) or 0
+        if total and estimated_tokens:
+            # Settle the estimate against what Gemini actually billed.
+            route.tokens.consume(total - estimated_tokens)
+
+    def failed(self, route: Route, exc: BaseException) -> bool:
+        """Record a failed call; returns whether it is worth retrying elsewhere."""
+        now = time.monotonic()
+        route.trial_in_flight = False
+        if not isinstance(exc, BREAKER_ERRORS):
+            route.errors += 1
+            return False
+        route.failures += 1
+        if isinstance(exc, RATE_LIMIT_ERRORS):
+            route.rate_limited += 1
+            route.rate_limits += 1
+            backoff = min(
+                UPSTREAM_BACKOFF_BASE_SECONDS * 2 ** (route.rate_limits - 1),
+                UPSTREAM_BACKOFF_MAX_SECONDS,
+            )
+            route.backoff_until = now + backoff * self._random.uniform(0.5, 1.5)
+        else:
+            route.errors += 1
+        if route.state == HALF_OPEN or route.failures >= UPSTREAM_BREAKER_FAILURES:
+            route.state = OPEN
+            route.opened_at = now
+        return isinstance(exc, RETRYABLE_ERRORS)
+
+    def released(self, route: Route) -> None:
+        """The caller stopped early; neither a success nor a failure."""
+        route.trial_in_flight = False
+
+    async def warm_up(self, prompts: list[Prompt]) -> None:
+        await asyncio.gather(*(route.models.warm_up(prompts) for route in self.routes))
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "degradeEnabled": self.degrade,
+            "degraded": self.degraded,
+            "rejected": self.rejected,
+            "routes": [route.stats(now) for route in self.routes],
+        }
+
+
+def build_upstream_pool(api_keys: list[str]) -> UpstreamPool:
+    """One route per (key, model tier); the first key is the one ``genai.configure`` uses.
+
+    Upstream context caches are per project, and the SDK only manages them
+    through its default client, so they are enabled on the first key only.
+    """
+    model_names = [name.strip() for name in UPSTREAM_MODELS.split(",") if name.strip()]
+    rpm = _per_tier(UPSTREAM_RPM, len(model_names))
+    tpm = _per_tier(UPSTREAM_TPM, len(model_names))
+    routes = []
+    for index, api_key in enumerate(api_keys):
+        for tier, model_name in enumerate(model_names):
+            models = ContextCache(
+                model_name,
+                enabled=CONTEXT_CACHE_ENABLED and index == 0,
+                api_key=None if index == 0 else api_key,
+            )
+            routes.append(Route(api_key, model_name, tier, rpm[tier], tpm[tier], models))
+    return UpstreamPool(routes)
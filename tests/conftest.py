@@ -0,0 +1,44 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "fake")
+os.environ.setdefault("INTERNAL_API_KEY", "test")
+os.environ.setdefault("BATCH_RATE_PER_SECOND", "0")
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    from src import main
+
+    return main
+
+
+@pytest.fixture
+def fake_model(app_module):
+    """Route every upstream call of the app to a fake model; the real providers come back afterwards."""
+    from benchmarks.fake_gemini import FakeGeminiModel, install
+
+    providers = [route.models for route in app_module.upstream_pool.routes]
+    model = FakeGeminiModel(latency=0.0, jitter=0.0, chunk_interval=0.0)
+    install(app_module, model)
+    yield model
+    for route, provider in zip(app_module.upstream_pool.routes, providers):
+        route.models = provider
+
+
+@pytest.fixture
+def call(app_module):
+    """``call(method, path, json=...)`` against the in-process app."""
+
+    def request(method: str, path: str, **kwargs) -> httpx.Response:
+        async def send() -> httpx.Response:
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.request(method, path, headers={"x-api-key": app_module.INTERNAL_KEY}, **kwargs)
+
+        return asyncio.run(send())
+
+    return request
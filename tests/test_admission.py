@@ -0,0 +1,218 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.admission import (
+    BATCH,
+    INTERACTIVE,
+    AdmissionController,
+    AdmissionMiddleware,
+    AdmissionRejected,
+    DeadlineExceededError,
+    check_deadline,
+)
+
+
+async def _queue(controller: AdmissionController, order: list, name: str, caller: str, priority: int = INTERACTIVE):
+    async def wait():
+        await controller.acquire(caller, priority, None)
+        order.append(name)
+
+    task = asyncio.create_task(wait())
+    await asyncio.sleep(0)
+    return task
+
+
+async def _drain(controller: AdmissionController, tasks: list) -> None:
+    for _ in tasks:
+        controller.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+
+def test_a_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queue=1)
+        await controller.acquire("a", INTERACTIVE, None)
+        queued = await _queue(controller, [], "b", "b")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("c", INTERACTIVE, None)
+        await _drain(controller, [queued])
+        return controller, rejected.value
+
+    controller, rejected = asyncio.run(scenario())
+
+    assert rejected.status_code == 429
+    assert rejected.retry_after >= 1
+    assert controller.stats()["shed"] == 1
+
+
+def test_one_caller_cannot_fill_the_queue():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queue=10, max_queue_per_caller=1)
+        await controller.acquire("a", INTERACTIVE, None)
+        queued = [await _queue(controller, [], "first", "greedy")]
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("greedy", INTERACTIVE, None)
+        queued.append(await _queue(controller, [], "other", "polite"))
+        await _drain(controller, queued)
+
+    asyncio.run(scenario())
+
+
+def test_queued_requests_past_their_deadline_never_run():
+    async def scenario():
+        controller = AdmissionController(max_active=1)
+        await controller.acquire("a", INTERACTIVE, None)
+        with pytest.raises(AdmissionRejected) as expired:
+            await controller.acquire("b", INTERACTIVE, time.time() + 0.05)
+        return controller, expired.value
+
+    controller, expired = asyncio.run(scenario())
+
+    assert expired.status_code == 504
+    assert controller.stats()["expired"] == 1
+    assert controller.queued == 0 and controller.active == 1
+
+
+def test_a_deadline_passing_at_hand_over_skips_the_waiter():
+    async def scenario():
+        controller = AdmissionController(max_active=1)
+        await controller.acquire("a", INTERACTIVE, None)
+        order = []
+        late = asyncio.create_task(controller.acquire("late", INTERACTIVE, time.time() + 0.05))
+        await asyncio.sleep(0)
+        waiting = await _queue(controller, order, "next", "next")
+        # The slot frees exactly as the deadline passes, before wait_for notices.
+        late_waiter = controller._queues[INTERACTIVE]["late"][0]
+        late_waiter.deadline = time.time() - 1
+        controller.release()
+        with pytest.raises(AdmissionRejected) as expired:
+            await late
+        await waiting
+        return controller, order, expired.value
+
+    controller, order, expired = asyncio.run(scenario())
+
+    assert expired.status_code == 504
+    assert order == ["next"]
+    assert controller.active == 1
+
+
+def test_an_admitted_request_is_stopped_before_upstream_once_its_deadline_passes():
+    calls = []
+
+    async def app(scope, receive, send):
+        await asyncio.sleep(0.05)
+        try:
+            check_deadline()
+        except DeadlineExceededError:
+            calls.append("stopped")
+            status = 504
+        else:
+            calls.append("upstream")
+            status = 200
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = AdmissionMiddleware(app, AdmissionController(), {"/gemini": INTERACTIVE})
+    deadline = str(int((time.time() + 0.02) * 1000))
+
+    response = asyncio.run(_post(middleware, {"x-request-deadline": deadline}))
+
+    assert response.status_code == 504
+    assert calls == ["stopped"]
+
+
+def test_interactive_requests_are_served_before_batch_ones():
+    async def scenario():
+        controller = AdmissionController(max_active=1)
+        await controller.acquire("a", INTERACTIVE, None)
+        order = []
+        tasks = [
+            await _queue(controller, order, "batch", "b", BATCH),
+            await _queue(controller, order, "interactive", "c", INTERACTIVE),
+        ]
+        await _drain(controller, tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "batch"]
+
+
+def test_callers_take_turns_within_a_priority():
+    async def scenario():
+        controller = AdmissionController(max_active=1)
+        await controller.acquire("a", INTERACTIVE, None)
+        order = []
+        tasks = [await _queue(controller, order, f"busy-{number}", "busy") for number in range(3)]
+        tasks.append(await _queue(controller, order, "quiet", "quiet"))
+        await _drain(controller, tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["busy-0", "quiet", "busy-1", "busy-2"]
+
+
+class _RecordingController(AdmissionController):
+    def __init__(self):
+        super().__init__()
+        self.callers = []
+
+    async def acquire(self, caller, priority, deadline):
+        self.callers.append((caller, priority))
+        await super().acquire(caller, priority, deadline)
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _post(app, headers: dict, path: str = "/gemini") -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post(path, headers=headers)
+
+
+def test_callers_are_keyed_on_client_id_then_api_key():
+    controller = _RecordingController()
+    middleware = AdmissionMiddleware(_ok, controller, {"/gemini": INTERACTIVE, "/gemini/batch": BATCH})
+
+    async def scenario():
+        await _post(middleware, {"x-client-id": "school-1", "x-api-key": "shared"})
+        await _post(middleware, {"x-api-key": "shared"})
+        await _post(middleware, {"x-api-key": "shared", "x-priority": "batch"})
+        # A batch path cannot be raised to interactive.
+        await _post(middleware, {"x-api-key": "shared", "x-priority": "interactive"}, "/gemini/batch")
+
+    asyncio.run(scenario())
+
+    assert controller.callers == [
+        ("school-1", INTERACTIVE),
+        ("shared", INTERACTIVE),
+        ("shared", BATCH),
+        ("shared", BATCH),
+    ]
+
+
+def test_the_middleware_sheds_with_429_and_retry_after():
+    release = asyncio.Event()
+
+    async def slow(scope, receive, send):
+        await release.wait()
+        await _ok(scope, receive, send)
+
+    middleware = AdmissionMiddleware(slow, AdmissionController(max_active=1, max_queue=0), {"/gemini": INTERACTIVE})
+
+    async def scenario():
+        held = asyncio.create_task(_post(middleware, {"x-api-key": "a"}))
+        await asyncio.sleep(0.01)
+        shed = await _post(middleware, {"x-api-key": "b"})
+        release.set()
+        return await held, shed
+
+    held, shed = asyncio.run(scenario())
+
+    assert held.status_code == 200
+    assert shed.status_code == 429
+    assert int(shed.headers["retry-after"]) >= 1
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import time
+
+from src.batch import run_batch
+from src.instructions.prompt import Prompt
+from src.rate_limit import TokenBucket
+from src.upstream import UpstreamTimeoutError
+
+_BROKEN = json.dumps([
+    {"type": "graph", "props": {"title": "ក្រាប", "equations": ["y=x^2"]}},
+    {"type": "definition", "props": {"title": "និយមន័យ", "content": [
+        {"type": "div", "props": {"children": [{"type": "text", "value": "a"}]}},
+    ]}},
+], ensure_ascii=False)
+
+
+def _check_repaired(boxes: list) -> None:
+    graph, definition = boxes
+    assert "equations" not in graph["props"]
+    assert graph["props"]["expressions"] == [{"id": "1", "latex": "y=x^2"}]
+    assert definition["props"]["content"] == [{"type": "text", "value": "a"}]
+
+
+def test_batch_komplex_items_are_repaired_like_single_answers(call, fake_model):
+    fake_model.text = _BROKEN
+    single = call("POST", "/gemini", json={"prompt": "batch repair single", "responseType": "komplex", "cache": False})
+    batch = call("POST", "/gemini/batch", json={
+        "items": [{"prompt": "batch repair one"}, {"prompt": "batch repair two"}],
+        "responseType": "komplex",
+        "cache": False,
+    })
+
+    assert batch.status_code == 200
+    results = batch.json()["results"]
+    for outcome in results:
+        assert outcome["result"] == single.json()["result"]
+        _check_repaired(json.loads(outcome["result"]))
+
+
+def test_batch_parsed_returns_box_lists(call, fake_model):
+    fake_model.text = _BROKEN
+    batch = call("POST", "/gemini/batch", json={
+        "items": [{"prompt": "batch repair parsed"}],
+        "responseType": "komplex",
+        "parsed": True,
+        "cache": False,
+    })
+
+    _check_repaired(batch.json()["results"][0]["result"])
+
+
+def test_batch_items_without_prompt_fail_alone(call, fake_model):
+    batch = call("POST", "/gemini/batch", json={"items": [{"prompt": "batch fine"}, {}]})
+
+    assert batch.json()["results"][1] == {"error": "Missing prompt"}
+    assert "result" in batch.json()["results"][0]
+
+
+def test_batch_rejects_malformed_bodies(call, fake_model):
+    for body in (
+        {"items": [{"prompt": "a"}], "parallelism": "x"},
+        {"items": [{"prompt": "a"}], "parallelism": 0},
+        {"items": [{"prompt": "a", "previousContext": {"x": 1}}]},
+        {"items": ["a"]},
+    ):
+        assert call("POST", "/gemini/batch", json=body).status_code == 422, body
+    response = call("POST", "/topic/gemini/batch", json={
+        "items": [{"prompt": "a"}], "topicContent": [{"type": "tip"}], "parallelism": 1000,
+    })
+    assert response.status_code == 422
+
+
+async def _outcomes(prompts, generate, **kwargs) -> list[dict]:
+    return [outcome async for outcome in run_batch(prompts, generate, **kwargs)]
+
+
+def test_concurrent_batches_share_one_rate():
+    bucket = TokenBucket(20.0, capacity=1.0)
+
+    async def generate(prompt):
+        return prompt.contents
+
+    async def scenario():
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _outcomes([Prompt("k", "s", f"{batch}-{item}") for item in range(3)], generate, bucket=bucket)
+            for batch in range(2)
+        ))
+        return time.perf_counter() - started
+
+    # Six items at 20/s with a burst of one: five waits of 50ms, not 2 x 2.
+    assert asyncio.run(scenario()) >= 0.24
+
+
+def test_batch_errors_do_not_leak_upstream_messages():
+    async def generate(prompt):
+        if prompt.contents == "timeout":
+            raise UpstreamTimeoutError("Upstream timeout")
+        raise RuntimeError("400 API key AIza-secret not valid")
+
+    outcomes = asyncio.run(_outcomes([Prompt("k", "s", "timeout"), Prompt("k", "s", "other")], generate, bucket=None))
+
+    assert sorted(outcomes, key=lambda outcome: outcome["index"]) == [
+        {"index": 0, "error": "Upstream timeout"},
+        {"index": 1, "error": "Upstream error"},
+    ]
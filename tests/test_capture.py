@@ -0,0 +1,129 @@
+import asyncio
+import gzip
+import hashlib
+import json
+
+import httpx
+import orjson
+
+from src import capture
+from src.capture import CaptureMiddleware, CaptureWriter, read_capture, scrub
+
+
+def _hashed(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+def test_secrets_are_dropped_and_personal_details_masked():
+    body = {
+        "prompt": "ផ្ញើចម្លើយទៅ dara.sok@example.com ឬ 012 345 678 / +855 12 345 678 សម្រាប់ x = 2024",
+        "previousContext": "Prompt 1: call me on 0969998877",
+        "apiKey": "AIza-secret",
+        "x-api-key": "internal",
+        "nested": {"accessToken": "t", "password": "p", "items": [{"authorization": "Basic x", "n": 1}]},
+        "sessionId": "learner-42",
+        "topicContent": [{"type": "text", "value": "contact teacher@example.com"}],
+    }
+
+    scrubbed = scrub(body)
+
+    assert scrubbed["prompt"] == "ផ្ញើចម្លើយទៅ <email> ឬ <phone> / <phone> សម្រាប់ x = 2024"
+    assert scrubbed["previousContext"] == "Prompt 1: call me on <phone>"
+    assert "apiKey" not in scrubbed and "x-api-key" not in scrubbed
+    assert scrubbed["nested"] == {"items": [{"n": 1}]}
+    assert scrubbed["sessionId"] == _hashed("learner-42")
+    # Lesson content is not learner data.
+    assert scrubbed["topicContent"] == body["topicContent"]
+
+
+async def _ok(scope, receive, send):
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"result": "ok"}'})
+
+
+def _send(middleware, requests: list[tuple[str, dict, dict]]) -> None:
+    async def scenario():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for path, body, headers in requests:
+                await client.post(path, json=body, headers=headers)
+
+    asyncio.run(scenario())
+
+
+def test_captured_requests_keep_no_raw_ids_or_keys(tmp_path):
+    writer = CaptureWriter(directory=str(tmp_path))
+    middleware = CaptureMiddleware(_ok, writer, paths=("/gemini",), sample_rate=1.0)
+
+    _send(middleware, [(
+        "/gemini",
+        {"prompt": "hi me@example.com", "sessionId": "learner-42"},
+        {"x-api-key": "internal-key", "x-client-id": "school-7", "authorization": "Bearer abc", "x-priority": "batch"},
+    )])
+    writer.close()
+
+    [record] = read_capture([str(tmp_path)])
+    assert record["body"] == {"prompt": "hi <email>", "sessionId": _hashed("learner-42")}
+    assert record["headers"]["x-client-id"] == _hashed("school-7")
+    assert record["headers"]["x-priority"] == "batch"
+    assert "x-api-key" not in record["headers"] and "authorization" not in record["headers"]
+    raw = b"".join(gzip.open(path).read() for path in tmp_path.iterdir())
+    for secret in (b"internal-key", b"school-7", b"learner-42", b"me@example.com", b"Bearer abc"):
+        assert secret not in raw
+    assert record["status"] == 200 and record["responseBytes"] == len(b'{"result": "ok"}')
+
+
+def test_only_sampled_requests_on_captured_paths_are_written(tmp_path, monkeypatch):
+    draws = iter([0.05, 0.5, 0.09, 0.95])
+    monkeypatch.setattr(capture.random, "random", lambda: next(draws))
+    writer = CaptureWriter(directory=str(tmp_path))
+    middleware = CaptureMiddleware(_ok, writer, paths=("/gemini",), sample_rate=0.1)
+
+    _send(middleware, [
+        ("/gemini", {"prompt": "1"}, {}),
+        ("/gemini", {"prompt": "2"}, {}),
+        ("/summarize", {"text": "never sampled"}, {}),
+        ("/gemini/stream", {"prompt": "3"}, {}),
+        ("/gemini", {"prompt": "4"}, {}),
+    ])
+    writer.close()
+
+    assert [record["body"]["prompt"] for record in read_capture([str(tmp_path)])] == ["1", "3"]
+
+
+def _record(number: int) -> dict:
+    return {"timestamp": float(number), "body": orjson.dumps({"prompt": "x" * 200, "n": number})}
+
+
+def test_files_rotate_by_size_and_only_the_newest_are_kept(tmp_path):
+    writer = CaptureWriter(directory=str(tmp_path), max_file_bytes=500, rotate_seconds=3600, max_files=3)
+
+    for number in range(30):
+        writer._append(writer._serialize(_record(number)))
+    writer._close_file()
+
+    files = sorted(tmp_path.iterdir())
+    assert writer.files == 15
+    assert len(files) == 3
+    # The newest files survive, even past ten rotations within one second.
+    assert [record["body"]["n"] for record in read_capture([str(tmp_path)])] == list(range(24, 30))
+
+
+def test_files_rotate_by_age(tmp_path, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(capture.time, "time", lambda: now[0])
+    writer = CaptureWriter(directory=str(tmp_path), rotate_seconds=1.0)
+
+    for number, at in enumerate([1000.0, 1000.5, 1002.0, 1002.5]):
+        now[0] = at
+        writer._append(writer._serialize(_record(number)))
+    writer._close_file()
+
+    assert writer.files == 2
+    contents = [
+        [json.loads(line)["body"]["n"] for line in gzip.open(path)]
+        for path in sorted(tmp_path.iterdir())
+    ]
+    assert contents == [[0, 1], [2, 3]]
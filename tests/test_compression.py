@@ -0,0 +1,114 @@
+import asyncio
+import gzip
+
+import brotli
+import httpx
+import pytest
+
+from src.compression import CompressionMiddleware, negotiate
+
+_BODY = b'{"result": "' + b'<div className=\\"text-lg font-bold\\">' * 200 + b'"}'
+
+
+def _app(body: bytes, content_type: bytes = b"application/json", chunks: int = 1, headers: list | None = None):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", content_type), *(headers or [])],
+        })
+        size = -(-len(body) // chunks)
+        for start in range(0, len(body), size):
+            await send({
+                "type": "http.response.body",
+                "body": body[start:start + size],
+                "more_body": start + size < len(body),
+            })
+
+    return CompressionMiddleware(app, minimum_size=1024)
+
+
+def _get(app, accept_encoding: str) -> tuple[httpx.Response, bytes]:
+    """The response and its body exactly as sent (httpx would otherwise decode it)."""
+
+    async def scenario():
+        # Always set: httpx would otherwise offer its own defaults.
+        headers = {"accept-encoding": accept_encoding}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            async with client.stream("GET", "/", headers=headers) as response:
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+                return response, raw
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(("accept_encoding", "expected"), [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.5, br;q=0.1", "br"),
+    ("br;q=0.0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0, gzip", "gzip"),
+    ("identity", None),
+    ("gzip;q=bogus", None),
+    ("", None),
+])
+def test_negotiation_prefers_brotli_among_accepted_encodings(accept_encoding, expected):
+    assert negotiate(accept_encoding) == expected
+
+
+@pytest.mark.parametrize(("accept_encoding", "decode"), [
+    ("br", brotli.decompress),
+    ("gzip", gzip.decompress),
+])
+def test_large_bodies_are_compressed(accept_encoding, decode):
+    response, raw = _get(_app(_BODY), accept_encoding)
+
+    assert response.headers["content-encoding"] == accept_encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(raw) < len(_BODY) / 5
+    assert decode(raw) == _BODY
+
+
+def test_chunked_bodies_are_compressed_chunk_by_chunk():
+    response, raw = _get(_app(_BODY, chunks=4), "gzip")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(raw) == _BODY
+
+
+@pytest.mark.parametrize("accept_encoding", ["br", "identity", ""])
+def test_small_or_unaccepted_bodies_pass_through_but_still_vary(accept_encoding):
+    body = _BODY if accept_encoding != "br" else b'{"result": "short"}'
+
+    response, raw = _get(_app(body), accept_encoding)
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert raw == body
+
+
+def test_an_existing_vary_header_is_extended():
+    response, _ = _get(_app(_BODY, headers=[(b"vary", b"Origin")]), "identity")
+
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+
+
+@pytest.mark.parametrize("content_type", [b"text/event-stream", b"application/x-ndjson"])
+def test_event_and_line_streams_are_left_uncompressed(content_type):
+    response, raw = _get(_app(_BODY, content_type=content_type, chunks=4), "br, gzip")
+
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    assert raw == _BODY
+
+
+def test_already_encoded_bodies_are_left_alone():
+    encoded = gzip.compress(_BODY)
+
+    response, raw = _get(_app(encoded, headers=[(b"content-encoding", b"gzip")]), "br")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert raw == encoded
@@ -0,0 +1,37 @@
+from prometheus_client import REGISTRY
+
+from src.context_compaction import ContextCompactor
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_compaction_is_exported_to_prometheus():
+    before = _sample("komplex_context_compaction_tokens_total", mode="normal", stage="before")
+    after = _sample("komplex_context_compaction_tokens_total", mode="normal", stage="after")
+    dropped = _sample("komplex_context_compaction_turns_dropped_total", mode="normal")
+    compactor = ContextCompactor({"normal": 40})
+    context = "\n".join(f"Prompt {number}: {'សំណួរ ' * 20}\nResponse {number}: ok" for number in range(1, 6))
+
+    compactor.compact(context, "normal")
+
+    stats = compactor.stats()
+    assert stats["turnsDropped"] > 0
+    assert _sample("komplex_context_compaction_tokens_total", mode="normal", stage="before") - before == stats["tokensIn"]
+    assert _sample("komplex_context_compaction_tokens_total", mode="normal", stage="after") - after == stats["tokensOut"]
+    assert _sample("komplex_context_compaction_turns_dropped_total", mode="normal") - dropped == stats["turnsDropped"]
+
+
+def test_trimming_keeps_prompts_and_responses_together():
+    context = "Earlier: the learner studies quadratics.\n" + "\n".join(
+        f"Prompt {number}: {'សំណួរ ' * (3 * number)}\nResponse {number}: {'ចម្លើយ ' * (11 - 2 * number)}"
+        for number in range(1, 6)
+    )
+
+    for budget in range(21, 200, 2):
+        compacted = ContextCompactor({"normal": budget}).compact(context, "normal")
+        kept = [number for number in range(1, 6) if f"Prompt {number}:" in compacted]
+        assert kept == [number for number in range(1, 6) if f"Response {number}:" in compacted], budget
+        # Whole turns go, oldest first.
+        assert kept == list(range(6 - len(kept), 6)), budget
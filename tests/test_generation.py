@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+
+# The second box is not valid JSON, so finalizing it asks upstream to regenerate it.
+_UNREPAIRABLE = (
+    '[{"type":"definition","props":{"title":"t","content":[{"type":"text","value":"a"}]}},'
+    '{"type":"tip","props":{"title": oops}}]'
+)
+
+
+def test_cache_hits_on_a_repaired_answer_stay_off_upstream(call, fake_model):
+    fake_model.text = _UNREPAIRABLE
+    body = {"prompt": "finalized once", "responseType": "komplex"}
+
+    first = call("POST", "/gemini", json=body)
+    calls = fake_model.calls
+    second = call("POST", "/gemini", json=body)
+
+    # The answer and one regeneration of the broken box.
+    assert calls == 2
+    assert fake_model.calls == calls
+    assert second.json() == first.json()
+    assert "oops" not in first.json()["result"]
+
+
+def test_streamed_answers_are_cached_finalized(app_module, fake_model):
+    fake_model.text = _UNREPAIRABLE
+    body = {"prompt": "finalized after stream", "responseType": "komplex"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app_module.app)
+        headers = {"x-api-key": app_module.INTERNAL_KEY}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/gemini/stream", json=body, headers=headers)
+            while app_module.generation_service._background:
+                await asyncio.gather(*app_module.generation_service._background)
+            calls = fake_model.calls
+            response = await client.post("/gemini", json=body, headers=headers)
+            return calls, response
+
+    calls, response = asyncio.run(scenario())
+
+    assert fake_model.calls == calls
+    assert "oops" not in response.json()["result"]
+
+
+def test_a_failing_background_finalize_is_counted_not_left_unretrieved(app_module, fake_model, monkeypatch):
+    from prometheus_client import REGISTRY
+
+    async def failing(text):
+        raise RuntimeError("regeneration failed")
+
+    service = app_module.generation_service
+    monkeypatch.setitem(service.finalizers, "json", failing)
+    fake_model.text = _UNREPAIRABLE
+    body = {"prompt": "finalize fails after stream", "responseType": "komplex"}
+
+    def runtime_errors() -> float:
+        return sum(
+            sample.value
+            for metric in REGISTRY.collect()
+            for sample in metric.samples
+            if sample.name == "komplex_upstream_errors_total" and sample.labels.get("error") == "RuntimeError"
+        )
+
+    errors = runtime_errors()
+    unretrieved = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        transport = httpx.ASGITransport(app=app_module.app)
+        headers = {"x-api-key": app_module.INTERNAL_KEY}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/gemini/stream", json=body, headers=headers)
+            while service._background:
+                await asyncio.gather(*service._background)
+            return response
+
+    finalize_errors = service.finalize_errors
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert unretrieved == []
+    assert service.finalize_errors == finalize_errors + 1
+    assert service.stats()["backgroundFinalizeErrors"] == service.finalize_errors
+    assert runtime_errors() == errors + 1
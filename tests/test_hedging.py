@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+from src.hedging import HedgePolicy
+from src.instructions.prompt import Prompt
+from src.upstream import GeminiUpstream
+from src.upstream_pool import CLOSED, HALF_OPEN, Route, UpstreamPool
+
+_PROMPT = Prompt("test", "system", "contents")
+_KIND = "test::response"
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class _Model:
+    """Answers ``name`` after ``first`` seconds; streams a second chunk ``then`` seconds later."""
+
+    def __init__(self, name: str, first: float = 0.0, then: float = 0.0):
+        self.name = name
+        self.first = first
+        self.then = then
+        self.calls = 0
+        self.cancelled = 0
+
+    async def model_for(self, prompt):
+        return self
+
+    def stats(self) -> dict:
+        return {}
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        self.calls += 1
+        if stream:
+            return self._stream()
+        try:
+            await asyncio.sleep(self.first)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return _Chunk(self.name)
+
+    async def _stream(self):
+        try:
+            await asyncio.sleep(self.first)
+            yield _Chunk(f"{self.name}-0")
+            await asyncio.sleep(self.then)
+            yield _Chunk(f"{self.name}-1")
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+
+
+def _hedged(primary: _Model, backup: _Model, delay: float, budget: float = 1.0):
+    # Equal headroom keeps the routes in order, so ``primary`` gets the first call.
+    routes = [
+        Route(f"key-{model.name}", "model", 0, 10000, 10_000_000, model)
+        for model in (primary, backup)
+    ]
+    policy = HedgePolicy(enabled=True, initial_delay=delay, budget=budget)
+    return GeminiUpstream(UpstreamPool(routes), hedging=policy), routes, policy
+
+
+async def _collect(chunks) -> list[str]:
+    return [chunk.text async for chunk in chunks]
+
+
+def test_the_delay_is_the_latency_percentile_once_there_are_enough_samples():
+    policy = HedgePolicy(enabled=True, initial_delay=8.0, min_delay=0.05, min_samples=20)
+    assert policy.delay(_KIND) == 8.0
+
+    for number in range(1, 21):
+        policy.observe(_KIND, number / 100)
+    assert policy.delay(_KIND) == 0.2
+    # Other kinds of call keep their own window.
+    assert policy.delay("other") == 8.0
+
+    fast = HedgePolicy(enabled=True, min_delay=0.05, min_samples=20)
+    for _ in range(20):
+        fast.observe(_KIND, 0.001)
+    assert fast.delay(_KIND) == 0.05
+
+
+def test_hedges_stay_within_the_budget():
+    policy = HedgePolicy(enabled=True, budget=0.25)
+
+    sent = []
+    for _ in range(12):
+        policy.delay(_KIND)
+        sent.append(policy.try_hedge())
+
+    assert sent.count(True) == 3
+    assert sent[:4] == [False, False, False, True]
+    assert policy.stats()["overBudget"] == 9
+
+
+def test_a_fast_primary_is_not_hedged():
+    primary, backup = _Model("primary", first=0.01), _Model("backup")
+    upstream, _, policy = _hedged(primary, backup, delay=0.2)
+
+    response = asyncio.run(upstream.generate(_PROMPT))
+
+    assert response.text == "primary"
+    assert backup.calls == 0
+    assert policy.hedged == 0
+
+
+def test_a_slow_primary_is_beaten_at_the_hedge_delay():
+    primary, backup = _Model("primary", first=1.0), _Model("backup")
+    upstream, routes, policy = _hedged(primary, backup, delay=0.1)
+
+    started = time.monotonic()
+    response = asyncio.run(upstream.generate(_PROMPT))
+    elapsed = time.monotonic() - started
+
+    assert response.text == "backup"
+    assert 0.1 <= elapsed < 0.5
+    assert policy.hedged == 1 and policy.hedge_wins == 1
+    assert primary.cancelled == 1
+
+
+def test_a_cancelled_half_open_primary_is_released():
+    primary, backup = _Model("primary", first=1.0), _Model("backup")
+    upstream, routes, _ = _hedged(primary, backup, delay=0.05)
+    routes[0].state = HALF_OPEN
+
+    async def scenario():
+        response = await upstream.generate(_PROMPT)
+        # Settled by the time the answer is returned, not on some later loop pass.
+        return response, primary.cancelled, routes[0].trial_in_flight
+
+    response, cancelled, trial_in_flight = asyncio.run(scenario())
+
+    assert response.text == "backup"
+    # Neither a success nor a failure: the trial is free for the next call.
+    assert cancelled == 1
+    assert not trial_in_flight
+    assert routes[0].state == HALF_OPEN
+    assert routes[1].state == CLOSED
+
+
+def test_the_stream_hedge_waits_for_the_first_chunk_only():
+    # The first chunk is quick; the slow rest of the stream is not a reason to hedge.
+    primary, backup = _Model("primary", first=0.0, then=0.3), _Model("backup")
+    upstream, _, policy = _hedged(primary, backup, delay=0.1)
+
+    chunks = asyncio.run(_collect(upstream.stream(_PROMPT)))
+
+    assert chunks == ["primary-0", "primary-1"]
+    assert backup.calls == 0
+    assert policy.hedged == 0
+
+
+def test_the_stream_hedge_takes_the_whole_stream_from_the_first_to_produce():
+    primary, backup = _Model("primary", first=1.0), _Model("backup")
+    upstream, routes, policy = _hedged(primary, backup, delay=0.05)
+    routes[0].state = HALF_OPEN
+
+    started = time.monotonic()
+    chunks = asyncio.run(_collect(upstream.stream(_PROMPT)))
+
+    assert chunks == ["backup-0", "backup-1"]
+    assert time.monotonic() - started < 0.5
+    assert policy.hedge_wins == 1
+    assert primary.cancelled == 1
+    assert not routes[0].trial_in_flight
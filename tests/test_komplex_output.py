@@ -0,0 +1,26 @@
+import json
+
+from src import komplex_output
+
+
+def test_a_text_box_becomes_a_definition_with_its_value_as_content():
+    text = json.dumps([
+        {"type": "text", "value": "ចំនួនគត់"},
+        {"type": "text", "props": {"title": "ចំណាំ", "value": "x > 0"}},
+    ], ensure_ascii=False)
+
+    boxes, changed = komplex_output.parse_boxes(text)
+
+    assert changed
+    assert boxes == [
+        {"type": "definition", "props": {"content": [{"type": "text", "value": "ចំនួនគត់"}]}},
+        {"type": "definition", "props": {"title": "ចំណាំ", "content": [{"type": "text", "value": "x > 0"}]}},
+    ]
+
+
+def test_value_does_not_replace_existing_content():
+    box = {"type": "tip", "props": {"value": "dropped", "content": [{"type": "text", "value": "kept"}]}}
+
+    repaired, _ = komplex_output.repair_box(box)
+
+    assert repaired["props"] == {"content": [{"type": "text", "value": "kept"}]}
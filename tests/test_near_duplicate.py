@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from src.generation import GenerationService
+from src.instructions.prompt import Prompt
+from src.near_duplicate import NearDuplicateIndex, NearQuery
+from src.response_cache import MemoryCache, ResponseCache
+from src.upstream import GeminiUpstream
+from src.upstream_pool import UpstreamPool
+
+_QUESTION = "តើសមីការ x^2 - 5x + 6 = 0 មានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះដោយរបៀបណា?"
+
+
+def _index_with(question: str, key: str = "answer") -> NearDuplicateIndex:
+    index = NearDuplicateIndex()
+    index.add(NearQuery("scope", question), key)
+    return index
+
+
+@pytest.mark.parametrize("paraphrase", [
+    # Spacing, punctuation and the question particle.
+    "សមីការ x^2-5x+6=0 មានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះដោយរបៀបណា",
+    # One word swapped.
+    "តើសមីការ x^2 - 5x + 6 = 0 មានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះតាមរបៀបណា?",
+    # Khmer digits.
+    "តើសមីការ x^2 - ៥x + ៦ = ០ មានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះដោយរបៀបណា?",
+])
+def test_a_paraphrase_above_the_threshold_hits(paraphrase):
+    assert _index_with(_QUESTION).get(NearQuery("scope", paraphrase)) == "answer"
+
+
+@pytest.mark.parametrize("different", [
+    "តើសមីការ x^2 - 5x + 7 = 0 មានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះដោយរបៀបណា?",
+    "តើសមីការ y^2 - 5y + 6 = 0 មានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះដោយរបៀបណា?",
+    "តើសមីការ x^2 + 5x + 6 = 0 មានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះដោយរបៀបណា?",
+    "តើសមីការ x^2 - 5x + 6 = 0 មិនមានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះដោយរបៀបណា?",
+])
+def test_a_question_with_other_numbers_or_symbols_misses(different):
+    index = _index_with(_QUESTION)
+
+    assert index.get(NearQuery("scope", different)) is None
+
+
+def test_an_unrelated_question_in_the_same_scope_misses_on_the_threshold():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add(NearQuery("scope", "តើអ្វីទៅជាចំនួនបឋម?"), "answer")
+
+    assert index.get(NearQuery("scope", "តើអ្វីទៅជាចំនួនគូ?")) is None
+
+
+def test_other_scopes_never_match():
+    assert _index_with(_QUESTION).get(NearQuery("other scope", _QUESTION)) is None
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class _Upstream(GeminiUpstream):
+    def __init__(self):
+        super().__init__(UpstreamPool([]))
+        self.prompts = []
+
+    async def generate(self, prompt):
+        self.prompts.append(prompt.contents)
+        return _Response(f"answer to {prompt.contents}")
+
+
+def _prompt(question: str) -> Prompt:
+    return Prompt("test", "system", question, near_query=NearQuery("scope", question))
+
+
+def test_an_evicted_answer_expires_its_near_duplicate_entry():
+    memory = MemoryCache(max_entries=1, max_bytes=1 << 20, ttl=60)
+    upstream = _Upstream()
+    near = NearDuplicateIndex()
+    service = GenerationService(upstream, ResponseCache(memory), near)
+    paraphrase = "សមីការ x^2-5x+6=0 មានឫសប៉ុន្មាន ហើយរកឫសទាំងនោះតាមរបៀបណា"
+
+    async def scenario():
+        await service.generate(_prompt(_QUESTION))
+        hit = await service.generate(_prompt(paraphrase))
+        # Pushes the first answer out of the one-entry response cache.
+        await service.generate(Prompt("test", "system", "another question"))
+        miss = await service.generate(_prompt(paraphrase))
+        return hit, miss
+
+    hit, miss = asyncio.run(scenario())
+
+    assert hit.cached and hit.text == f"answer to {_QUESTION}"
+    assert not miss.cached and miss.text == f"answer to {paraphrase}"
+    assert upstream.prompts == [_QUESTION, "another question", paraphrase]
+    assert near.stats()["stale"] == 1
+    # Only the paraphrase's own answer is indexed now.
+    assert len(near) == 1
@@ -0,0 +1,116 @@
+import asyncio
+
+from src.sessions import SessionStore, SQLiteSessions
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _SummaryUpstream:
+    """Answers summary prompts after ``release`` is set, counting the calls."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.calls = 0
+        self.prompts = []
+
+    async def generate(self, prompt):
+        self.calls += 1
+        self.prompts.append(prompt)
+        await self.release.wait()
+        return _Response(f"summary {self.calls}")
+
+
+async def _idle(store: SessionStore) -> None:
+    while store._summarizing:
+        await asyncio.gather(*store._summarizing.values())
+
+
+def test_two_workers_on_one_database_keep_each_others_turns(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "sessions.db")
+        upstream = _SummaryUpstream()
+        upstream.release.set()
+        first = SessionStore(upstream, SQLiteSessions(path), max_turns=10)
+        second = SessionStore(upstream, SQLiteSessions(path), max_turns=10)
+
+        await first.record("s", "q1", "a1")
+        # Both workers now hold a memory copy of the session.
+        await second.get("s")
+        await second.record("s", "q2", "a2")
+        await first.record("s", "q3", "a3")
+        await second.record("s", "q4", "a4")
+
+        for store in (first, second):
+            session = await store.get("s")
+            assert [prompt for prompt, _ in session.turns] == ["q1", "q2", "q3", "q4"]
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_records_across_workers_are_not_lost(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "sessions.db")
+        upstream = _SummaryUpstream()
+        upstream.release.set()
+        stores = [SessionStore(upstream, SQLiteSessions(path), max_turns=100) for _ in range(2)]
+
+        await asyncio.gather(*(
+            stores[number % 2].record("s", f"q{number}", f"a{number}") for number in range(20)
+        ))
+
+        session = await stores[0].get("s")
+        assert sorted(prompt for prompt, _ in session.turns) == sorted(f"q{number}" for number in range(20))
+
+    asyncio.run(scenario())
+
+
+def test_summary_keeps_turns_that_arrive_while_it_runs():
+    async def scenario():
+        upstream = _SummaryUpstream()
+        store = SessionStore(upstream, max_turns=1)
+
+        await store.record("s", "q1", "a1")
+        await store.record("s", "q2", "a2")
+        await asyncio.sleep(0)
+        # The summary of q1 is in flight; q2 and q3 become pending meanwhile.
+        await store.record("s", "q3", "a3")
+        upstream.release.set()
+        await _idle(store)
+
+        session = await store.get("s")
+        assert session.pending == []
+        assert session.turns == [("q3", "a3")]
+        assert upstream.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_summary_drops_only_the_turns_it_folded_after_truncation(monkeypatch):
+    monkeypatch.setattr("src.sessions.SESSION_MAX_PENDING_TURNS", 2)
+
+    async def scenario():
+        upstream = _SummaryUpstream()
+        store = SessionStore(upstream, max_turns=1)
+
+        await store.record("s", "q1", "a1")
+        await store.record("s", "q2", "a2")
+        await asyncio.sleep(0)
+        # q1 is being folded; these push it and q2 out of the capped pending list.
+        for number in range(3, 6):
+            await store.record("s", f"q{number}", f"a{number}")
+        session = await store.get("s")
+        assert [prompt for prompt, _ in session.pending] == ["q3", "q4"]
+
+        upstream.release.set()
+        await _idle(store)
+
+        # q1 had already been truncated away, so the first pass must not drop q3.
+        assert "q3" in upstream.prompts[1].contents and "q4" in upstream.prompts[1].contents
+        session = await store.get("s")
+        assert session.pending == []
+        assert session.summary == "summary 2"
+
+    asyncio.run(scenario())
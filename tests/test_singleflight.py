@@ -0,0 +1,76 @@
+import asyncio
+
+from src.singleflight import SingleFlight
+
+
+class _Source:
+    def __init__(self):
+        self.cancelled = False
+
+    async def stream(self):
+        try:
+            yield "first"
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def _first_chunk(stream):
+    return await stream.__anext__()
+
+
+def test_upstream_stream_is_cancelled_once_every_subscriber_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        source = _Source()
+        leader = flights.stream("key", source.stream)
+        follower = flights.stream("key", source.stream)
+        assert await _first_chunk(leader) == "first"
+        assert await _first_chunk(follower) == "first"
+
+        await leader.aclose()
+        await asyncio.sleep(0)
+        assert not source.cancelled
+
+        await follower.aclose()
+        await asyncio.sleep(0)
+        assert source.cancelled
+        assert flights.stats()["inFlight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_a_new_caller_after_abandonment_starts_a_fresh_stream():
+    async def scenario():
+        flights = SingleFlight()
+        first_source, second_source = _Source(), _Source()
+        stream = flights.stream("key", first_source.stream)
+        await _first_chunk(stream)
+        await stream.aclose()
+
+        again = flights.stream("key", second_source.stream)
+        assert await _first_chunk(again) == "first"
+        assert flights.stats()["leaders"] == 2
+        await again.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_by_cancellation_cancels_upstream():
+    async def scenario():
+        flights = SingleFlight()
+        source = _Source()
+
+        async def consume():
+            async for _ in flights.stream("key", source.stream):
+                pass
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.01)
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert source.cancelled
+
+    asyncio.run(scenario())
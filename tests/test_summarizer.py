@@ -0,0 +1,215 @@
+import asyncio
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from src.summarizer import (
+    OUTPUT_LENGTHS,
+    Summarizer,
+    SummarizerOverloadedError,
+    SummarizerTimeoutError,
+    SummarizerUnavailableError,
+)
+from src.summarizer_worker import TINY_MODEL
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    """Lets ``summarize`` run without torch; the tests stub the worker."""
+    monkeypatch.setattr("src.summarizer.available", lambda: True)
+
+
+class _Worker:
+    """Stands in for ``Summarizer._run``: records each batch, answers after ``release``."""
+
+    def __init__(self, released: bool = True):
+        self.release = asyncio.Event()
+        if released:
+            self.release.set()
+        self.batches: list[tuple[int, list[str]]] = []
+
+    async def __call__(self, func, texts, max_length, num_beams):
+        self.batches.append((max_length, list(texts)))
+        await self.release.wait()
+        return [f"{max_length}:{text}" for text in texts]
+
+
+class _BrokenExecutor:
+    def submit(self, func, *args):
+        future = concurrent.futures.Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def _summarizer(worker=None, **kwargs) -> Summarizer:
+    summarizer = Summarizer(model_name=TINY_MODEL, **kwargs)
+    if worker is not None:
+        summarizer._run = worker
+    return summarizer
+
+
+def test_batches_are_grouped_by_output_type(installed):
+    async def scenario():
+        worker = _Worker()
+        summarizer = _summarizer(worker, max_batch=8, max_wait=0.02)
+        try:
+            results = await asyncio.gather(
+                summarizer.summarize("a", "title"),
+                summarizer.summarize("b", "summary"),
+                summarizer.summarize("c", "title"),
+                summarizer.summarize("d", "summary"),
+            )
+        finally:
+            await summarizer.close()
+        return worker, results
+
+    worker, results = asyncio.run(scenario())
+
+    assert sorted(worker.batches) == [
+        (OUTPUT_LENGTHS["title"], ["a", "c"]),
+        (OUTPUT_LENGTHS["summary"], ["b", "d"]),
+    ]
+    assert results == ["10:a", "512:b", "10:c", "512:d"]
+
+
+def test_batches_stop_at_the_max_batch_size(installed):
+    async def scenario():
+        worker = _Worker()
+        summarizer = _summarizer(worker, max_batch=3, max_wait=0.02)
+        try:
+            results = await asyncio.gather(*(summarizer.summarize(str(number), "title") for number in range(7)))
+        finally:
+            await summarizer.close()
+        return worker, results
+
+    worker, results = asyncio.run(scenario())
+
+    assert [len(texts) for _, texts in worker.batches] == [3, 3, 1]
+    assert results == [f"10:{number}" for number in range(7)]
+
+
+def test_batches_wait_only_for_the_wait_window(installed):
+    async def scenario():
+        worker = _Worker()
+        summarizer = _summarizer(worker, max_batch=8, max_wait=0.1)
+        try:
+            first = asyncio.create_task(summarizer.summarize("early", "title"))
+            await asyncio.sleep(0.02)
+            joined = asyncio.create_task(summarizer.summarize("within", "title"))
+            await asyncio.gather(first, joined)
+
+            first = asyncio.create_task(summarizer.summarize("alone", "title"))
+            await asyncio.sleep(0.3)
+            late = asyncio.create_task(summarizer.summarize("late", "title"))
+            await asyncio.gather(first, late)
+        finally:
+            await summarizer.close()
+        return worker
+
+    worker = asyncio.run(scenario())
+
+    assert [texts for _, texts in worker.batches] == [["early", "within"], ["alone"], ["late"]]
+
+
+def test_a_full_queue_is_rejected(installed):
+    async def scenario():
+        worker = _Worker(released=False)
+        summarizer = _summarizer(worker, max_batch=1, max_queue=1)
+        try:
+            # One text in the worker, one waiting for a free worker, one queued.
+            pending = []
+            for text in ("a", "b", "c"):
+                pending.append(asyncio.create_task(summarizer.summarize(text, "title")))
+                await asyncio.sleep(0.01)
+            with pytest.raises(SummarizerOverloadedError):
+                await summarizer.summarize("d", "title")
+            worker.release.set()
+            await asyncio.gather(*pending)
+        finally:
+            await summarizer.close()
+        return summarizer.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["rejected"] == 1
+    assert stats["requests"] == 3
+
+
+def test_a_slow_worker_times_out(installed):
+    async def scenario():
+        summarizer = _summarizer(_Worker(released=False), timeout=0.05)
+        try:
+            with pytest.raises(SummarizerTimeoutError):
+                await summarizer.summarize("a", "title")
+        finally:
+            await summarizer.close()
+
+    asyncio.run(scenario())
+
+
+def test_a_broken_worker_pool_is_unavailable_and_replaced(installed):
+    async def scenario():
+        summarizer = _summarizer()
+        summarizer._pool = _BrokenExecutor()
+        try:
+            with pytest.raises(SummarizerUnavailableError):
+                await summarizer.summarize("a", "title")
+        finally:
+            await summarizer.close()
+        return summarizer
+
+    summarizer = asyncio.run(scenario())
+
+    assert summarizer._pool is None
+    assert summarizer.stats()["errors"] == 1
+
+
+@pytest.mark.parametrize(("failure", "status"), [("timeout", 504), ("broken", 503)])
+def test_summarize_maps_worker_failures_to_statuses(installed, monkeypatch, app_module, call, failure, status):
+    if failure == "timeout":
+        summarizer = _summarizer(_Worker(released=False), timeout=0.05)
+    else:
+        summarizer = _summarizer()
+        summarizer._pool = _BrokenExecutor()
+    monkeypatch.setattr(app_module, "summarizer", summarizer)
+
+    response = call("POST", "/summarize", json={"text": "អត្ថបទ", "outputType": "title"})
+
+    assert response.status_code == status
+
+
+def test_a_full_queue_answers_503_with_retry_after(installed, monkeypatch, app_module, call):
+    monkeypatch.setattr(app_module, "summarizer", _summarizer(_Worker(), max_queue=0))
+
+    response = call("POST", "/summarize", json={"text": "អត្ថបទ", "outputType": "title"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_the_tiny_model_summarizes_in_a_worker_process(monkeypatch):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    monkeypatch.setattr("src.summarizer.SUMMARIZER_ENABLED", True)
+
+    async def scenario():
+        summarizer = Summarizer(model_name=TINY_MODEL, threads=1, num_beams=1, max_wait=0.05)
+        try:
+            await summarizer.warm_up()
+            summaries = await asyncio.gather(
+                summarizer.summarize("ភ្នំពេញជារាជធានីនៃប្រទេសកម្ពុជា។", "title"),
+                summarizer.summarize("សមីការដឺក្រេទីពីរមានឫសពីរ។", "title"),
+            )
+        finally:
+            await summarizer.close()
+        return summarizer.stats(), summaries
+
+    stats, summaries = asyncio.run(scenario())
+
+    assert stats["loaded"]
+    assert stats["batches"] == 1
+    assert all(isinstance(summary, str) for summary in summaries)
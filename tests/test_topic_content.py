@@ -0,0 +1,37 @@
+import asyncio
+import json
+
+from src import komplex_output
+from src.topic_content import compact_nodes
+
+_SPACED = [
+    {"type": "text", "value": "a"},
+    {"type": "text", "value": " "},
+    {"type": "InlineMath", "props": {"math": "x^2"}},
+    {"type": "text", "value": ""},
+]
+_BOX = {"type": "definition", "props": {"title": "t", "content": _SPACED}}
+
+
+def test_spacing_between_inline_nodes_survives_answer_compaction():
+    assert compact_nodes(_SPACED, strip_layout=False) == _SPACED[:3]
+
+
+def test_context_compaction_drops_whitespace_only_text():
+    assert compact_nodes(_SPACED) == [_SPACED[0], _SPACED[2]]
+
+
+def test_postprocess_and_stream_keep_spacing():
+    text = json.dumps([_BOX])
+
+    assert json.loads(komplex_output.postprocess(text))[0]["props"]["content"] == _SPACED[:3]
+    assert komplex_output.postprocess(text, parsed=True)[0]["props"]["content"] == _SPACED[:3]
+    box = asyncio.run(komplex_output.StreamValidator(None).accept(json.dumps(_BOX)))
+    assert box["props"]["content"] == _SPACED[:3]
+
+
+def test_gemini_answers_keep_spacing(call, fake_model):
+    fake_model.text = json.dumps([_BOX])
+    response = call("POST", "/gemini", json={"prompt": "spacing check", "responseType": "komplex", "parsed": True})
+
+    assert response.json()["result"][0]["props"]["content"] == _SPACED[:3]
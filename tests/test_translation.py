@@ -0,0 +1,129 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks import fake_translate
+from src.translation import TranslationClient, TranslationError, gloss
+
+_URL = "http://translate.test/translate"
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    monkeypatch.setattr(fake_translate, "FAKE_TRANSLATE_LATENCY", 0.0)
+    monkeypatch.setattr(fake_translate, "FAKE_TRANSLATE_PER_TEXT", 0.0)
+    fake_translate.app.state.requests = 0
+    fake_translate.app.state.texts = 0
+    return fake_translate.app.state
+
+
+def _client(transport=None, password: str = fake_translate.FAKE_TRANSLATE_PASSWORD, **kwargs) -> TranslationClient:
+    return TranslationClient(
+        url=_URL,
+        username=fake_translate.FAKE_TRANSLATE_USERNAME,
+        password=password,
+        transport=transport or httpx.ASGITransport(app=fake_translate.app),
+        **kwargs,
+    )
+
+
+def _run(client: TranslationClient, scenario):
+    async def closing():
+        try:
+            return await scenario()
+        finally:
+            await client.close()
+
+    return asyncio.run(closing())
+
+
+def test_concurrent_texts_share_one_request(fake_api):
+    client = _client(max_wait=0.05)
+    texts = ["សួស្តី", "អរគុណ", "លាហើយ"]
+
+    translated = _run(client, lambda: client.translate_many(texts))
+
+    assert translated == [fake_translate.english(text) for text in texts]
+    assert fake_api.requests == 1
+    assert fake_api.texts == 3
+
+
+def test_a_full_batch_is_sent_without_waiting(fake_api):
+    client = _client(max_batch=2, max_wait=10.0)
+
+    translated = _run(client, lambda: asyncio.wait_for(client.translate_many(["ក", "ខ", "គ", "ឃ"]), 1.0))
+
+    assert len(translated) == 4
+    assert fake_api.requests == 2
+
+
+def test_repeated_and_in_flight_texts_are_not_sent_twice(fake_api):
+    client = _client(max_wait=0.02)
+
+    async def scenario():
+        await asyncio.gather(client.translate("សួស្តី"), client.translate("សួស្តី"))
+        await client.translate("សួស្តី")
+
+    _run(client, scenario)
+
+    stats = client.stats()
+    assert fake_api.texts == 1
+    assert stats["coalesced"] == 1
+    assert stats["cacheHits"] == 1
+
+
+def test_the_cache_evicts_the_least_recently_used_text(fake_api):
+    client = _client(max_wait=0.0, cache_entries=2)
+
+    async def scenario():
+        for text in ("ក", "ខ", "ក", "គ", "ក", "ខ"):
+            await client.translate(text)
+
+    _run(client, scenario)
+
+    # ខ was the least recently used when គ came in.
+    assert fake_api.texts == 4
+    assert client.stats()["cacheHits"] == 2
+
+
+def test_text_without_khmer_never_leaves_the_process(fake_api):
+    client = _client()
+
+    translated = _run(client, lambda: client.translate_many(["x^2 + 1 = 0", "hello"]))
+
+    assert translated == ["x^2 + 1 = 0", "hello"]
+    assert fake_api.requests == 0
+    assert client.stats()["skippedNonKhmer"] == 2
+
+
+def test_a_translation_count_mismatch_is_an_error():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"translate_text": ["only one"]}))
+    client = _client(transport, max_wait=0.02)
+
+    with pytest.raises(TranslationError, match="Expected 2 translations, got 1"):
+        _run(client, lambda: client.translate_many(["ក", "ខ"]))
+    assert client.stats()["errors"] == 1
+
+
+def test_an_http_error_is_a_translation_error(fake_api):
+    client = _client(password="wrong")
+
+    with pytest.raises(TranslationError, match="401"):
+        _run(client, lambda: client.translate("សួស្តី"))
+    # Failures are not cached: the next call asks again.
+    assert client._cache == {} and client._in_flight == {}
+
+
+def test_glossed_prompts_skip_failed_translations(fake_api):
+    client = _client(password="wrong", prompt_stage=True)
+
+    assert _run(client, lambda: client.glossed(["សួស្តី", "hello"])) == {}
+
+
+def test_glossed_prompts_carry_their_translation(fake_api):
+    client = _client(prompt_stage=True)
+
+    glossed = _run(client, lambda: client.glossed(["សួស្តី", "hello"]))
+
+    assert glossed == {"សួស្តី": gloss("សួស្តី", fake_translate.english("សួស្តី"))}
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+from google.api_core import exceptions
+
+from src.instructions.prompt import Prompt
+from src.upstream import GeminiUpstream
+from src.upstream_pool import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    UPSTREAM_BACKOFF_BASE_SECONDS,
+    UPSTREAM_BACKOFF_MAX_SECONDS,
+    UPSTREAM_BREAKER_FAILURES,
+    UPSTREAM_TRIAL_PROBE_SECONDS,
+    Route,
+    UpstreamPool,
+    UpstreamUnavailableError,
+)
+
+_PROMPT = Prompt("test", "system", "contents")
+
+
+class _FailingModels:
+    """Model provider whose calls (or model lookups) raise ``error``."""
+
+    def __init__(self, error: Exception, in_lookup: bool = False):
+        self.error = error
+        self.in_lookup = in_lookup
+
+    async def model_for(self, prompt):
+        if self.in_lookup:
+            raise self.error
+        return self
+
+    async def generate_content_async(self, contents, **kwargs):
+        raise self.error
+
+    def stats(self) -> dict:
+        return {}
+
+
+def _upstream(models) -> tuple[GeminiUpstream, Route]:
+    route = Route("key-1234", "model", 0, 10000, 10_000_000, models)
+    return GeminiUpstream(UpstreamPool([route], max_attempts=1)), route
+
+
+def _call(upstream: GeminiUpstream, error: type[Exception]) -> None:
+    with pytest.raises(error):
+        asyncio.run(upstream.generate(_PROMPT))
+
+
+def test_client_errors_do_not_open_the_breaker():
+    upstream, route = _upstream(_FailingModels(exceptions.InvalidArgument("400 bad request")))
+
+    for _ in range(UPSTREAM_BREAKER_FAILURES * 2):
+        _call(upstream, exceptions.InvalidArgument)
+
+    assert route.state == CLOSED
+    assert route.failures == 0
+    assert route.errors == UPSTREAM_BREAKER_FAILURES * 2
+
+
+def test_server_errors_open_the_breaker():
+    upstream, route = _upstream(_FailingModels(exceptions.InternalServerError("500")))
+
+    for _ in range(UPSTREAM_BREAKER_FAILURES):
+        _call(upstream, exceptions.InternalServerError)
+
+    assert route.state == OPEN
+
+
+def test_a_failing_model_lookup_settles_a_half_open_trial():
+    upstream, route = _upstream(_FailingModels(exceptions.ServiceUnavailable("503"), in_lookup=True))
+    route.state = HALF_OPEN
+
+    _call(upstream, exceptions.ServiceUnavailable)
+
+    assert not route.trial_in_flight
+    assert route.state == OPEN
+
+
+def test_a_client_error_on_a_half_open_trial_frees_it():
+    upstream, route = _upstream(_FailingModels(exceptions.InvalidArgument("400"), in_lookup=True))
+    route.state = HALF_OPEN
+
+    _call(upstream, exceptions.InvalidArgument)
+
+    assert not route.trial_in_flight
+    assert route.available(0.0)
+
+
+def test_waiting_on_a_half_open_trial_does_not_spin(monkeypatch):
+    route = Route("key-1234", "model", 0, 10000, 10_000_000, _FailingModels(exceptions.ServiceUnavailable("503")))
+    pool = UpstreamPool([route], acquire_timeout=5.0)
+    route.state = HALF_OPEN
+    route.trial_in_flight = True
+    assert route.wait_time(time.monotonic(), 1) >= UPSTREAM_TRIAL_PROBE_SECONDS
+
+    sleeps = []
+    sleep = asyncio.sleep
+
+    async def counted(seconds, *args, **kwargs):
+        sleeps.append(seconds)
+        return await sleep(seconds, *args, **kwargs)
+
+    async def scenario():
+        waiter = asyncio.create_task(pool.acquire(1))
+        await sleep(0.3)
+        pool.succeeded(route)
+        return await asyncio.wait_for(waiter, 1.0)
+
+    monkeypatch.setattr(asyncio, "sleep", counted)
+    assert asyncio.run(scenario()) is route
+    # Picked up at the next probe once the trial closed the breaker, not after ~30 polls.
+    assert len(sleeps) <= 3
+    assert route.state == CLOSED
+
+
+def test_a_half_open_trial_longer_than_the_acquire_timeout_is_rejected():
+    route = Route("key-1234", "model", 0, 10000, 10_000_000, _FailingModels(exceptions.ServiceUnavailable("503")))
+    pool = UpstreamPool([route], acquire_timeout=0.1)
+    route.state = HALF_OPEN
+    route.trial_in_flight = True
+
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(pool.acquire(1))
+    assert pool.rejected == 1
+
+
+def test_rate_limits_back_off_exponentially_with_jitter():
+    routes = [
+        Route(f"key-{number}", "model", 0, 10000, 10_000_000, _FailingModels(exceptions.ResourceExhausted("429")))
+        for number in range(2)
+    ]
+    pool = UpstreamPool(routes)
+    pool._random.seed(0)
+
+    backoffs = [[], []]
+    for attempt in range(1, 10):
+        for route, seen in zip(routes, backoffs):
+            before = time.monotonic()
+            assert pool.failed(route, exceptions.ResourceExhausted("429"))
+            backoff = min(UPSTREAM_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1), UPSTREAM_BACKOFF_MAX_SECONDS)
+            waited = route.backoff_until - before
+            assert 0.5 * backoff <= waited <= 1.5 * backoff + 0.01
+            seen.append(waited)
+            assert not route.available(time.monotonic())
+
+    # Routes limited together do not come back together.
+    assert backoffs[0] != backoffs[1]